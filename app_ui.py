@@ -20,13 +20,18 @@ from jinja2 import Template
 
 from src.duoke import DuokeBot
 from src.config import settings
-from src.classifier import decide_reply
+from src.classifier import decide_reply_async
+from src.classify_cache import CACHE as CLASSIFY_CACHE
+from src.gemini_client import STATS as GEMINI_STATS
+from src.metrics import LoopLagMonitor
 from src.rules import load_rules, save_rules
 
 # ===== Estado global simples =====
 RUNNING: bool = False
 LAST_ERR: Optional[str] = None
 LOGS = deque(maxlen=4000)
+# Atraso do event loop (chamadas bloqueantes congelam espelho e WebSocket)
+LOOP_LAG = LoopLagMonitor()
 
 def log(line: str):
     s = f"[{time.strftime('%H:%M:%S')}] {line}"
@@ -343,6 +348,11 @@ document.getElementById('btnDuokeDisconnect').addEventListener('click', async ()
 app = FastAPI()
 
 
+@app.on_event("startup")
+async def _start_lag_monitor():
+    LOOP_LAG.start()
+
+
 @app.head("/")
 async def root_head() -> Response:
     """Simple HEAD handler for platform health checks."""
@@ -588,7 +598,7 @@ async def _run_cycle(run_once: bool):
     # Hook para UI ver o que foi lido e a resposta sugerida
     async def hook(messages: list[str]) -> tuple[bool, str]:
         ws_broadcast({"snapshot": {"reading": [["buyer", m] for m in messages], "proposed": "", "running": True}})
-        should, reply = decide_reply(messages)
+        should, reply = await decide_reply_async(messages)
         ws_broadcast({"snapshot": {"reading": [["buyer", m] for m in messages], "proposed": reply, "running": True}})
         return should, reply
 
@@ -642,7 +652,21 @@ async def stop():
 
 @app.get("/status")
 async def status():
-    return {"running": RUNNING, "last_error": LAST_ERR}
+    return {
+        "running": RUNNING,
+        "last_error": LAST_ERR,
+        "loop_lag": LOOP_LAG.snapshot(),
+        "gemini": GEMINI_STATS.snapshot(),
+        "classify_cache": CLASSIFY_CACHE.snapshot(),
+    }
+
+@app.get("/selectors/resolved")
+async def selectors_resolved():
+    """Alternativas de selectors.json que o bot em execução resolveu nesta sessão."""
+    bot = _bot
+    if not bot:
+        return JSONResponse({"resolved": {}, "stats": {}})
+    return JSONResponse(bot.resolved_selectors())
 
 # Ações manuais da UI (enviar/pular)
 @app.post("/action/send")
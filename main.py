@@ -1,4 +1,3 @@
-import os
 import json
 import base64
 import uuid
@@ -16,43 +15,13 @@ from playwright.async_api import async_playwright, TimeoutError as PWTimeoutErro
 # Configurações compartilhadas
 from src.config import settings
 
-# Importações de Criptografia para garantir a segurança da sessão
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+# Sessões criptografadas por usuário (AES-GCM), compartilhadas com o executor multi-conta
+from src.sessions import SESS_DIR, SECRET, encrypt_bytes, session_path
 
 # ===== Configurações da Aplicação =====
-SESS_DIR = Path("sessions") # Diretório para armazenar os arquivos de sessão
 SESS_DIR.mkdir(exist_ok=True)
-SECRET = os.getenv("SESSION_ENC_SECRET", "troque-isto-no-render") # Chave secreta para criptografia
 LOGIN_WAIT_TIMEOUT = 180000 # Tempo máximo de espera para o login (em ms)
 
-# ===== Funções de Criptografia para salvar a sessão do Playwright de forma segura =====
-def _derive_key(secret: str, salt: bytes) -> bytes:
-    """Deriva uma chave segura a partir de uma senha e um sal usando PBKDF2."""
-    kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=100_000)
-    return kdf.derive(secret.encode("utf-8"))
-
-def encrypt_bytes(data: bytes, secret: str) -> bytes:
-    """Criptografa dados usando AES-GCM. Retorna o sal, IV e o texto cifrado."""
-    salt = os.urandom(16)
-    key = _derive_key(secret, salt)
-    aes = AESGCM(key)
-    iv = os.urandom(12)
-    ct = aes.encrypt(iv, data, None)
-    return salt + iv + ct
-
-def decrypt_bytes(packed: bytes, secret: str) -> bytes:
-    """Descriptografa dados empacotados pelo `encrypt_bytes`."""
-    salt, iv, ct = packed[:16], packed[16:28], packed[28:]
-    key = _derive_key(secret, salt)
-    aes = AESGCM(key)
-    return aes.decrypt(iv, ct, None)
-
-def session_path(user_id: str) -> Path:
-    """Gera o caminho do arquivo de sessão para um dado user_id."""
-    return SESS_DIR / f"{user_id}.bin"
-
 # ===== Estado de login pendente (em memória, com TTL) =====
 # Isso é usado para manter o estado entre as duas requisições (iniciar e enviar código)
 class Pending:
@@ -0,0 +1,219 @@
+# src/bench_classifier.py
+"""
+Micro-benchmark do decide_reply: cadeia antiga de re.search x FeatureMatcher.
+
+Mantém abaixo uma cópia congelada da cadeia antiga (legacy_decide_reply)
+para comparar decisões por segundo e conferir que as decisões são
+idênticas. O Gemini fica de fora: as duas versões usam o
+_fallback_classify local (determinístico, sem rede).
+
+Uso:
+    python -m src.bench_classifier [--seconds 3] [--conversations 2000] [--check 20000]
+"""
+import argparse
+import random
+import re
+import time
+import unicodedata
+from typing import Callable, List, Tuple
+
+from . import classifier
+from .classifier import (
+    BREAKAGE_TEXT, MISSING_TEXT, RE_COBRANCA_PECA_NAO_ENVIADA, RE_ENVIO, RE_FALTANDO,
+    RE_FRUSTRACAO, RE_NAO, RE_QUEBRA, SENTINEL_TAG_GPT, _t, decide_reply,
+)
+from .gemini_client import _fallback_classify
+
+# Frases que exercitam todos os ramos da cadeia de regras
+TRIGGERS = [
+    "o pix não caiu ainda", "reembolso nao entrou", "ainda não enviaram a peça",
+    "ainda nao foi enviada a peça", "qual o valor do reembolso parcial?", "reembolso parcial de quanto valor",
+    "quanto fica o valor do frete", "pode mandar outra peça", "reenvio", "reposição",
+    "marcou como entregue", "consta recebido", "não recebi nada", "nao chegou",
+    "desde ontem esperando", "ninguém resolve", "cilindro grande", "preciso pra festa", "é pra hoje",
+    "estou aguardando o reembolso parcial", "quero o reembolso parcial", "parcial", "devolução",
+    "reembolso total", "nova peça", "enviar outra", "faltou um parafuso", "veio faltando",
+    "kit incompleto", "sem acessório", "veio quebrado", "chegou trincado", "com defeito", "não funciona",
+    "veio amassada", "qual o prazo de entrega?", "código de rastreio", "já foi postado?",
+    "?", "??",
+]
+# Conversa comum, que cai no classificador (a maior parte do tráfego)
+CHATTER = [
+    "bom dia", "oi", "olá, tudo bem?", "obrigada, amei", "chegou certinho", "comprei semana passada",
+    "minha filha adorou", "pode me ajudar", "ok", "aguardo retorno", "boa tarde!", "vocês têm na cor azul?",
+    "qual o tamanho da peça grande?", "é de plástico ou metal?", "muito obrigado pela atenção",
+    "vou comprar mais", "ficou lindo na estante", "tem como mandar junto com o outro pedido?",
+]
+
+
+# ---------- cadeia antiga (congelada para comparação) ----------
+
+def legacy_normalize(s: str) -> str:
+    s = s.lower().strip()
+    s = "".join(c for c in unicodedata.normalize("NFD", s) if unicodedata.category(c) != "Mn")
+    s = re.sub(r"\s+", " ", s)
+    return s
+
+
+def legacy_decide_reply(messages: List[str]) -> Tuple[bool, str]:
+    if not messages:
+        return (False, "")
+
+    last = legacy_normalize(messages[-1])
+    full = legacy_normalize(" ".join(messages))
+
+    if last in {"?", "??", "???", "????"}:
+        return (False, "")
+
+    if re.search(rf"\b(pix|reembolso)\b.*?\b{RE_NAO}\b.*?\b(caiu|recebi|entrou)\b", full):
+        return (False, "")
+
+    if re.search(RE_COBRANCA_PECA_NAO_ENVIADA, full):
+        return (False, "")
+
+    if re.search(r"(qual|quanto).{0,20}valor.{0,20}reembolso\s*parcial", full) or \
+       re.search(r"\breembolso\s*parcial\b.*\b(valor|quanto)\b", full):
+        return (True, _t("valor_reembolso_parcial", fallback_key="reembolso_parcial"))
+
+    if re.search(r"(qual|quanto).{0,20}valor.{0,20}frete", full) and \
+       re.search(r"(nova|outra)\s*pe[cç]a|reenvio|reposi[cç]a?o|enviar outra", full):
+        return (False, SENTINEL_TAG_GPT)
+
+    if re.search(r"(marcou|marcaram|consta|apareceu|colocou|lan[cç]ou).*(recebid[oa]|entregue)", full) and \
+       re.search(rf"\b{RE_NAO}\b.*\b(receb[iu]|chegou)\b", full):
+        reply = _t("nao_recebido_marcado_recebido", fallback_key="default")
+        if re.search(RE_FRUSTRACAO, full):
+            reply = "Entendo a frustração com essa situação. 🙏 " + reply
+        return (True, reply)
+
+    if re.search(r"\bcilindro\s+grande\b", full) and \
+       re.search(r"\burgenc|festa|hoje|amanh[aã]|chegando|preciso que envie|preciso enviar\b", full):
+        reply = _t("urgencia_cilindro_grande", fallback_key="envio")
+        if re.search(RE_FRUSTRACAO, full):
+            reply = "Entendo a urgência e a frustração. 🙏 " + reply
+        return (True, reply)
+
+    if re.search(r"\bestou (?:aguardando|esperando).{0,20}reembolso\s*parcial\b", full) or \
+       re.search(r"\breembolso\s*parcial\b", last):
+        return (True, _t("reembolso_parcial", fallback_key="confirm_reembolso_parcial"))
+
+    if re.search(r"\breembolso\s*parcial\b|\bparcial\b", last):
+        return (True, _t("confirm_reembolso_parcial"))
+    if re.search(r"\bdevolu[cç]a?o\b|\breembolso\s*total\b", last):
+        return (True, _t("confirm_devolucao_total"))
+    if re.search(r"\b(nova|outra)\s*pe[cç]a\b|\breenvio\b|\breposi[cç]a?o\b|\benviar\s*outra\b", last):
+        return (True, _t("confirm_envio_nova_peca"))
+
+    if re.search(RE_FALTANDO, full):
+        return (True, MISSING_TEXT)
+
+    if re.search(RE_QUEBRA, full):
+        return (True, BREAKAGE_TEXT)
+
+    info = classifier.classify(messages) or {}
+    intent = (info.get("intent") or "").strip().lower()
+
+    if intent == "envio" and not re.search(RE_ENVIO, full):
+        intent = "default"
+
+    intent_map = {
+        "tempo_envio": "tempo_envio",
+        "quebrado_com_foto": "quebrado_com_foto",
+        "quebrado_sem_foto": "quebrado_sem_foto",
+        "quebra": "quebra_3_opcoes",
+        "faltando": "faltando_peca",
+        "faltando_peca": "faltando_peca",
+        "reembolso_parcial": "reembolso_parcial",
+        "devolucao_total": "devolucao_total",
+        "pedido_cancelado": "pedido_cancelado",
+        "pedido_parado": "pedido_parado",
+        "cilindro_pequeno": "cilindro_pequeno",
+        "elogio": "elogio",
+        "envio": "envio",
+        "agradecimento": "agradecimento_generico",
+        "nao_recebido_marcado_recebido": "nao_recebido_marcado_recebido",
+        "urgencia_cilindro_grande": "urgencia_cilindro_grande",
+        "default": "default",
+        "pular": None,
+    }
+
+    key = intent_map.get(intent, intent)
+    if key is None:
+        return (False, "")
+    return (True, _t(key, fallback_key="envio"))
+
+
+# ---------- corpus e medição ----------
+
+def conversations(n: int, trigger_rate: float = 0.2, seed: int = 1) -> List[List[str]]:
+    """
+    Conversas de 1 a 8 mensagens com 1 a 3 frases cada (às vezes em caixa
+    alta); cada frase vem de TRIGGERS com probabilidade trigger_rate.
+    """
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        conv = []
+        for _ in range(rng.randint(1, 8)):
+            text = " ".join(
+                rng.choice(TRIGGERS if rng.random() < trigger_rate else CHATTER)
+                for _ in range(rng.randint(1, 3))
+            )
+            conv.append(text.upper() if rng.random() < 0.1 else text)
+        out.append(conv)
+    return out
+
+
+def rate(fn: Callable, corpus: List[List[str]], seconds: float) -> float:
+    """Decisões por segundo, repetindo o corpus até passar o tempo pedido."""
+    done = 0
+    t0 = time.perf_counter()
+    while True:
+        for conv in corpus:
+            fn(conv)
+        done += len(corpus)
+        elapsed = time.perf_counter() - t0
+        if elapsed >= seconds:
+            return done / elapsed
+
+
+def check(n: int) -> int:
+    """Quantas conversas dão decisões diferentes entre as duas versões."""
+    diffs = 0
+    corpus = conversations(n // 2, trigger_rate=0.2, seed=2) + conversations(n - n // 2, trigger_rate=1.0, seed=3)
+    for conv in corpus:
+        old, new = legacy_decide_reply(conv), decide_reply(conv)
+        if old != new:
+            diffs += 1
+            if diffs <= 5:
+                print(f"[BENCH] divergência: {conv!r}\n  antiga={old!r}\n  nova={new!r}")
+    return diffs
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Decisões por segundo do decide_reply (antigo x compilado).")
+    ap.add_argument("--seconds", type=float, default=3.0, help="tempo de medição por versão")
+    ap.add_argument("--conversations", type=int, default=2000, help="tamanho do corpus medido")
+    ap.add_argument("--trigger-rate", type=float, default=0.2, help="fração de frases que acionam regras")
+    ap.add_argument("--check", type=int, default=20000, help="conversas aleatórias para conferir decisões")
+    args = ap.parse_args()
+
+    # Gemini fora da medição: as duas versões usam o classificador local
+    classifier.classify = _fallback_classify
+
+    diffs = check(args.check)
+    print(f"[BENCH] {args.check} conversas conferidas, {diffs} divergências")
+
+    corpus = conversations(args.conversations, trigger_rate=args.trigger_rate)
+    old = rate(legacy_decide_reply, corpus, args.seconds)
+    new = rate(decide_reply, corpus, args.seconds)
+    print(
+        f"[BENCH] decide_reply ({args.trigger_rate:.0%} de frases com regra): antigo {old:,.0f}/s | "
+        f"compilado {new:,.0f}/s | {new / old:.2f}x"
+    )
+    if diffs:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+# src/bench_e2e.py
+"""
+Benchmark ponta a ponta do DuokeBot contra o Duoke de mentira (src.mock_duoke).
+
+Sobe o servidor mock em processo (uvicorn), aponta settings.douke_url para
+ele e roda bot.run_forever por --duration segundos, com perfis de
+navegador descartáveis. No fim relata:
+  - conversas abertas/min e respostas/min (contadores do bot);
+  - latência de resposta p50/p95/p99 medida pelo servidor (1ª mensagem
+    não respondida do comprador -> resposta enviada);
+  - latência dos ciclos;
+  - memória do navegador: RSS somado dos processos filhos (Chromium e
+    driver do Playwright, via /proc) e heap JS da página (CDP
+    Performance.getMetrics), pico e média.
+
+Uso:
+    python -m src.bench_e2e --duration 120 --conversations 300 --rate 60 --render-ms 200
+    python -m src.bench_e2e --classifier --json bench.json
+Sem --classifier toda mensagem de comprador é respondida (mede só o navegador).
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import uvicorn
+
+from .classifier import decide_reply_async
+from .config import settings
+from .duoke import DuokeBot
+from .metrics import LoopLagMonitor, percentile
+from .mock_duoke import MockConfig, create_app
+from .watermarks import WatermarkStore
+
+SAMPLE_SECONDS = 2.0
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _children(pid: int) -> List[int]:
+    """Descendentes de pid lendo /proc (Linux); vazio em outros sistemas."""
+    parents = {}
+    for entry in Path("/proc").glob("[0-9]*"):
+        try:
+            stat = (entry / "stat").read_text()
+            # o nome do processo pode ter espaços: o ppid vem depois do ')'
+            parents[int(entry.name)] = int(stat.rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+    found, frontier = [], [pid]
+    while frontier:
+        cur = frontier.pop()
+        kids = [c for c, pp in parents.items() if pp == cur]
+        found += kids
+        frontier += kids
+    return found
+
+
+def browser_rss_mb() -> float:
+    total = 0
+    for pid in _children(os.getpid()):
+        try:
+            total += int(Path(f"/proc/{pid}/statm").read_text().split()[1]) * _PAGE_SIZE
+        except (OSError, ValueError, IndexError):
+            continue
+    return total / (1024 * 1024)
+
+
+async def js_heap_mb(page, sessions: dict) -> Optional[float]:
+    if page is None or page.is_closed():
+        return None
+    try:
+        cdp = sessions.get(id(page))
+        if cdp is None:
+            cdp = await page.context.new_cdp_session(page)
+            await cdp.send("Performance.enable")
+            sessions.clear()
+            sessions[id(page)] = cdp
+        metrics = await cdp.send("Performance.getMetrics")
+        for m in metrics.get("metrics", []):
+            if m.get("name") == "JSHeapUsedSize":
+                return m["value"] / (1024 * 1024)
+    except Exception:
+        sessions.clear()
+    return None
+
+
+def _mem_summary(values: List[float]) -> dict:
+    if not values:
+        return {"peak": 0.0, "avg": 0.0}
+    return {"peak": round(max(values), 1), "avg": round(sum(values) / len(values), 1)}
+
+
+def reply_all(messages: List[str]):
+    return True, "Olá! Recebemos sua mensagem e já estamos verificando."
+
+
+async def bench(args) -> dict:
+    cfg = MockConfig(
+        conversations=args.conversations,
+        rate_per_min=args.rate,
+        render_ms=args.render_ms,
+        modal_every=args.modal_every,
+    )
+    api = create_app(cfg)
+    server = uvicorn.Server(uvicorn.Config(api, host="127.0.0.1", port=args.port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        if server_task.done():
+            raise RuntimeError(f"servidor mock não subiu na porta {args.port}")
+        await asyncio.sleep(0.05)
+    settings.douke_url = f"http://127.0.0.1:{args.port}/"
+    print(f"[BENCH] mock em {settings.douke_url} | {cfg}")
+
+    tmp = Path(tempfile.mkdtemp(prefix="duoke-bench-"))
+    bot = DuokeBot(account_id="bench")
+    bot.profile_dir = tmp / "profile"
+    bot.standby_profile_dir = tmp / "profile-standby"
+    if bot.watermarks is not None:
+        # começa sem marcas d'água de execuções anteriores
+        bot.watermarks.path.unlink(missing_ok=True)
+        bot.watermarks = WatermarkStore(bot.watermarks.path)
+
+    hook = decide_reply_async if args.classifier else reply_all
+    rss: List[float] = []
+    heap: List[float] = []
+    cdp_sessions: dict = {}
+
+    async def sample():
+        while True:
+            await asyncio.sleep(SAMPLE_SECONDS)
+            rss.append(browser_rss_mb())
+            h = await js_heap_mb(bot.current_page, cdp_sessions)
+            if h is not None:
+                heap.append(h)
+
+    lag = LoopLagMonitor()
+    lag.start()
+    run_task = asyncio.create_task(bot.run_forever(hook, idle_seconds=args.idle))
+    sampler = asyncio.create_task(sample())
+    started = time.monotonic()
+    try:
+        await asyncio.sleep(args.duration)
+    finally:
+        elapsed = time.monotonic() - started
+        sampler.cancel()
+        run_task.cancel()
+        lag.stop()
+        await asyncio.gather(sampler, run_task, return_exceptions=True)
+        mock_stats = api.state.mock.stats()
+        server.should_exit = True
+        await server_task
+        shutil.rmtree(tmp, ignore_errors=True)
+        if bot.watermarks is not None:
+            bot.watermarks.path.unlink(missing_ok=True)
+
+    minutes = max(1e-9, elapsed / 60.0)
+    totals = bot.cycle_totals
+    cycles = list(bot.cycle_stats.samples)
+    report = {
+        "duration_s": round(elapsed, 1),
+        "mock": {
+            "conversations": cfg.conversations,
+            "rate_per_min": cfg.rate_per_min,
+            "render_ms": cfg.render_ms,
+            "modal_every": cfg.modal_every,
+        },
+        "cycles": bot.cycle_stats.count,
+        "opened": totals["opened"],
+        "replied": totals["replied"],
+        "conversations_per_min": round(totals["opened"] / minutes, 2),
+        "replies_per_min": round(totals["replied"] / minutes, 2),
+        "cycle_seconds": {
+            "p50": round(percentile(cycles, 50), 3),
+            "p95": round(percentile(cycles, 95), 3),
+        },
+        "reply_latency": mock_stats["reply_latency"],
+        "pending_at_end": mock_stats["pending"],
+        "oldest_pending_s": mock_stats["oldest_pending_s"],
+        "browser_rss_mb": _mem_summary(rss),
+        "js_heap_mb": _mem_summary(heap),
+        "loop_lag": lag.snapshot(),
+    }
+    return report
+
+
+def print_report(r: dict) -> None:
+    lat = r["reply_latency"]
+    print(
+        f"[BENCH] {r['duration_s']:.0f}s | ciclos={r['cycles']} "
+        f"(p50 {r['cycle_seconds']['p50']:.2f}s, p95 {r['cycle_seconds']['p95']:.2f}s)"
+    )
+    print(
+        f"[BENCH] conversas/min={r['conversations_per_min']} respostas/min={r['replies_per_min']} | "
+        f"latência de resposta p50={lat['p50']:.1f}s p95={lat['p95']:.1f}s p99={lat['p99']:.1f}s "
+        f"(n={lat['count']}) | pendentes no fim={r['pending_at_end']} (mais antiga {r['oldest_pending_s']:.0f}s)"
+    )
+    print(
+        f"[BENCH] memória do navegador: RSS pico {r['browser_rss_mb']['peak']:.0f} MB, "
+        f"média {r['browser_rss_mb']['avg']:.0f} MB | heap JS pico {r['js_heap_mb']['peak']:.1f} MB, "
+        f"média {r['js_heap_mb']['avg']:.1f} MB"
+    )
+    lag = r["loop_lag"]
+    print(f"[BENCH] atraso do event loop: p95={lag['p95'] * 1000:.0f}ms máx={lag['max'] * 1000:.0f}ms")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Roda o DuokeBot contra o Duoke de mentira e mede a vazão.")
+    ap.add_argument("--duration", type=float, default=120.0, help="segundos de medição")
+    ap.add_argument("--conversations", type=int, default=200)
+    ap.add_argument("--rate", type=float, default=30.0, help="mensagens de comprador por minuto")
+    ap.add_argument("--render-ms", type=int, default=150, help="atraso de renderização da conversa")
+    ap.add_argument("--modal-every", type=float, default=0.0, help="segundos entre modais (0 = nunca)")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--idle", type=float, default=3.0, help="pausa entre ciclos do run_forever")
+    ap.add_argument("--classifier", action="store_true", help="usa o classificador real em vez de responder tudo")
+    ap.add_argument("--json", dest="json_out", default="", help="salva o relatório em JSON")
+    args = ap.parse_args()
+
+    report = asyncio.run(bench(args))
+    print_report(report)
+    if args.json_out:
+        Path(args.json_out).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"[BENCH] relatório salvo em {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# src/blocking.py
+"""
+Perfis declarativos de bloqueio de recursos.
+
+Em vez de um ctx.route("**/*") que faz cada requisição da SPA passar por uma
+corrotina Python, cada perfil vira UM padrão de URL (regex) registrado no
+ctx.route. O Playwright filtra esse padrão no próprio driver, então só as
+requisições que serão abortadas chegam ao Python. As demais seguem direto,
+sem passar pelo Python; só com BLOCK_STATS=sim um listener de "response"
+as conta (cada resposta atravessa a ponte com o driver — é para depuração).
+Os bytes contados são os declarados em content-length: respostas chunked
+ou comprimidas sem o cabeçalho ficam de fora.
+
+Como o padrão de rota só enxerga a URL, regras por tipo de recurso
+(imagem, fonte, mídia) são expressas por extensão de arquivo.
+"""
+import re
+from collections import defaultdict
+from typing import Dict, List
+
+RULES: Dict[str, str] = {
+    "media": r"\.(?:mp4|webm|ogg|mp3|wav|m4a|mov|avi)(?:[?#]|$)",
+    "analytics": (
+        r"analytics|googletagmanager\.com|google-analytics\.com|doubleclick\.net|"
+        r"connect\.facebook\.net|hotjar\.com|clarity\.ms|hm\.baidu\.com|sentry\.io|"
+        r"segment\.(?:io|com)|mixpanel\.com|amplitude\.com"
+    ),
+    "images": r"\.(?:png|jpe?g|gif|webp|avif|bmp|ico|svg)(?:[?#]|$)",
+    "fonts": r"\.(?:woff2?|ttf|otf|eot)(?:[?#]|$)|fonts\.(?:googleapis|gstatic)\.com",
+}
+
+PROFILES: Dict[str, List[str]] = {
+    "off": [],
+    # comportamento original: mídia + analytics
+    "minimal": ["media", "analytics"],
+    "no-images": ["media", "analytics", "images"],
+    "no-fonts+analytics": ["media", "analytics", "fonts"],
+    "lean": ["media", "analytics", "images", "fonts"],
+}
+
+
+def resolve_profile(name: str) -> List[str]:
+    """Nome de perfil conhecido ou combinação de regras com '+', ex. 'images+fonts'."""
+    name = (name or "minimal").strip().lower()
+    if name in PROFILES:
+        return list(PROFILES[name])
+    rules = [r for r in name.split("+") if r]
+    unknown = [r for r in rules if r not in RULES]
+    if unknown:
+        print(f"[BLOCK] regras desconhecidas ignoradas: {unknown}; perfil 'minimal' usado como base")
+        return list(PROFILES["minimal"])
+    return rules
+
+
+class RequestStats:
+    """Contadores por perfil: bloqueadas por regra; liberadas só com BLOCK_STATS."""
+
+    def __init__(self, profile: str, rules: List[str]):
+        self.profile = profile
+        self.rules = rules
+        self.blocked: Dict[str, int] = defaultdict(int)
+        self.allowed = 0
+        # soma dos content-length (não é o tráfego real)
+        self.declared_bytes = 0
+        self.counting = False
+        self.allowed_by_type: Dict[str, int] = defaultdict(int)
+        self._compiled = {r: re.compile(RULES[r], re.I) for r in rules}
+
+    def rule_for(self, url: str) -> str:
+        for name, rx in self._compiled.items():
+            if rx.search(url):
+                return name
+        return "?"
+
+    def on_response(self, response) -> None:
+        """Listener síncrono (não segura a requisição)."""
+        try:
+            self.allowed += 1
+            self.allowed_by_type[response.request.resource_type] += 1
+            size = (response.headers or {}).get("content-length")
+            if size and size.isdigit():
+                self.declared_bytes += int(size)
+        except Exception:
+            pass
+
+    def snapshot(self) -> dict:
+        return {
+            "profile": self.profile,
+            "blocked": dict(self.blocked),
+            "blocked_total": sum(self.blocked.values()),
+            "allowed": self.allowed if self.counting else None,
+            "declared_bytes": self.declared_bytes if self.counting else None,
+            "allowed_by_type": dict(self.allowed_by_type),
+        }
+
+    def summary(self) -> str:
+        b = ", ".join(f"{k}={v}" for k, v in sorted(self.blocked.items())) or "nada"
+        out = f"perfil={self.profile} bloqueadas[{b}]"
+        if self.counting:
+            out += f" liberadas={self.allowed} ({self.declared_bytes / 1024 / 1024:.1f} MB declarados)"
+        return out
+
+
+async def install_blocking(ctx, profile: str, count_allowed: bool = False) -> RequestStats:
+    """Registra o perfil no contexto e devolve os contadores."""
+    rules = resolve_profile(profile)
+    stats = RequestStats(profile, rules)
+    if count_allowed:
+        stats.counting = True
+        ctx.on("response", stats.on_response)
+    if not rules:
+        return stats
+
+    pattern = re.compile("|".join(f"(?:{RULES[r]})" for r in rules), re.I)
+
+    async def _abort(route):
+        stats.blocked[stats.rule_for(route.request.url)] += 1
+        try:
+            await route.abort()
+        except Exception:
+            pass
+
+    await ctx.route(pattern, _abort)
+    return stats
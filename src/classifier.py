@@ -1,8 +1,10 @@
 # src/classifier.py
-from typing import Tuple, List
+from typing import Tuple, List, Optional
 from .templates import load_templates
-from .gemini_client import classify
+from .gemini_client import classify, classify_async
 import unicodedata, re
+from functools import reduce
+from operator import or_
 
 TEMPLATES = load_templates()
 SENTINEL_TAG_GPT = "__TAG_GPT__"  # usado para sinalizar: etiquetar e pular no duoke.py
@@ -21,11 +23,37 @@ MISSING_TEXT = (
     "ou se preferir posso fazer seu reembolso, o que você prefere?"
 )
 
+_WS = re.compile(r"\s+")
+# Bloco "Combining Diacritical Marks" (todos Mn): cobre os acentos do português
+_COMBINING = re.compile("[\u0300-\u036f]+")
+_NON_ASCII = re.compile(r"[^\x00-\x7f]+")
+
+
+class _MarkTable(dict):
+    """Caractere -> ele mesmo, ou "" se for acento combinante (Mn); aprende sob demanda."""
+
+    def __missing__(self, c):
+        v = "" if unicodedata.category(c) == "Mn" else c
+        self[c] = v
+        return v
+
+
+_MARKS = _MarkTable()
+
+def _strip_marks(m) -> str:
+    return "".join(map(_MARKS.__getitem__, m.group()))
+
 def _normalize(s: str) -> str:
     s = s.lower().strip()
-    s = "".join(c for c in unicodedata.normalize("NFD", s) if unicodedata.category(c) != "Mn")
-    s = re.sub(r"\s+", " ", s)
-    return s
+    # NFD só muda texto com não-ASCII; o que sobrar fora do bloco comum de
+    # acentos passa pela tabela de categorias
+    if not s.isascii():
+        s = _COMBINING.sub("", unicodedata.normalize("NFD", s))
+        if not s.isascii():
+            s = _NON_ASCII.sub(_strip_marks, s)
+    # split/join resolve o caso comum; a regex só roda se algo mudou
+    t = " ".join(s.split())
+    return s if t == s else _WS.sub(" ", s)
 
 def _t(key: str, fallback_key: str = "default", fallback_text: str = "Obrigado pela mensagem! 😊"):
     return TEMPLATES.get(key) or TEMPLATES.get(fallback_key) or fallback_text
@@ -52,105 +80,247 @@ RE_ENVIO = r"(rastreio|rastreamento|codigo de rastreio|c[oó]digo de rastreio|en
 # Casos para pular (além de PIX)
 RE_COBRANCA_PECA_NAO_ENVIADA = r"(ainda\s+nao\s*(?:foi|foram)\s*enviad[oa]s?\s*(?:a|as)\s*pe[cç]a[s]?|ainda\s+nao\s*enviaram\s*(?:a|as)\s*pe[cç]a[s]?)"
 
-def decide_reply(messages: List[str]) -> Tuple[bool, str]:
+# ===== Traços (features) que a cadeia de regras consulta =====
+# (nome, regex, palavras-chave). Cada traço equivale a um re.search do
+# encadeamento antigo; alternativas "A or B" viraram um único padrão "A|B".
+# As palavras-chave são condição necessária: cada grupo (separado por "|")
+# precisa de pelo menos uma palavra (separadas por espaço) contida no texto.
+# Só letras, sem espaços — ao mudar uma regex, revise os grupos dela e rode
+# python -m src.bench_classifier para conferir as decisões.
+_NAO_KW = "nao noo não"
+_PECA_KW = "pec peç reenvio reposi enviar"
+
+FULL_FEATURES = [
+    ("pix_nao_caiu", rf"\b(pix|reembolso)\b.*?\b{RE_NAO}\b.*?\b(caiu|recebi|entrou)\b",
+     f"pix reembolso | {_NAO_KW} | caiu recebi entrou"),
+    ("cobranca_peca", RE_COBRANCA_PECA_NAO_ENVIADA, "ainda | nao | enviad enviaram | pec peç"),
+    ("valor_parcial", r"(qual|quanto).{0,20}valor.{0,20}reembolso\s*parcial|\breembolso\s*parcial\b.*\b(valor|quanto)\b",
+     "reembolso | parcial | valor quanto"),
+    ("valor_frete", r"(qual|quanto).{0,20}valor.{0,20}frete", "qual quanto | valor | frete"),
+    ("nova_peca", r"(nova|outra)\s*pe[cç]a|reenvio|reposi[cç]a?o|enviar outra", _PECA_KW),
+    ("marcado_recebido", r"(marcou|marcaram|consta|apareceu|colocou|lan[cç]ou).*(recebid[oa]|entregue)",
+     "marcou marcaram consta apareceu colocou lancou lançou | recebid entregue"),
+    ("nao_recebi", rf"\b{RE_NAO}\b.*\b(receb[iu]|chegou)\b", f"{_NAO_KW} | receb chegou"),
+    ("frustracao", RE_FRUSTRACAO, "ontem repetindo dif ningu cansei uai demorando"),
+    ("cilindro_grande", r"\bcilindro\s+grande\b", "cilindro | grande"),
+    ("urgencia", r"\burgenc|festa|hoje|amanh[aã]|chegando|preciso que envie|preciso enviar\b",
+     "urgenc festa hoje amanh chegando preciso"),
+    ("aguardando_parcial", r"\bestou (?:aguardando|esperando).{0,20}reembolso\s*parcial\b",
+     "estou | reembolso | parcial"),
+    ("faltando", RE_FALTANDO, "falt veio sem incompleto"),
+    ("quebra", RE_QUEBRA,
+     "quebrad trincad rachad amassad riscad lascad empenad deformad avariad danificad "
+     "estragado defeit funciona problema"),
+    ("envio", RE_ENVIO, "rastre enviado envio postado transportadora quando prazo caminho"),
+]
+
+LAST_FEATURES = [
+    ("reembolso_parcial", r"\breembolso\s*parcial\b", "reembolso | parcial"),
+    ("parcial", r"\breembolso\s*parcial\b|\bparcial\b", "parcial"),
+    ("devolucao", r"\bdevolu[cç]a?o\b|\breembolso\s*total\b", "devolu total"),
+    ("nova_peca", r"\b(nova|outra)\s*pe[cç]a\b|\breenvio\b|\breposi[cç]a?o\b|\benviar\s*outra\b", _PECA_KW),
+]
+
+# Teto do cache palavra -> palavras-chave (zera ao encher)
+WORD_CACHE_MAX = 50000
+
+
+class _WordMasks(dict):
+    """Palavra -> bits dos grupos de palavras-chave contidos nela; aprende sob demanda."""
+
+    def __init__(self, keywords):
+        super().__init__()
+        self.keywords = keywords
+
+    def __missing__(self, w):
+        if len(self) >= WORD_CACHE_MAX:
+            self.clear()
+        mask = 0
+        for kw, bit in self.keywords:
+            if kw in w:
+                mask |= bit
+        self[w] = mask
+        return mask
+
+
+class FeatureSet:
+    """Traços de um texto; cada um é confirmado pela regex na 1ª consulta."""
+
+    __slots__ = ("_matcher", "_text", "_hits", "_seen")
+
+    def __init__(self, matcher, text: str, hits: int):
+        self._matcher = matcher
+        self._text = text
+        self._hits = hits
+        self._seen = {}
+
+    def __contains__(self, name: str) -> bool:
+        fired = self._seen.get(name)
+        if fired is None:
+            needs = self._matcher.needs[name]
+            fired = self._seen[name] = (
+                self._hits & needs == needs and self._matcher.rx[name].search(self._text) is not None
+            )
+        return fired
+
+    def fired(self) -> frozenset:
+        return frozenset(name for name in self._matcher.names if name in self)
+
+
+class FeatureMatcher:
+    """
+    Traços compilados uma vez; uma passada por texto marca quais podem disparar.
+
+    A passada quebra o texto em palavras (str.split) e junta, de um cache
+    palavra -> bits, os grupos de palavras-chave presentes. Um traço só roda
+    a sua regex (pré-compilada) se todos os seus grupos estiverem presentes,
+    e só quando a cadeia de regras pergunta por ele — o resultado é o mesmo
+    de um re.search por traço.
+    """
+
+    def __init__(self, features):
+        self.names = [name for name, _, _ in features]
+        self.rx = {}
+        self.needs = {}
+        keywords = []
+        bit = 1
+        for name, pat, kw in features:
+            self.rx[name] = re.compile(pat)
+            needs = 0
+            for group in kw.split("|"):
+                keywords += [(word, bit) for word in group.split()]
+                needs |= bit
+                bit <<= 1
+            self.needs[name] = needs
+        self._words = _WordMasks(keywords)
+
+    def scan(self, text: str) -> FeatureSet:
+        hits = reduce(or_, map(self._words.__getitem__, set(text.split())), 0)
+        return FeatureSet(self, text, hits)
+
+
+FULL_MATCHER = FeatureMatcher(FULL_FEATURES)
+LAST_MATCHER = FeatureMatcher(LAST_FEATURES)
+
+# Intenção devolvida pelo Gemini -> chave de template (None = não responder)
+INTENT_MAP = {
+    "tempo_envio": "tempo_envio",
+    "quebrado_com_foto": "quebrado_com_foto",
+    "quebrado_sem_foto": "quebrado_sem_foto",
+    "quebra": "quebra_3_opcoes",
+    "faltando": "faltando_peca",
+    "faltando_peca": "faltando_peca",
+    "reembolso_parcial": "reembolso_parcial",
+    "devolucao_total": "devolucao_total",
+    "pedido_cancelado": "pedido_cancelado",
+    "pedido_parado": "pedido_parado",
+    "cilindro_pequeno": "cilindro_pequeno",
+    "elogio": "elogio",
+    "envio": "envio",
+    "agradecimento": "agradecimento_generico",
+    "nao_recebido_marcado_recebido": "nao_recebido_marcado_recebido",
+    "urgencia_cilindro_grande": "urgencia_cilindro_grande",
+    "default": "default",
+    "pular": None,
+}
+
+VAGUE = {"?", "??", "???", "????"}
+
+def _rules(messages: List[str]) -> Tuple[Optional[Tuple[bool, str]], Optional[FeatureSet]]:
+    """Cadeia de regras: (decisão, traços), com decisão None quando cai no Gemini."""
     if not messages:
-        return (False, "")
+        return (False, ""), None
 
     last = _normalize(messages[-1])
-    full = _normalize(" ".join(messages))
 
     # ignorar interjeições muito vagas
-    if last in {"?", "??", "???", "????"}:
-        return (False, "")
+    if last in VAGUE:
+        return (False, ""), None
+
+    full = _normalize(" ".join(messages))
+    f = FULL_MATCHER.scan(full)
 
     # ignorar reclamações “PIX/reembolso não caiu”
-    if re.search(rf"\b(pix|reembolso)\b.*?\b{RE_NAO}\b.*?\b(caiu|recebi|entrou)\b", full):
-        return (False, "")
+    if "pix_nao_caiu" in f:
+        return (False, ""), f
 
     # ignorar cobranças de "ainda não enviaram a peça que faltou"
-    if re.search(RE_COBRANCA_PECA_NAO_ENVIADA, full):
-        return (False, "")
+    if "cobranca_peca" in f:
+        return (False, ""), f
 
     # ======== VALORES / POLÍTICA ========
     # a) valor do reembolso parcial (responde 30%)
-    if re.search(r"(qual|quanto).{0,20}valor.{0,20}reembolso\s*parcial", full) or \
-       re.search(r"\breembolso\s*parcial\b.*\b(valor|quanto)\b", full):
-        return (True, _t("valor_reembolso_parcial", fallback_key="reembolso_parcial"))
+    if "valor_parcial" in f:
+        return (True, _t("valor_reembolso_parcial", fallback_key="reembolso_parcial")), f
 
     # b) valor de FRETE para reenvio de nova peça -> etiquetar GPT e pular
-    if re.search(r"(qual|quanto).{0,20}valor.{0,20}frete", full) and \
-       re.search(r"(nova|outra)\s*pe[cç]a|reenvio|reposi[cç]a?o|enviar outra", full):
-        return (False, SENTINEL_TAG_GPT)
+    if "valor_frete" in f and "nova_peca" in f:
+        return (False, SENTINEL_TAG_GPT), f
 
     # ======== marcado como recebido, mas não recebi =========
-    if re.search(r"(marcou|marcaram|consta|apareceu|colocou|lan[cç]ou).*(recebid[oa]|entregue)", full) and \
-       re.search(rf"\b{RE_NAO}\b.*\b(receb[iu]|chegou)\b", full):
+    if "marcado_recebido" in f and "nao_recebi" in f:
         reply = _t("nao_recebido_marcado_recebido", fallback_key="default")
-        if re.search(RE_FRUSTRACAO, full):
+        if "frustracao" in f:
             reply = "Entendo a frustração com essa situação. 🙏 " + reply
-        return (True, reply)
+        return (True, reply), f
 
     # ======== urgência para cilindro grande =========
-    if re.search(r"\bcilindro\s+grande\b", full) and \
-       re.search(r"\burgenc|festa|hoje|amanh[aã]|chegando|preciso que envie|preciso enviar\b", full):
+    if "cilindro_grande" in f and "urgencia" in f:
         reply = _t("urgencia_cilindro_grande", fallback_key="envio")
-        if re.search(RE_FRUSTRACAO, full):
+        if "frustracao" in f:
             reply = "Entendo a urgência e a frustração. 🙏 " + reply
-        return (True, reply)
+        return (True, reply), f
+
+    lf = LAST_MATCHER.scan(last)
 
     # ======== reembolso parcial (esperando/querendo) =========
-    if re.search(r"\bestou (?:aguardando|esperando).{0,20}reembolso\s*parcial\b", full) or \
-       re.search(r"\breembolso\s*parcial\b", last):
-        return (True, _t("reembolso_parcial", fallback_key="confirm_reembolso_parcial"))
+    if "aguardando_parcial" in f or "reembolso_parcial" in lf:
+        return (True, _t("reembolso_parcial", fallback_key="confirm_reembolso_parcial")), f
 
     # ======== confirmações 3 opções explícitas no texto =========
-    if re.search(r"\breembolso\s*parcial\b|\bparcial\b", last):
-        return (True, _t("confirm_reembolso_parcial"))
-    if re.search(r"\bdevolu[cç]a?o\b|\breembolso\s*total\b", last):
-        return (True, _t("confirm_devolucao_total"))
-    if re.search(r"\b(nova|outra)\s*pe[cç]a\b|\breenvio\b|\breposi[cç]a?o\b|\benviar\s*outra\b", last):
-        return (True, _t("confirm_envio_nova_peca"))
+    if "parcial" in lf:
+        return (True, _t("confirm_reembolso_parcial")), f
+    if "devolucao" in lf:
+        return (True, _t("confirm_devolucao_total")), f
+    if "nova_peca" in lf:
+        return (True, _t("confirm_envio_nova_peca")), f
 
     # ======== faltando peça (resposta pronta) =========
-    if re.search(RE_FALTANDO, full):
-        return (True, MISSING_TEXT)
+    if "faltando" in f:
+        return (True, MISSING_TEXT), f
 
     # ======== quebra / defeito (resposta pronta) =========
-    if re.search(RE_QUEBRA, full):
+    if "quebra" in f:
         # Se mencionar foto, você pode optar por outra template se quiser:
         # if re.search(RE_FOTO, full): return (True, _t("quebrado_com_foto", fallback_key="quebra_3_opcoes"))
-        return (True, BREAKAGE_TEXT)
+        return (True, BREAKAGE_TEXT), f
 
-    # ======== Fallback via Gemini =========
-    info = classify(messages) or {}
+    return None, f
+
+def _from_intent(info: dict, f: FeatureSet) -> Tuple[bool, str]:
+    """Decisão a partir da intenção devolvida pelo Gemini (ou pelo fallback local)."""
+    info = info or {}
     intent = (info.get("intent") or "").strip().lower()
 
     # Não aceite "envio" do modelo se o texto não fala de envio
-    if intent == "envio" and not re.search(RE_ENVIO, full):
+    if intent == "envio" and "envio" not in f:
         intent = "default"
 
-    intent_map = {
-        "tempo_envio": "tempo_envio",
-        "quebrado_com_foto": "quebrado_com_foto",
-        "quebrado_sem_foto": "quebrado_sem_foto",
-        "quebra": "quebra_3_opcoes",
-        "faltando": "faltando_peca",
-        "faltando_peca": "faltando_peca",
-        "reembolso_parcial": "reembolso_parcial",
-        "devolucao_total": "devolucao_total",
-        "pedido_cancelado": "pedido_cancelado",
-        "pedido_parado": "pedido_parado",
-        "cilindro_pequeno": "cilindro_pequeno",
-        "elogio": "elogio",
-        "envio": "envio",
-        "agradecimento": "agradecimento_generico",
-        "nao_recebido_marcado_recebido": "nao_recebido_marcado_recebido",
-        "urgencia_cilindro_grande": "urgencia_cilindro_grande",
-        "default": "default",
-        "pular": None,
-    }
-
-    key = intent_map.get(intent, intent)
+    key = INTENT_MAP.get(intent, intent)
     if key is None:
         return (False, "")
     return (True, _t(key, fallback_key="envio"))
+
+def decide_reply(messages: List[str]) -> Tuple[bool, str]:
+    decided, f = _rules(messages)
+    if decided is not None:
+        return decided
+    # ======== Fallback via Gemini =========
+    return _from_intent(classify(messages), f)
+
+async def decide_reply_async(messages: List[str]) -> Tuple[bool, str]:
+    """Igual a decide_reply, mas o fallback no Gemini não bloqueia o event loop."""
+    decided, f = _rules(messages)
+    if decided is not None:
+        return decided
+    return _from_intent(await classify_async(messages), f)
@@ -0,0 +1,170 @@
+# src/classify_cache.py
+"""
+Cache persistente das classificações do Gemini (SQLite).
+
+Enquanto ninguém responde, a mesma conversa volta a cada ciclo com o mesmo
+histórico (should=False, envio que falhou, regra que não decidiu) e era
+reenviada ao Gemini toda vez. A chave é um hash das últimas N mensagens
+normalizadas (minúsculas, espaços colapsados) mais a versão do prompt;
+o valor é o JSON devolvido pelo modelo.
+
+- Entradas vencem após CLASSIFY_CACHE_TTL_SECONDS.
+- Acima de CLASSIFY_CACHE_MAX_ENTRIES, as menos usadas recentemente saem.
+- WAL: vários processos (supervisor) podem dividir o mesmo arquivo.
+- Acerto não grava: o "último uso" fica em memória e vai para o disco
+  junto com a próxima gravação.
+- get_async/put_async rodam o SQLite numa thread, fora do event loop.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from .config import settings
+
+CACHE_PATH = Path(
+    os.getenv("CLASSIFY_CACHE_PATH", str(Path(__file__).resolve().parents[1] / "classify_cache.sqlite3"))
+)
+# Limpeza (vencidas + excesso) a cada N gravações
+EVICT_EVERY = 100
+
+
+def _norm(text: str) -> str:
+    return " ".join((text or "").lower().split())
+
+
+class ClassifyCache:
+    def __init__(self, path: Path = CACHE_PATH, ttl: float = 6 * 3600, max_entries: int = 20000, enabled: bool = True):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self._puts = 0
+        # chave -> último uso ainda não gravado
+        self._touched = {}
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(str(self.path), timeout=5, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, used REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries(used)")
+            self._db = db
+        return self._db
+
+    @staticmethod
+    def key(namespace: str, messages: List[str]) -> str:
+        raw = "\x1f".join([namespace] + [_norm(m) for m in messages])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        try:
+            with self._lock:
+                db = self._conn()
+                row = db.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is not None and now - row[1] > self.ttl:
+                    db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    self.expired += 1
+                    row = None
+                if row is not None:
+                    self._touched[key] = now
+        except sqlite3.Error as e:
+            print(f"[CACHE] leitura falhou: {e}")
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value: dict) -> None:
+        if not self.enabled:
+            return
+        now = time.time()
+        try:
+            with self._lock:
+                db = self._conn()
+                db.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, created, used) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), now, now),
+                )
+                self._flush_touched(db)
+                self._puts += 1
+                if self._puts % EVICT_EVERY == 0:
+                    self._evict(db, now)
+        except sqlite3.Error as e:
+            print(f"[CACHE] gravação falhou: {e}")
+
+    def _flush_touched(self, db: sqlite3.Connection) -> None:
+        if self._touched:
+            db.executemany("UPDATE entries SET used = ? WHERE key = ?", [(t, k) for k, t in self._touched.items()])
+            self._touched.clear()
+
+    async def get_async(self, key: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        return await asyncio.to_thread(self.get, key)
+
+    async def put_async(self, key: str, value: dict) -> None:
+        if self.enabled:
+            await asyncio.to_thread(self.put, key, value)
+
+    def _evict(self, db: sqlite3.Connection, now: float) -> None:
+        self.evicted += db.execute("DELETE FROM entries WHERE created < ?", (now - self.ttl,)).rowcount
+        extra = db.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_entries
+        if extra > 0:
+            self.evicted += db.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY used ASC LIMIT ?)", (extra,)
+            ).rowcount
+
+    def size(self) -> int:
+        try:
+            with self._lock:
+                return self._conn().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+    def snapshot(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "entries": self.size() if self.enabled else 0,
+        }
+
+    def summary(self) -> str:
+        s = self.snapshot()
+        return (
+            f"acertos={s['hits']} faltas={s['misses']} ({s['hit_ratio']:.0%}) "
+            f"vencidas={s['expired']} removidas={s['evicted']} entradas={s['entries']}"
+        )
+
+
+CACHE = ClassifyCache(
+    ttl=settings.classify_cache_ttl_seconds,
+    max_entries=settings.classify_cache_max_entries,
+    enabled=settings.classify_cache,
+)
@@ -6,6 +6,23 @@ load_dotenv()
 
 class Settings(BaseModel):
     gemini_api_key: str = os.getenv("GEMINI_API_KEY", "")
+    # Caminho assíncrono do Gemini: chamadas simultâneas e teto por classificação (s)
+    gemini_concurrency: int = int(os.getenv("GEMINI_CONCURRENCY", "4"))
+    gemini_timeout_seconds: float = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "8"))
+    # Disjuntor: falhas seguidas (ou respostas acima de GEMINI_SLOW_SECONDS) que o abrem, e por quanto tempo
+    gemini_breaker_failures: int = int(os.getenv("GEMINI_BREAKER_FAILURES", "5"))
+    gemini_slow_seconds: float = float(os.getenv("GEMINI_SLOW_SECONDS", "6"))
+    gemini_breaker_open_seconds: float = float(os.getenv("GEMINI_BREAKER_OPEN_SECONDS", "60"))
+    # Segunda chamada quando a primeira passa deste percentil de latência (0 = desligado)
+    gemini_hedge_percentile: float = float(os.getenv("GEMINI_HEDGE_PERCENTILE", "0"))
+    # Lotes: classificações que chegam dentro da janela (ms, 0 = desligado) vão numa chamada só
+    gemini_batch_window_ms: float = float(os.getenv("GEMINI_BATCH_WINDOW_MS", "0"))
+    gemini_batch_max_items: int = int(os.getenv("GEMINI_BATCH_MAX_ITEMS", "16"))
+    gemini_batch_max_tokens: int = int(os.getenv("GEMINI_BATCH_MAX_TOKENS", "6000"))
+    # Cache em disco das classificações do Gemini: validade (s) e máximo de entradas
+    classify_cache: bool = os.getenv("CLASSIFY_CACHE", "sim").lower() in ("sim","yes","true","1")
+    classify_cache_ttl_seconds: float = float(os.getenv("CLASSIFY_CACHE_TTL_SECONDS", "21600"))
+    classify_cache_max_entries: int = int(os.getenv("CLASSIFY_CACHE_MAX_ENTRIES", "20000"))
     douke_url: str = os.getenv("DOUKE_URL", "https://web.duoke.com/?lang=en#/dk/main/chat")
     max_conversations: int = int(os.getenv("MAX_CONVERSATIONS", "50"))
     history_depth: int = int(os.getenv("HISTORY_DEPTH", "8"))
@@ -13,6 +30,17 @@ class Settings(BaseModel):
     loop_interval: int = int(os.getenv("LOOP_INTERVAL", "30"))
     delay_after_nav: float = float(os.getenv("DELAY_AFTER_NAV", "1"))
     delay_between_actions: float = float(os.getenv("DELAY_BETWEEN_ACTIONS", "0.1"))
+    incremental: bool = os.getenv("INCREMENTAL", "sim").lower() in ("sim","yes","true","1")
+    ingest_mode: str = os.getenv("INGEST_MODE", "dom").lower()
+    push_mode: bool = os.getenv("PUSH_MODE", "nao").lower() in ("sim","yes","true","1")
+    full_scan_seconds: float = float(os.getenv("FULL_SCAN_SECONDS", "300"))
+    block_profile: str = os.getenv("BLOCK_PROFILE", "minimal")
+    # Conta respostas liberadas e bytes declarados (depuração: custa um evento por requisição)
+    block_stats: bool = os.getenv("BLOCK_STATS", "nao").lower() in ("sim","yes","true","1")
+    tabs: int = int(os.getenv("TABS", "1"))
+    cycle_budget_seconds: float = float(os.getenv("CYCLE_BUDGET_SECONDS", "0"))
+    modal_watcher: bool = os.getenv("MODAL_WATCHER", "sim").lower() in ("sim","yes","true","1")
+    warm_standby: bool = os.getenv("WARM_STANDBY", "nao").lower() in ("sim","yes","true","1")
     goto_timeout_ms: int = int(os.getenv("GOTO_TIMEOUT_MS", "60000"))
 
 settings = Settings()
@@ -4,11 +4,40 @@ import asyncio
 import os
 import re
 import json
+import time
+from collections import Counter
 from pathlib import Path
 from typing import Optional, Tuple
 
 from playwright.async_api import async_playwright, Error as PwError, TimeoutError as PWTimeoutError
 from .config import settings
+from .metrics import LatencyStats
+from .watermarks import WATERMARKS_PATH, WatermarkStore, signature
+from .netfeed import NetworkFeed
+from .page_watchers import (
+    EventInbox, MODAL_BINDING, ModalStats, NEW_MESSAGE_BINDING, modal_watcher_js, new_message_watcher_js,
+)
+from .waits import AdaptiveWaiter
+from .blocking import install_blocking
+from .selector_cache import SelectorResolver
+from .scheduler import PriorityScheduler
+from .session_probe import probe_session
+from .extractors import (
+    ConversationSnapshot, MESSAGES_JS, ORDER_INFO_JS, OrderInfo, ROW_INFO_JS, TRACKING_JS,
+    find_row_js, list_scan_js, snapshot_js,
+)
+
+# Teto de nós de texto visitados pelo extrator do painel de pedido
+ORDER_MAX_NODES = int(os.getenv("ORDER_MAX_NODES", "4000"))
+# Pedidos com rastreio em cache (orderId -> código)
+TRACKING_CACHE_MAX = 500
+# Perfis persistentes: o ativo e o da reserva quente (WARM_STANDBY) se alternam
+PROFILE_DIR = Path(__file__).resolve().parents[1] / "pw-user-data"
+STANDBY_PROFILE_DIR = PROFILE_DIR.with_name("pw-user-data-standby")
+# Intervalo mínimo entre tentativas de montar a reserva (s)
+STANDBY_RETRY_SECONDS = 60.0
+# Espera após cada rolagem da lista virtual para as linhas novas renderizarem
+LIST_SETTLE_MS = int(os.getenv("LIST_SETTLE_MS", "60"))
 
 # Carrega seletores configuráveis
 SEL = json.loads(
@@ -22,33 +51,141 @@ CONFIRM_RE = re.compile(
     re.I,
 )
 
+# Wrappers de modal conhecidos (Element UI / Ant Design / genéricos)
+MODAL_WRAPPERS = [
+    ".el-message-box__wrapper",
+    ".el-dialog__wrapper",
+    ".ant-modal-root",
+    ".modal",
+    "[role='dialog']",
+    "[role='alert']",
+    "[class*='tooltip']",
+    "[class*='announcement']",
+]
+
+# Wrappers que o observador da página fecha sozinho (MODAL_WATCHER)
+AUTO_DISMISS_WRAPPERS = MODAL_WRAPPERS[:4] + ["[class*='announcement']"]
+CONFIRM_WORDS = ["confirm", "确定", "确认", "ok", "confirmar", "fechar"]
+# Modais que o observador pode confirmar sozinho, pelo título/texto: sessão
+# expirada e avisos/anúncios. Qualquer outro diálogo (pedido, cancelamento)
+# fica para o close_modal do fluxo.
+KNOWN_MODALS = {
+    "sessao": r"login has expired|session (?:has )?expired|logged in (?:on|from) another|登录已过期|登录失效|sess[aã]o expirou",
+    "aviso": r"announcement|notice|what'?s new|公告|通知|aviso|novidades",
+}
+
+# Verdadeiro quando nenhum wrapper de modal está visível
+NO_MODAL_JS = """
+(sels) => !Array.from(document.querySelectorAll(sels.join(','))).some(
+  el => el.offsetParent !== null || getComputedStyle(el).position === 'fixed' && el.getClientRects().length
+)
+"""
+
+# Campo de código de verificação (2FA)
+TWO_FA_SEL = "input[name*='code' i], input[placeholder*='code' i], input[placeholder*='verification' i], input[type='tel']"
+
+# Assinatura do painel de mensagens (muda quando outra conversa é aberta)
+PANEL_SIG_JS = """
+() => {
+  const ul = document.querySelector('ul.message_main');
+  if (!ul) return '';
+  const t = (el) => ((el && el.innerText) || '').slice(0, 80);
+  return ul.children.length + '|' + t(ul.firstElementChild) + '|' + t(ul.lastElementChild);
+}
+"""
+
 def _env_or_settings(name_env: str, name_settings: str, default: str = "") -> str:
     v = os.getenv(name_env)
     if v:
         return v
     return str(getattr(settings, name_settings, default) or "")
 
+class TabState:
+    """Estado que depende do DOM de uma aba: seletores resolvidos, âncora do pedido, conversa aberta."""
+    def __init__(self):
+        self.selectors = SelectorResolver(SEL)
+        self.order_anchor = ""
+        self.open_key = ""
+
+
 class DuokeBot:
     """
     Bot Duoke independente de UI. Mantém referência à página atual para o espelho,
     faz login (com fechamento de modal), tenta detectar 2FA e expõe método para submeter o código.
     """
-    def __init__(self, storage_state_path: str = "storage_state.json"):
+    def __init__(self, storage_state_path: str = "storage_state.json", account_id: str = "", form_login: bool = True):
         # Mantido por compat
         self.storage_state_path = storage_state_path
+        # Conta (executor multi-conta): separa marcas d'água e identifica logs
+        self.account_id = account_id
+        # False: sessão expirada levanta erro em vez de logar com DUOKE_EMAIL/PASSWORD
+        self.form_login = form_login
         # Página atual (usada pelo espelho da UI)
         self.current_page = None
         # Sinaliza quando ficou parado aguardando 2FA
         self.awaiting_2fa = False
+        # Latência dos ciclos (modo worker / run_forever)
+        self.cycle_stats = LatencyStats()
+        self.last_cycle: dict = {}
+        # Somas dos contadores de todos os ciclos (abertas, respondidas, ...)
+        self.cycle_totals: Counter = Counter()
+        # Abas extras (settings.tabs > 1)
+        self._extra_tabs: list = []
+        # Marca d'água por conversa (pula conversas sem mensagem nova)
+        wm_path = WATERMARKS_PATH.with_name(f"watermarks-{account_id}.json") if account_id else WATERMARKS_PATH
+        self.watermarks = WatermarkStore(wm_path) if settings.incremental else None
+        # INGEST_MODE=network: lê chats/mensagens/pedidos do tráfego XHR/WebSocket
+        self.feed = NetworkFeed() if settings.ingest_mode == "network" else None
+        # PUSH_MODE: avisos de mensagem nova vindos de um MutationObserver na página
+        self.inbox = EventInbox() if settings.push_mode else None
+        # Esperas por condição com tempos aprendidos por etapa
+        self.waits = AdaptiveWaiter()
+        # Leitura de conversa em uma única chamada (tempo por leitura)
+        self._snapshot_js = snapshot_js()
+        self.read_stats = LatencyStats()
+        # Seletor do painel de pedido aprendido nesta sessão + tempo de extração
+        self.order_stats = LatencyStats()
+        self._tracking_cache: dict = {}
+        # Contadores do perfil de bloqueio do contexto atual
+        self.request_stats = None
+        # Por aba (TabState): alternativas de selectors.json resolvidas,
+        # âncora do painel de pedido e conversa aberta
+        self._tabs: dict = {}
+        # Contexto em uso (avisos de outros contextos, ex. a reserva, são ignorados)
+        self._active_ctx = None
+        # Tempo entre a falha do contexto e o primeiro ciclo do substituto
+        self.recovery_stats = LatencyStats()
+        self._standby_retry_at = 0.0
+        # Ordem de atendimento por SLA (espera, não lidas, status do pedido)
+        self.scheduler = PriorityScheduler()
+        # Tempo até a tela de chat no ensure_login (via sonda ou fluxo completo)
+        self.login_stats = LatencyStats()
+        # MODAL_WATCHER: modais fechados dentro da página, sem ida e volta ao Python
+        self.modal_stats = ModalStats() if settings.modal_watcher else None
+        # Perfis do run_forever (o benchmark usa diretórios descartáveis)
+        self.profile_dir = PROFILE_DIR
+        self.standby_profile_dir = STANDBY_PROFILE_DIR
 
     # ---------- infra de navegador ----------
 
-    async def _new_context(self, p):
+    async def _new_context(self, p, user_data_dir: Optional[Path] = None):
         """
         Contexto persistente: mantém cookies/localStorage dentro de 'pw-user-data'.
         Em produção (Render), iniciamos em headless e sem sandbox.
         """
-        user_data_dir = Path(__file__).resolve().parents[1] / "pw-user-data"
+        ctx, request_stats = await self._launch_context(p, user_data_dir or self.profile_dir)
+        self._activate(ctx, request_stats)
+        return ctx
+
+    def _activate(self, ctx, request_stats) -> None:
+        """Torna `ctx` o contexto em uso (contadores de bloqueio + seletores novos)."""
+        self._active_ctx = ctx
+        self.request_stats = request_stats
+        # Nova sessão: reaprende quais alternativas de seletor valem nesta UI
+        self._tabs = {}
+
+    async def _launch_context(self, p, user_data_dir: Path):
+        """Abre o navegador no perfil dado, com bloqueio e init scripts; retorna (ctx, stats)."""
         user_data_dir.mkdir(exist_ok=True)
 
         # HEADLESS=1 (padrão) para servidores sem display; HEADLESS=0 no dev local
@@ -66,24 +203,13 @@ class DuokeBot:
             ],
         )
 
-        # Bloqueia mídia/analytics e evita travas; resiliente a exceções
-        async def _route_handler(route):
-            req = route.request
-            try:
-                url = req.url.lower()
-                if req.resource_type in {"media"} or "analytics" in url:
-                    await route.abort()
-                else:
-                    await route.continue_()
-            except Exception:
-                # fallback defensivo para não quebrar o fluxo
-                try:
-                    await route.continue_()
-                except Exception:
-                    pass
+        return ctx, await self._setup_context(ctx)
 
-        # importante: no contexto assíncrono, route deve ser aguardado
-        await ctx.route("**/*", _route_handler)
+    async def _setup_context(self, ctx):
+        """Bloqueio de recursos + init scripts do bot; retorna os contadores de bloqueio."""
+        # Bloqueia recursos conforme o perfil (BLOCK_PROFILE); só as URLs
+        # bloqueadas passam pelo Python, o resto segue direto no navegador
+        request_stats = await install_blocking(ctx, settings.block_profile, count_allowed=settings.block_stats)
 
         # injeta CSS e evita espera infinita por fontes
         await ctx.add_init_script("""
@@ -99,11 +225,61 @@ class DuokeBot:
         })();
         """)
 
-        return ctx
+        if self.modal_stats:
+            await ctx.expose_binding(MODAL_BINDING, self._on_modal_event)
+            await ctx.add_init_script(
+                modal_watcher_js(
+                    AUTO_DISMISS_WRAPPERS,
+                    [
+                        SEL.get("modal_confirm_button", ""),
+                        ".el-message-box__btns .el-button--primary",
+                        ".el-dialog__footer .el-button--primary",
+                        ".ant-modal-footer .ant-btn-primary",
+                    ],
+                    CONFIRM_WORDS,
+                    KNOWN_MODALS,
+                )
+            )
+
+        if self.inbox:
+            await ctx.expose_binding(NEW_MESSAGE_BINDING, self._on_page_event)
+            await ctx.add_init_script(
+                new_message_watcher_js(SEL.get("chat_list_item", "ul.chat_list li"), ROW_INFO_JS)
+            )
+
+        return request_stats
+
+    async def attach_context(self, ctx):
+        """
+        Usa um contexto criado por fora (ex. browser.new_context(storage_state=...)
+        no executor multi-conta): instala bloqueio/init scripts, faz login se
+        preciso e devolve a página pronta para run_cycle.
+        """
+        self._activate(ctx, await self._setup_context(ctx))
+        page = await self._get_page(ctx)
+        await self.ensure_login(page)
+        return page
+
+    async def run_cycle(self, page, decide_reply_fn) -> dict:
+        """Um ciclo completo (com métricas) numa página já logada."""
+        return await self._timed_cycle(page, decide_reply_fn)
+
+    def _on_page_event(self, source, payload) -> None:
+        # a reserva também observa a lista; só o contexto em uso alimenta o ciclo
+        if source.get("context") is not self._active_ctx:
+            return
+        self.inbox.on_binding(source, payload)
+
+    def _on_modal_event(self, source, payload) -> None:
+        if source.get("context") is self._active_ctx:
+            self.modal_stats.on_binding(source, payload)
+
     async def _get_page(self, ctx):
         page = ctx.pages[0] if ctx.pages else await ctx.new_page()
         self.current_page = page
         page.set_default_timeout(6000)
+        if self.feed:
+            self.feed.attach(page)
         return page
 
     # ---------- utilitários de login / 2FA ----------
@@ -151,7 +327,7 @@ class DuokeBot:
                 "  if (btn) { btn.click(); return true; }\n"
                 "  return false;\n"
                 "}",
-                ["confirm", "确定", "确认", "ok", "confirmar", "fechar"],
+                CONFIRM_WORDS,
             )
             if clicked:
                 return "js:text"
@@ -198,13 +374,46 @@ class DuokeBot:
 
         return None, None, None
 
+    def _tab(self, page) -> TabState:
+        """Estado da aba `page` (cada aba tem sua conversa aberta e seu DOM)."""
+        st = self._tabs.get(page)
+        if st is None:
+            st = self._tabs[page] = TabState()
+        return st
+
+    def resolved_selectors(self) -> dict:
+        """Alternativas resolvidas na aba principal (espelho da UI)."""
+        st = self._tabs.get(self.current_page)
+        return st.selectors.resolved_map() if st else {"resolved": {}, "stats": {}}
+
+    def _sel(self, key: str, default: str = "", page=None) -> str:
+        """Alternativa de `key` resolvida na aba `page`, ou a lista completa do selectors.json."""
+        resolved = self._tabs[page].selectors.resolved.get(key) if page in self._tabs else None
+        return resolved or SEL.get(key, default)
+
+    def _chat_selector(self) -> str:
+        """Contêiner/itens de chat ou painel de mensagens (UI logada)."""
+        parts = [SEL.get("chat_list_container", ""), self._sel("chat_list_item", "ul.chat_list li"), "ul.message_main"]
+        return ", ".join(p for p in parts if p)
+
+    def _ready_selector(self, with_modal: bool = False) -> str:
+        """Qualquer estado "assentado" da página: chat, formulário de login e/ou modal."""
+        parts = [self._chat_selector(), "input[type='password']"]
+        if with_modal:
+            parts += MODAL_WRAPPERS[:3]
+        return ", ".join(parts)
+
+    def _submitted_selector(self) -> str:
+        """O que pode aparecer depois de enviar o formulário: chat, 2FA ou modal."""
+        return ", ".join([self._chat_selector(), TWO_FA_SEL] + MODAL_WRAPPERS[:3])
+
     async def _is_logged_ui(self, page) -> bool:
         """
         Considera logado se achar contêiner de chat ou mensagens
         visíveis.
         """
         chat_list_container = SEL.get("chat_list_container", "")
-        chat_list_item = SEL.get("chat_list_item", "ul.chat_list li")
+        chat_list_item = self._sel("chat_list_item", "ul.chat_list li", page)
         try:
             if chat_list_container:
                 sel = f"{chat_list_container}, {chat_list_item}, ul.message_main"
@@ -216,7 +425,7 @@ class DuokeBot:
             return False
 
     async def _detect_2fa_input(self, page):
-        sel = "input[name*='code' i], input[placeholder*='code' i], input[placeholder*='verification' i], input[type='tel']"
+        sel = TWO_FA_SEL
         # procura na página e iframes
         if await page.locator(sel).count() > 0:
             return page, sel
@@ -240,24 +449,47 @@ class DuokeBot:
         Vai até a URL, fecha modal de sessão expirada, faz login se necessário,
         tenta detectar 2FA. Se 2FA for solicitado, deixa self.awaiting_2fa=True
         e retorna (sem levantar exceção) — a UI deve chamar provide_2fa_code().
-        """
-        await page.goto(
-            settings.douke_url,
-            wait_until="domcontentloaded",
-            timeout=settings.goto_timeout_ms,
-        )
 
-        try:
-            await page.wait_for_timeout(800)
-            await self.close_modal(page)
-        except Exception:
-            pass
+        Antes, sonda a sessão sem renderizar nada (cookies e, se configurado,
+        endpoint de perfil do Duoke via ctx.request). Sessão válida: abre direto a tela de chat e só
+        espera a lista; o fluxo completo fica para quando a sonda falha.
+        """
+        t0 = time.perf_counter()
+        verdict, reason = await probe_session(page.context, settings.douke_url)
+        print(f"[LOGIN] sonda de sessão: {verdict} ({reason})")
+        if verdict:
+            await page.goto(
+                settings.douke_url,
+                wait_until="domcontentloaded",
+                timeout=settings.goto_timeout_ms,
+            )
+            if await self.waits.selector(page, "login.fast", self._chat_selector(), cap_ms=15000, state="visible"):
+                await self._try_close_modal(page)
+                if await self._is_logged_ui(page):
+                    self.awaiting_2fa = False
+                    self.login_stats.add(time.perf_counter() - t0)
+                    print(f"[LOGIN] sessão válida, chat pronto em {time.perf_counter() - t0:.1f}s")
+                    return
+            print("[LOGIN] chat não apareceu apesar da sonda; seguindo com o fluxo completo")
+        await self._full_login(page, navigated=bool(verdict))
+        if not self.awaiting_2fa:
+            self.login_stats.add(time.perf_counter() - t0)
+            print(f"[LOGIN] fluxo completo em {time.perf_counter() - t0:.1f}s")
+
+    async def _full_login(self, page, navigated: bool = False) -> None:
+        """Fluxo completo: SPA, modal de sessão expirada, formulário e 2FA."""
+        if not navigated:
+            await page.goto(
+                settings.douke_url,
+                wait_until="domcontentloaded",
+                timeout=settings.goto_timeout_ms,
+            )
 
-        # Aguarda rede “assentar”
-        try:
-            await page.wait_for_load_state("networkidle", timeout=30000)
-        except Exception:
-            pass
+        # Espera a SPA mostrar algo útil (chat, formulário ou modal) em vez
+        # de sleep fixo + networkidle de até 30s
+        await self.waits.selector(
+            page, "login.ready", self._ready_selector(with_modal=True), cap_ms=30000, state="visible"
+        )
 
         # Fecha modal “Your login has expired…”
         await self._try_close_modal(page)
@@ -270,17 +502,24 @@ class DuokeBot:
         # Detecta formulário de login
         fr, sel_email, sel_pass = await self._find_login_frame(page)
         if fr is None:
-            # Dá mais um tempo para montar UI
-            try:
-                await page.wait_for_timeout(1000)
-            except Exception:
-                pass
+            # Dá mais um tempo para montar UI (chat ou formulário)
+            await self.waits.selector(
+                page, "login.form", self._ready_selector(), cap_ms=10000, state="visible"
+            )
+            if await self._is_logged_ui(page):
+                self.awaiting_2fa = False
+                return
             fr, sel_email, sel_pass = await self._find_login_frame(page)
 
         if fr is None:
             # Pode ser que o chat não tenha renderizado ainda; não falha.
             return
 
+        if not self.form_login:
+            raise RuntimeError(
+                f"Sessão da conta {self.account_id or '?'} expirou; refaça o login dela (main.py /duoke/login)."
+            )
+
         # Credenciais
         email, password = self._get_creds()
         if not email or not password:
@@ -303,11 +542,12 @@ class DuokeBot:
             except Exception:
                 pass
 
-        # Espera algo acontecer
-        try:
-            await page.wait_for_load_state("networkidle", timeout=15000)
-        except Exception:
-            pass
+        # Espera algo acontecer: chat, campo de 2FA ou modal. Sem o campo de
+        # senha no alvo: ele continua na tela logo após o clique e a espera
+        # voltaria antes de o 2FA renderizar.
+        await self.waits.selector(
+            page, "login.submit", self._submitted_selector(), cap_ms=15000, state="visible",
+        )
 
         # Fecha modal novamente se reapareceu
         await self._try_close_modal(page)
@@ -322,7 +562,7 @@ class DuokeBot:
         # Caso contrário, espera o chat aparecer
         try:
             chat_list_container = SEL.get("chat_list_container", "")
-            chat_list_item = SEL.get("chat_list_item", "ul.chat_list li")
+            chat_list_item = self._sel("chat_list_item", "ul.chat_list li", page)
             if chat_list_container:
                 await page.wait_for_selector(
                     f"{chat_list_container}, {chat_list_item}, ul.message_main",
@@ -364,10 +604,7 @@ class DuokeBot:
             except Exception:
                 pass
 
-        try:
-            await page.wait_for_load_state("networkidle", timeout=30000)
-        except Exception:
-            pass
+        await self.waits.selector(page, "login.2fa", self._chat_selector(), cap_ms=30000, state="visible")
 
         # tenta fechar eventual modal remanescente
         await self._try_close_modal(page)
@@ -380,7 +617,7 @@ class DuokeBot:
     # ---------- filtros/UX ----------
 
     async def apply_needs_reply_filter(self, page):
-        if not getattr(settings, "apply_needs_reply_filter", False):
+        if not settings.apply_needs_reply_filter:
             return
         try:
             sel = SEL.get("filter_needs_reply", "")
@@ -388,94 +625,189 @@ class DuokeBot:
                 return
             locator = page.locator(sel)
             if await locator.count() > 0:
+                row_sel = self._sel("chat_list_item", "ul.chat_list li", page)
+                before = await page.evaluate(
+                    "(sel) => { const li = document.querySelector(sel); return li ? li.innerText : ''; }",
+                    row_sel,
+                )
                 await locator.first.click()
-                await page.wait_for_timeout(1000)
+                # espera a lista ser refiltrada (1ª linha muda)
+                await self.waits.function(
+                    page, "filter.apply",
+                    "([sel, before]) => { const li = document.querySelector(sel); return !li || li.innerText !== before; }",
+                    arg=[row_sel, before], cap_ms=1000,
+                )
         except Exception:
             pass
 
     # ---------- navegação entre conversas ----------
 
     def conversations(self, page):
-        return page.locator(SEL.get("chat_list_item", "ul.chat_list li"))
+        return page.locator(self._sel("chat_list_item", "ul.chat_list li", page))
 
-    async def open_conversation_by_index(self, page, idx: int) -> bool:
+    async def open_conversation_by_index(self, page, idx: int, wait_render: bool = True) -> bool:
         conv_locator = self.conversations(page)
         total = await conv_locator.count()
         if idx >= total:
             return False
 
+        before = await page.evaluate(PANEL_SIG_JS) if wait_render else ""
         await conv_locator.nth(idx).click()
+        self._tab(page).open_key = ""
+        if not wait_render:
+            # modo rede: o conteúdo chega pelo NetworkFeed, sem esperar o DOM
+            return True
+
+        await self._wait_conversation_render(page, before)
+        return True
 
-        # Aguarda painel renderizar
+    async def scan_conversation_list(self, page, limit: int = 0) -> list:
+        """
+        Lista de trabalho do ciclo: percorre a lista virtual (que só mantém
+        no DOM as linhas visíveis) rolando em janelas, e devolve as linhas
+        únicas por chave, na ordem da lista, até `limit` (0 = todas).
+        """
         try:
-            if SEL.get("message_container"):
-                await page.wait_for_selector(SEL["message_container"], timeout=15000)
-            await page.wait_for_function(
-                """() => {
-                    const ul = document.querySelector('ul.message_main');
-                    return ul && ul.children && ul.children.length > 0;
-                }""",
-                timeout=15000
+            rows = await page.evaluate(
+                list_scan_js(),
+                {
+                    "rowSel": self._sel("chat_list_item", "ul.chat_list li", page),
+                    "limit": int(limit or 0),
+                    "settleMs": LIST_SETTLE_MS,
+                },
             )
-        except Exception:
-            pass
+        except Exception as e:
+            print(f"[DEBUG] falha ao varrer a lista de conversas: {e}")
+            rows = []
+        return [r for r in rows or [] if r and r.get("key")]
 
-        try:
-            if SEL.get("input_textarea"):
-                await page.wait_for_selector(SEL["input_textarea"], timeout=8000)
-        except Exception:
-            pass
+    async def open_conversation_by_key(self, page, key: str, wait_render: bool = True) -> bool:
+        """
+        Abre a conversa pela chave estável: localiza a linha (rolando a lista
+        virtual se preciso) e clica nela. False se a conversa sumiu da lista.
+        Se ela já é a aberta nesta aba, o painel não troca: não espera a troca.
+        """
+        same = self._tab(page).open_key == key
+        before = await page.evaluate(PANEL_SIG_JS) if wait_render and not same else ""
+        found = await page.evaluate(
+            find_row_js(),
+            {
+                "rowSel": self._sel("chat_list_item", "ul.chat_list li", page),
+                "key": key,
+                "settleMs": LIST_SETTLE_MS,
+            },
+        )
+        if not found:
+            return False
+        await page.locator("[data-dk-target='1']").first.click()
+        self._tab(page).open_key = key
+        if not wait_render:
+            return True
 
-        await page.wait_for_timeout(int(getattr(settings, "delay_between_actions", 1.0) * 1000))
+        await self._wait_conversation_render(page, before)
         return True
 
+    async def _wait_conversation_render(self, page, before_sig: str = "") -> None:
+        """
+        Aguarda o painel trocar para a conversa clicada (assinatura diferente
+        da anterior) e o campo de texto aparecer.
+        """
+        if before_sig:
+            await self.waits.function(
+                page, "open.switch", f"(before) => ({PANEL_SIG_JS})() !== before",
+                arg=before_sig, cap_ms=3000,
+            )
+        # painel com mensagens + campo de texto presentes, numa única espera
+        rendered = await self.waits.function(
+            page, "open.render",
+            """([container, input]) => {
+                const ul = document.querySelector(container || 'ul.message_main');
+                if (!ul || !ul.children || ul.children.length === 0) return false;
+                return !input || !!document.querySelector(input);
+            }""",
+            arg=[self._sel("message_container", "", page), SEL.get("input_textarea", "")],
+            cap_ms=15000,
+        )
+        if rendered:
+            await self._tab(page).selectors.resolve(page, "message_container")
+        else:
+            # a alternativa guardada pode ter deixado de existir nesta UI
+            self._tab(page).selectors.invalidate("message_container")
+
     # ---------- leitura de mensagens ----------
 
     async def read_messages_with_roles(self, page, depth: int) -> list[tuple[str, str]]:
         """Retorna últimos N [(role,text)], role ∈ {'buyer','seller'}."""
         out: list[tuple[str, str]] = []
         try:
-            items = page.locator("ul.message_main > li")
-
-            # Força mais histórico: rola ao topo algumas vezes
+            # Força mais histórico: rola ao topo enquanto o histórico crescer
             try:
-                container = page.locator(SEL.get("message_container", "ul.message_main")).first
-                for _ in range(3):
-                    await container.evaluate("(el) => { el.scrollTop = 0; }")
-                    await page.wait_for_timeout(120)
+                container = page.locator(self._sel("message_container", "ul.message_main", page)).first
+                await self._load_history(page, container, cap_ms=120)
             except Exception:
                 pass
 
-            texts = await items.evaluate_all("""
-                (els) => els.map(li => {
-                    const cls = (li.className || '').toLowerCase();
-                    const role = cls.includes('lt') ? 'buyer' : (cls.includes('rt') ? 'seller' : 'system');
-                    const txtNode = li.querySelector('div.text_cont, .bubble .text, .record_item .content');
-                    const txt = (txtNode?.innerText || '').trim();
-                    return txt && role !== 'system' ? [role, txt] : null;
-                }).filter(Boolean)
-            """)
-            out = texts[-depth:]
+            texts = await page.evaluate(MESSAGES_JS)
+            out = [tuple(t) for t in texts][-depth:]
         except Exception:
             pass
         return out
 
+    async def read_conversation_snapshot(self, page, depth: int) -> ConversationSnapshot:
+        """
+        Lê a conversa aberta numa única ida ao navegador: carrega histórico,
+        mensagens com papel, pedido, rastreio e estado do campo de texto.
+        """
+        t0 = time.perf_counter()
+        raw = await page.evaluate(
+            self._snapshot_js,
+            {
+                "depth": depth,
+                "container": self._sel("message_container", "ul.message_main", page),
+                "inputs": [s.strip() for s in SEL.get("input_textarea", "").split(",") if s.strip()],
+                "rounds": 3,
+                "waitMs": 120,
+                "orderAnchor": self._tab(page).order_anchor,
+                "maxNodes": ORDER_MAX_NODES,
+                "knownTracking": list(self._tracking_cache),
+            },
+        )
+        snap = ConversationSnapshot.from_dict(raw)
+        self._note_order(page, snap.order)
+        self.read_stats.add(time.perf_counter() - t0)
+        return snap
+
+    async def _load_history(self, page, container, cap_ms: int, rounds: int = 3) -> None:
+        """
+        Rola o painel ao topo e espera o lazy-load trazer mais itens; para
+        assim que uma rolagem não carregar nada (em vez de 3 sleeps fixos).
+        """
+        for _ in range(rounds):
+            n = await container.evaluate("(el) => { el.scrollTop = 0; return el.children.length; }")
+            grew = await self.waits.function(
+                page, "history.more",
+                "([sel, n]) => { const ul = document.querySelector(sel); return !!ul && ul.children.length > n; }",
+                arg=[self._sel("message_container", "ul.message_main", page), n], cap_ms=cap_ms,
+            )
+            if not grew:
+                break
+
     async def read_messages(self, page, depth: int = 8) -> list[str]:
         """Compat: apenas textos do comprador."""
         msgs: list[str] = []
-        container = page.locator(SEL.get("message_container", "ul.message_main")).first
+        container = page.locator(self._sel("message_container", "ul.message_main", page)).first
         if not await container.count():
             print("[DEBUG] Nenhum container de mensagens encontrado")
             return msgs
 
-        for _ in range(3):
-            try:
-                await container.evaluate("(el) => { el.scrollTop = 0; }")
-                await page.wait_for_timeout(60)
-            except Exception:
-                break
+        try:
+            await self._load_history(page, container, cap_ms=60)
+        except Exception:
+            pass
 
-        buyer_sel = SEL.get("buyer_message", "ul.message_main li.lt .text_cont")
+        buyer_sel = await self._tab(page).selectors.resolve(page, "buyer_message") or self._sel(
+            "buyer_message", "ul.message_main li.lt .text_cont", page
+        )
         try:
             nodes = page.locator(buyer_sel)
             msgs = await nodes.evaluate_all(
@@ -491,81 +823,38 @@ class DuokeBot:
 
     async def read_sidebar_order_info(self, page) -> dict:
         """Extrai status, orderId, título, variação, SKU e campos rotulados do painel de pedido."""
-        return await page.evaluate("""
-        () => {
-          const norm = (s) => (s || '').replace(/\\s+/g, ' ').trim();
-
-          const panels = Array.from(document.querySelectorAll('div,section,article'));
-          let right = panels.find(el => /Buyer payment amount|Payment Time|Variation:|Varia[cç][aã]o:|SKU\\s*:/i.test(el.textContent || ''));
-          if (!right) right = document.body;
-
-          let statusNode =
-            right.querySelector('[class*="order_item_status_tags"] .el-tag, .el-tag.el-tag--warning, .el-tag--success, .el-tag--info, .el-tag') ||
-            Array.from(right.querySelectorAll('span')).find(s => {
-              const t = norm(s.textContent || '');
-              return t && t.length <= 32 && /shipped|enviado|to ship|a caminho|entregue|ready to ship|to return|returned|cancelado|canceled/i.test(t);
-            }) || null;
-          const status = norm(statusNode && statusNode.textContent) || '';
-
-          const allText = norm(right.textContent || '');
-          let orderId = '';
-          const hashId = allText.match(/#([A-Z0-9]{8,})\\b/);
-          const plainId = allText.match(/\\b[0-9A-Z]{10,}\\b/);
-          if (hashId && hashId[1]) orderId = hashId[1];
-          else if (plainId) orderId = plainId[0];
-
-          const candidates = Array.from(right.querySelectorAll('div,section,article'));
-          const scored = candidates.map(el => {
-            const t = el.textContent || '';
-            const score =
-              (/SKU\\s*:/i.test(t) ? 1 : 0) +
-              (/(Variation|Varia[cç][aã]o)\\s*:/i.test(t) ? 1 : 0) +
-              (/Buyer payment amount/i.test(t) ? 1 : 0) +
-              (/Payment Time/i.test(t) ? 1 : 0) +
-              (el.querySelector('.product_name, .order_item, .order_title, .dk_msg_order') ? 1 : 0);
-            return { el, score, len: t.length };
-          }).filter(x => x.score > 0).sort((a,b)=> b.score - a.score || b.len - a.len);
-          const card = (scored[0] && scored[0].el) || right;
-
-          let titleNode =
-            card.querySelector('.product_name, [class*="product_name"], .line_clamp_2, a[title]') ||
-            card.querySelector('a, [class*="title"], [class*="products_item"]') ||
-            card;
-          let title = '';
-          if (titleNode) {
-            const lines = norm(titleNode.textContent).split('\\n').map(norm).filter(Boolean);
-            title = lines[0] || '';
-          }
-
-          const cardText = card.textContent || '';
-          const vMatch = cardText.match(/(?:Variation|Varia[cç][aã]o)\\s*:\\s*(.+)/i);
-          const variation = norm((vMatch && vMatch[1] || '').split('\\n')[0]);
-
-          const sMatch = cardText.match(/\\bSKU\\s*:\\s*([A-Za-z0-9\\-\\._]+)/i);
-          const sku = norm((sMatch && sMatch[1]) || '');
-
-          const fields = {};
-          (right.querySelectorAll('*') || []).forEach(el => {
-            const t = norm(el.textContent);
-            const m = t.match(/^([^:]{3,}):\\s*(.+)$/);
-            if (m) {
-              const key = norm(m[1]);
-              const val = norm(m[2]);
-              if (key && val && key.length <= 64) fields[key] = val;
-            }
-          });
-
-          return { status, orderId, title, variation, sku, fields };
-        }
-        """)
+        raw = await page.evaluate(
+            ORDER_INFO_JS, {"anchor": self._tab(page).order_anchor, "maxNodes": ORDER_MAX_NODES}
+        ) or {}
+        info = self._note_order(page, OrderInfo.from_dict(raw))
+        return info.to_dict()
+
+    def _note_order(self, page, info: OrderInfo) -> OrderInfo:
+        """Guarda a âncora do painel (cache da aba) e o custo da extração."""
+        tab = self._tab(page)
+        if info.anchor and info.anchor != tab.order_anchor:
+            print(f"[DEBUG] painel de pedido ancorado em: {info.anchor}")
+            tab.order_anchor = info.anchor
+        if info.ms:
+            self.order_stats.add(info.ms / 1000.0)
+        if info.truncated:
+            print(f"[DEBUG] extração do pedido truncada em {info.visited} nós")
+        return info
 
     # ---------- envio de resposta ----------
 
-    async def send_reply(self, page, text: str):
-        candidates = [s.strip() for s in SEL.get("input_textarea", "").split(",") if s.strip()]
+    async def send_reply(self, page, text: str, input_selector: str = ""):
+        sels = self._tab(page).selectors
+        # alternativa já confirmada visível/habilitada pelo snapshot
+        if input_selector:
+            sels.learn("input_textarea", input_selector)
         box = None
 
-        for sel in candidates:
+        # usa a alternativa resolvida nesta sessão; se falhar, reprova uma vez
+        for _ in range(2):
+            sel = await sels.resolve(page, "input_textarea", negative_ttl=0)
+            if not sel:
+                break
             loc = page.locator(sel).first
             try:
                 await loc.wait_for(state="visible", timeout=5000)
@@ -573,7 +862,8 @@ class DuokeBot:
                     box = loc
                     break
             except Exception:
-                continue
+                pass
+            sels.invalidate("input_textarea")
 
         if not box:
             try:
@@ -593,29 +883,33 @@ class DuokeBot:
         await page.keyboard.press("Enter")
 
         try:
-            btn_sel = SEL.get("send_button", "")
+            btn_sel = await sels.resolve(page, "send_button")
             if btn_sel:
                 btn = page.locator(btn_sel)
                 if await btn.count() > 0:
                     await btn.first.click()
+                else:
+                    sels.invalidate("send_button")
         except Exception:
             pass
 
     # ---------- ações manuais de login/2FA ----------
 
     async def close_modal(self, page, retries: int = 3):
-        """Fecha modais, tooltips ou anúncios tentando várias abordagens."""
+        """
+        Fecha modais, tooltips ou anúncios tentando várias abordagens.
+        Com o observador da página ativo, o caso comum (nenhum modal, ou um
+        modal conhecido que a página já fechou) custa uma checagem por frame.
+        """
         frames = [page] + list(page.frames)
-        wrappers = [
-            ".el-message-box__wrapper",
-            ".el-dialog__wrapper",
-            ".ant-modal-root",
-            ".modal",
-            "[role='dialog']",
-            "[role='alert']",
-            "[class*='tooltip']",
-            "[class*='announcement']",
-        ]
+        wrappers = MODAL_WRAPPERS
+
+        if not await self._any_modal_visible(page):
+            return False
+        if self.modal_stats:
+            # dá uma chance ao observador antes das tentativas pelo Python
+            if await self.waits.function(page, "modal.auto", NO_MODAL_JS, arg=wrappers, cap_ms=300):
+                return True
 
         for _ in range(retries):
             for fr in frames:
@@ -629,7 +923,7 @@ class DuokeBot:
                             state="hidden", timeout=3000
                         )
                     except Exception:
-                        await page.wait_for_timeout(300)
+                        pass
                     where = "iframe" if fr is not page else "page"
                     print(f"[DEBUG] close_modal: {method} in {where}")
                     return True
@@ -641,7 +935,7 @@ class DuokeBot:
                 ).locator(":visible")
                 if await loc.count() > 0:
                     await loc.first.click()
-                    await page.wait_for_timeout(200)
+                    await self.waits.function(page, "modal.hidden", NO_MODAL_JS, arg=wrappers, cap_ms=200)
                     print("[DEBUG] close_modal: generic close button")
                     return True
             except Exception:
@@ -662,11 +956,22 @@ class DuokeBot:
             except Exception:
                 pass
 
-            await page.wait_for_timeout(200)
+            if await self.waits.function(page, "modal.hidden", NO_MODAL_JS, arg=wrappers, cap_ms=200):
+                break
 
         print("[DEBUG] close_modal: nenhum modal visível")
         return False
 
+    async def _any_modal_visible(self, page) -> bool:
+        """Checagem rápida (um evaluate por frame) de wrapper de modal visível."""
+        for fr in page.frames:
+            try:
+                if not await fr.evaluate(NO_MODAL_JS, MODAL_WRAPPERS):
+                    return True
+            except Exception:
+                continue
+        return False
+
     async def enter_verification_code(self, page, code: str):
         """Digita o código de verificação e confirma."""
         code = (code or "").strip()
@@ -699,154 +1004,595 @@ class DuokeBot:
         except Exception:
             # fallback: Enter
             await page.keyboard.press("Enter")
-        await page.wait_for_timeout(800)
+        # espera o campo de código sumir (ou o chat aparecer)
+        await self.waits.function(
+            page, "verify.submit",
+            "(sel) => !Array.from(document.querySelectorAll(sel)).some(el => el.offsetParent !== null)",
+            arg=TWO_FA_SEL, cap_ms=800,
+        )
         return True
 
     # ---------- utilidades ----------
 
-    async def maybe_extract_tracking(self, page) -> Optional[str]:
+    async def maybe_extract_tracking(self, page, order_id: str = "") -> Optional[str]:
+        """
+        Procura o código de rastreio dentro da página (painel do pedido/logística
+        e lista de mensagens), sem trazer o HTML inteiro para o Python.
+        O resultado fica em cache por orderId.
+        """
+        if order_id and order_id in self._tracking_cache:
+            return self._tracking_cache[order_id]
         try:
-            content = await page.content()
+            candidates = await page.evaluate(
+                TRACKING_JS,
+                {
+                    "anchor": self._tab(page).order_anchor,
+                    "container": self._sel("message_container", "ul.message_main", page),
+                    "maxNodes": ORDER_MAX_NODES,
+                },
+            )
         except Exception:
             return None
-        m = re.search(r"\b([A-Z]{2}\d{8,}[A-Z0-9]{1,})\b", content or "")
-        return m.group(1) if m else None
+        return self._remember_tracking(order_id, candidates)
+
+    def _remember_tracking(self, order_id: str, candidates) -> Optional[str]:
+        if order_id and order_id in self._tracking_cache:
+            return self._tracking_cache[order_id]
+        code = (candidates or [None])[0]
+        if order_id and code:
+            if len(self._tracking_cache) >= TRACKING_CACHE_MAX:
+                self._tracking_cache.pop(next(iter(self._tracking_cache)))
+            self._tracking_cache[order_id] = code
+        return code
 
     # ---------- modos de execução ----------
 
-    async def _cycle(self, page, decide_reply_fn):
-        """Executa um ciclo sobre as conversas visíveis."""
+    async def _cycle(self, page, decide_reply_fn, only_keys=None) -> dict:
+        """
+        Executa um ciclo sobre a lista de conversas (ou só sobre as chaves
+        em `only_keys`, quando o ciclo é disparado por avisos da página).
+        A lista é virtual: a fila de trabalho é montada por chave estável
+        rolando a lista inteira, e cada conversa é aberta pela chave, não
+        pela posição (que muda quando a lista rola ou reordena).
+        A fila é ordenada por SLA (PriorityScheduler: maior espera primeiro)
+        e o ciclo para de pegar conversas novas quando passa de
+        settings.cycle_budget_seconds; as restantes ficam para o próximo.
+        Com settings.tabs > 1 distribui as conversas entre várias abas do
+        mesmo contexto; cada aba roda seu próprio pipeline
+        abrir→ler→classificar→enviar e a posse de cada conversa é reservada
+        por chave, para que duas abas nunca respondam o mesmo chat.
+        Retorna contadores do ciclo: visíveis, abertas, respondidas.
+        """
+        stats = {"visible": 0, "opened": 0, "replied": 0, "unchanged": 0, "deferred": 0}
         # Se estiver aguardando 2FA, não tenta responder
         if self.awaiting_2fa:
             print("[DEBUG] Aguardando 2FA, ciclo pausado.")
             await asyncio.sleep(1)
-            return
+            return stats
 
         await self.apply_needs_reply_filter(page)
 
-        conv_locator = self.conversations(page)
-        await page.wait_for_timeout(300)
-        total = await conv_locator.count()
-        print(f"[DEBUG] conversas visíveis: {total}")
-
-        max_convs = int(getattr(settings, "max_conversations", 0) or 0)
-        if max_convs > 0:
-            total = min(total, max_convs)
+        if await self.waits.selector(page, "cycle.list", self._sel("chat_list_item", "ul.chat_list li", page), cap_ms=300):
+            await self._tab(page).selectors.resolve(page, "chat_list_item")
+        else:
+            self._tab(page).selectors.invalidate("chat_list_item")
+        max_convs = settings.max_conversations
+        if only_keys:
+            # o aviso já traz a linha; as renderizadas dão prévia/horário atuais
+            rendered = {}
+            try:
+                rows = await self.conversations(page).evaluate_all(
+                    f"(els) => els.map(li => ({ROW_INFO_JS})(li))"
+                )
+                rendered = {r["key"]: r for r in rows if r and r.get("key")}
+            except Exception:
+                pass
+            work = []
+            for key in only_keys:
+                payload = only_keys.get(key) if isinstance(only_keys, dict) else None
+                work.append(rendered.get(key) or payload or {"key": key})
+            print(f"[DEBUG] ciclo por evento: {len(work)} conversas")
+        else:
+            # lista inteira: a nota de SLA precisa ver também quem espera há
+            # mais tempo (lá embaixo); o corte vem depois da ordenação
+            work = await self.scan_conversation_list(page, limit=0)
+        stats["visible"] = len(work)
+        work = self.scheduler.order(work, sig_of=self._row_sig, status_of=self._known_status)
+        if max_convs > 0 and len(work) > max_convs:
+            stats["deferred"] += len(work) - max_convs
+            work = work[:max_convs]
+        print(f"[DEBUG] conversas na lista: {len(work)}")
+        budget = settings.cycle_budget_seconds
+        deadline = time.monotonic() + budget if budget > 0 else None
+
+        pages = await self._tab_pool(page)
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for info in work:
+            queue.put_nowait(info)
+
+        async def _tab_worker(tab):
+            while True:
+                if deadline is not None and time.monotonic() >= deadline:
+                    # orçamento do ciclo esgotado: o resto volta no próximo ciclo
+                    stats["deferred"] += queue.qsize()
+                    while not queue.empty():
+                        queue.get_nowait()
+                    return
+                try:
+                    info = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    await self._process_conversation(tab, info, decide_reply_fn, stats)
+                except Exception as e:
+                    # aba morta derruba o ciclo (run_forever recria o contexto)
+                    if tab.is_closed():
+                        raise
+                    print(f"[DEBUG] erro na conversa {info.get('key')}: {e}")
 
-        for i in range(total):
+        try:
+            if len(pages) == 1:
+                await _tab_worker(page)
+            else:
+                print(f"[DEBUG] processando com {len(pages)} abas")
+                await asyncio.gather(*(_tab_worker(tab) for tab in pages))
+        finally:
+            if self.watermarks:
+                self.watermarks.save()
+
+        if stats.get("unchanged"):
+            print(f"[DEBUG] {stats['unchanged']} conversas sem mensagem nova (puladas sem abrir)")
+        if stats["deferred"]:
+            self.scheduler.deferred += stats["deferred"]
+            print(f"[DEBUG] orçamento do ciclo esgotado: {stats['deferred']} conversas adiadas")
+        return stats
+
+    def _known_status(self, key: str) -> str:
+        """Status do pedido já conhecido para a conversa (rede ou visita anterior)."""
+        conv = self.feed.lookup(key) if self.feed else None
+        if conv and conv.order.get("status"):
+            return conv.order["status"]
+        return self.scheduler.status.get(key, "")
+
+    # ---------- pool de abas ----------
+
+    async def _tab_pool(self, page) -> list:
+        """
+        Retorna [page, *abas extras] conforme settings.tabs. As abas extras
+        são criadas no mesmo contexto (mesma sessão) e reaproveitadas entre
+        ciclos; abas fechadas/quebradas são recriadas.
+        """
+        want = max(1, settings.tabs)
+        extras = [t for t in self._extra_tabs if not t.is_closed()]
+        self._tabs = {t: st for t, st in self._tabs.items() if not t.is_closed()}
+        while len(extras) < want - 1:
+            tab = await page.context.new_page()
+            tab.set_default_timeout(6000)
+            if self.feed:
+                self.feed.attach(tab)
             try:
-                ok = await self.open_conversation_by_index(page, i)
-                if not ok:
-                    continue
+                await self._prepare_tab(tab)
             except Exception as e:
-                print(f"[DEBUG] falha ao abrir conversa {i}: {e}")
-                continue
+                print(f"[DEBUG] falha ao preparar aba extra: {e}")
+                try:
+                    await tab.close()
+                except Exception:
+                    pass
+                break
+            extras.append(tab)
+        self._extra_tabs = extras[: want - 1]
+        return [page, *self._extra_tabs]
 
+    async def _prepare_tab(self, tab) -> None:
+        """Abre o chat numa aba extra (a sessão já vem do contexto)."""
+        await tab.goto(
+            settings.douke_url,
+            wait_until="domcontentloaded",
+            timeout=settings.goto_timeout_ms,
+        )
+        await self._try_close_modal(tab)
+        await tab.wait_for_selector(self._sel("chat_list_item", "ul.chat_list li", tab), timeout=30000)
+        await self.apply_needs_reply_filter(tab)
+
+    async def row_info(self, page, idx: int) -> dict:
+        """
+        Lê a linha idx da lista sem abrir a conversa: chave estável (atributos
+        de id ou nome do comprador), prévia e horário da última mensagem.
+        """
+        try:
+            return await self.conversations(page).nth(idx).evaluate(ROW_INFO_JS) or {}
+        except Exception:
+            return {}
+
+    async def conversation_key(self, page, idx: int) -> str:
+        return (await self.row_info(page, idx)).get("key", "")
+
+    async def _row_info_by_key(self, page, key: str) -> dict:
+        """Procura, entre as linhas renderizadas, a linha com a chave dada."""
+        try:
+            rows = await self.conversations(page).evaluate_all(
+                f"(els) => els.map(li => ({ROW_INFO_JS})(li))"
+            )
+        except Exception:
+            return {}
+        return next((r for r in rows if r and r.get("key") == key), {})
+
+    @staticmethod
+    def _row_sig(info: dict) -> str:
+        return signature(info.get("preview", ""), info.get("time", ""))
+
+    async def _process_conversation(self, page, info: dict, decide_reply_fn, stats: dict) -> None:
+        """Pipeline de uma conversa (linha da lista): abrir → ler → classificar → enviar."""
+        key = info.get("key", "")
+        sig = self._row_sig(info)
+        if self.watermarks and self.watermarks.unchanged(key, sig):
+            stats["unchanged"] += 1
+            return
+
+        depth = settings.history_depth
+        conv = self.feed.lookup(key) if self.feed else None
+        if conv and conv.last_role == "seller":
+            # a lista (via rede) já diz que respondemos por último: nem abre
+            print(f"[DEBUG] pulando {key}: última mensagem (rede) é do vendedor")
+            self._mark(key, sig, "")
+            return
+
+        opened_at = time.time()
+        try:
+            ok = await self.open_conversation_by_key(page, key, wait_render=not self.feed)
+            if not ok:
+                print(f"[DEBUG] conversa {key} não está mais na lista")
+                return
+        except Exception as e:
+            print(f"[DEBUG] falha ao abrir conversa {key}: {e}")
+            return
+        stats["opened"] += 1
+
+        pairs: list = []
+        order_info: dict = {}
+        if self.feed:
+            conv = await self.feed.wait_for_messages(key)
+            if conv and conv.messages:
+                order_info = dict(conv.order)
+                if conv.roles_known(depth):
+                    pairs = conv.pairs(depth)
+                else:
+                    print(f"[DEBUG] conversa {key}: remetente desconhecido na rede; lendo pelo DOM")
+            if not order_info and self.feed.last_order.get("_ts", 0) >= opened_at:
+                order_info = {k: v for k, v in self.feed.last_order.items() if not k.startswith("_")}
+            if pairs:
+                print(f"[DEBUG] conversa {key}: {len(pairs)} msgs via rede")
+            else:
+                # rede não trouxe o histórico: volta para o DOM
+                await self._wait_conversation_render(page)
+
+        snap = None
+        if not pairs:
+            # DOM: tudo numa única chamada (mensagens, pedido, rastreio, campo)
+            try:
+                snap = await self.read_conversation_snapshot(page, depth)
+            except Exception as e:
+                print(f"[DEBUG] falha ao ler conversa {key}: {e}")
+                snap = ConversationSnapshot()
+            pairs = snap.messages
+            order_info = order_info or snap.order.to_dict()
+            print(
+                f"[DEBUG] conversa {key}: {len(pairs)} msgs (com role) | "
+                f"leitura {snap.timings_ms.get('total', 0):.0f}ms em página"
+            )
+        elif not order_info:
             try:
                 order_info = await self.read_sidebar_order_info(page)
-                print("[DEBUG] Order info:", order_info)
             except Exception as e:
                 order_info = {}
                 print(f"[DEBUG] falha ao ler order_info: {e}")
+        print("[DEBUG] Order info:", order_info)
+        self.scheduler.note_status(key, order_info.get("status", ""))
+        if not pairs:
+            return
 
-            pairs = await self.read_messages_with_roles(page, int(getattr(settings, "history_depth", 5) or 5))
-            print(f"[DEBUG] conversa {i}: {len(pairs)} msgs (com role)")
-            if not pairs:
-                continue
-
-            # responder apenas se a última mensagem for do comprador
-            last_role, _ = pairs[-1]
-            if last_role != "buyer":
-                print("[DEBUG] pulando: última mensagem não é do comprador")
-                continue
+        # responder apenas se a última mensagem for do comprador
+        last_role, last_text = pairs[-1]
+        if last_role != "buyer":
+            print("[DEBUG] pulando: última mensagem não é do comprador")
+            self._mark(key, sig, "")
+            return
 
-            buyer_only = [t for r, t in pairs if r == "buyer"]
+        buyer_only = [t for r, t in pairs if r == "buyer"]
 
-            should = False
-            reply = ""
-            try:
-                params = inspect.signature(decide_reply_fn).parameters
-                if len(params) >= 2:
-                    result = decide_reply_fn(pairs, buyer_only)
-                else:
-                    result = decide_reply_fn(buyer_only)
-                if inspect.isawaitable(result):
-                    result = await result
-                should, reply = result
-            except Exception as e:
-                print(f"[DEBUG] erro no hook/classificador: {e}")
-                continue
+        should = False
+        reply = ""
+        try:
+            params = inspect.signature(decide_reply_fn).parameters
+            if len(params) >= 2:
+                result = decide_reply_fn(pairs, buyer_only)
+            else:
+                result = decide_reply_fn(buyer_only)
+            if inspect.isawaitable(result):
+                result = await result
+            should, reply = result
+        except Exception as e:
+            print(f"[DEBUG] erro no hook/classificador: {e}")
+            return
 
-            print(f"[DEBUG] decide: should={should} | Resposta: {reply}")
-            if not should:
-                continue
+        print(f"[DEBUG] decide: should={should} | Resposta: {reply}")
+        if not should:
+            self._mark(key, sig, last_text)
+            return
 
-            if order_info.get("status"):
-                if "status:" not in reply.lower():
-                    reply += f"\n\n_Status atual do pedido:_ **{order_info['status']}**"
-            if order_info.get("orderId") and "{ORDER_ID}" in reply:
-                reply = reply.replace("{ORDER_ID}", order_info["orderId"])
-
-            tracking = await self.maybe_extract_tracking(page)
-            if tracking and "aplicativo da Shopee" in reply:
-                reply = reply.replace(
-                    "aplicativo da Shopee",
-                    f"aplicativo da Shopee (código {tracking})"
-                )
+        if order_info.get("status"):
+            if "status:" not in reply.lower():
+                reply += f"\n\n_Status atual do pedido:_ **{order_info['status']}**"
+        if order_info.get("orderId") and "{ORDER_ID}" in reply:
+            reply = reply.replace("{ORDER_ID}", order_info["orderId"])
+
+        order_id = order_info.get("orderId", "")
+        if snap:
+            tracking = self._remember_tracking(order_id, snap.tracking_candidates)
+        else:
+            tracking = await self.maybe_extract_tracking(page, order_id)
+        if tracking and "aplicativo da Shopee" in reply:
+            reply = reply.replace(
+                "aplicativo da Shopee",
+                f"aplicativo da Shopee (código {tracking})"
+            )
 
-            await self.send_reply(page, reply)
-            await page.wait_for_timeout(int(getattr(settings, "delay_between_actions", 1.0) * 1000))
+        await self.send_reply(page, reply, input_selector=snap.input.selector if snap else "")
+        stats["replied"] += 1
+        self.scheduler.record_reply(info)
+        # confirma o envio (campo de texto esvaziado); delay_between_actions vira o teto
+        await self.waits.function(
+            page, "send.done",
+            """(sel) => {
+                const el = document.querySelector(sel);
+                return !el || !((el.value !== undefined ? el.value : el.innerText) || '').trim();
+            }""",
+            arg=SEL.get("input_textarea", "textarea"),
+            cap_ms=int(settings.delay_between_actions * 1000),
+        )
 
-    async def run_once(self, decide_reply_fn):
+        # A prévia da linha agora mostra a nossa resposta: grava essa assinatura
+        if self.watermarks and key:
+            after = await self._row_info_by_key(page, key)
+            self._mark(key, self._row_sig(after) or sig, last_text)
+
+    def _mark(self, key: str, sig: str, last_buyer: str) -> None:
+        if self.watermarks:
+            self.watermarks.mark(key, sig, last_buyer)
+
+    async def _timed_cycle(self, page, decide_reply_fn, only_keys=None) -> dict:
+        """Roda um ciclo medindo a latência e registrando em self.cycle_stats."""
+        t0 = time.perf_counter()
+        stats = await self._cycle(page, decide_reply_fn, only_keys=only_keys) or {}
+        elapsed = time.perf_counter() - t0
+        self.cycle_stats.add(elapsed)
+        waited = self.waits.take_cycle_spent()
+        self.last_cycle = {**stats, "seconds": round(elapsed, 3), "waited": round(waited, 3)}
+        self.cycle_totals.update({k: v for k, v in stats.items() if isinstance(v, int)})
+        print(
+            f"[LOOP] ciclo #{self.cycle_stats.count} em {elapsed:.2f}s | "
+            f"visíveis={stats.get('visible', 0)} abertas={stats.get('opened', 0)} "
+            f"respondidas={stats.get('replied', 0)} sem_novidade={stats.get('unchanged', 0)} "
+            f"adiadas={stats.get('deferred', 0)} | "
+            f"{self.cycle_stats.summary()} | esperas {waited:.2f}s"
+        )
+        if self.cycle_stats.count % 10 == 1:
+            print(f"[WAIT] {self.waits.summary()}")
+            if self.read_stats.count:
+                print(f"[READ] snapshot de conversa: {self.read_stats.summary()}")
+            if self.order_stats.count:
+                print(f"[READ] painel de pedido (em página): {self.order_stats.summary()}")
+            if self.request_stats:
+                print(f"[BLOCK] {self.request_stats.summary()}")
+            if self.modal_stats and self.modal_stats.dismissed:
+                print(f"[MODAL] {self.modal_stats.summary()}")
+            if self.scheduler.wait_stats.count:
+                print(f"[SLA] {self.scheduler.summary()}")
+        return stats
+
+    async def run_once(self, decide_reply_fn, linger_seconds: float = 60.0):
         """Modo pontual (mantido por compat)."""
         async with async_playwright() as p:
             ctx = await self._new_context(p)
             page = await self._get_page(ctx)
             await self.ensure_login(page)
-            await self._cycle(page, decide_reply_fn)
-            print("[DEBUG] Execução concluída. Mantendo o navegador aberto por ~60s...")
-            await asyncio.sleep(60)
+            await self._timed_cycle(page, decide_reply_fn)
+            if linger_seconds > 0:
+                print(f"[DEBUG] Execução concluída. Mantendo o navegador aberto por ~{linger_seconds:.0f}s...")
+                await asyncio.sleep(linger_seconds)
             try:
                 await ctx.close()
             finally:
                 self.current_page = None
 
+    async def _wait_events(self, last_full: float):
+        """
+        Modo push: dorme até a página avisar de mensagem nova. Retorna
+        {chave: linha avisada}, ou None quando vence a varredura completa de segurança.
+        """
+        full_every = settings.full_scan_seconds
+        left = full_every - (time.monotonic() - last_full)
+        if left <= 0:
+            return None
+        events = await self.inbox.wait(timeout=left)
+        if not events:
+            print("[LOOP] varredura completa de segurança")
+            return None
+        print(
+            f"[LOOP] {len(events)} conversa(s) com mensagem nova: {', '.join(events)} | "
+            f"atraso do aviso {self.inbox.latency.summary()}"
+        )
+        return events
+
+    # ---------- reserva quente (WARM_STANDBY) ----------
+
+    async def _build_standby(self, p, user_data_dir: Path, cookies: list):
+        """
+        Sobe um contexto reserva no outro perfil, com os cookies da sessão
+        ativa, e o deixa parado na tela de chat. Retorna (ctx, stats, dir) ou
+        None se não conseguiu chegar ao chat (ex. sessão exige 2FA).
+        """
+        t0 = time.perf_counter()
+        ctx = None
+        try:
+            ctx, request_stats = await self._launch_context(p, user_data_dir)
+            if cookies:
+                await ctx.add_cookies(cookies)
+            page = ctx.pages[0] if ctx.pages else await ctx.new_page()
+            page.set_default_timeout(6000)
+            await page.goto(settings.douke_url, wait_until="domcontentloaded", timeout=settings.goto_timeout_ms)
+            await page.wait_for_selector(self._chat_selector(), state="visible", timeout=30000)
+            await self._try_close_modal(page)
+            print(f"[STANDBY] reserva pronta em {time.perf_counter() - t0:.1f}s ({user_data_dir.name})")
+            return ctx, request_stats, user_data_dir
+        except asyncio.CancelledError:
+            await self._close_quietly(ctx)
+            raise
+        except Exception as e:
+            print(f"[STANDBY] falha ao preparar a reserva: {e}")
+            await self._close_quietly(ctx)
+            return None
+
+    async def _keep_standby(self, p, task, user_data_dir: Path, ctx):
+        """(Re)inicia a montagem da reserva se não há uma pronta ou a caminho."""
+        if task is not None and not self._standby_failed(task):
+            return task
+        if self.awaiting_2fa or time.monotonic() < self._standby_retry_at:
+            return task
+        self._standby_retry_at = time.monotonic() + STANDBY_RETRY_SECONDS
+        try:
+            cookies = await ctx.cookies()
+        except Exception:
+            cookies = []
+        return asyncio.create_task(self._build_standby(p, user_data_dir, cookies))
+
+    @staticmethod
+    def _standby_failed(task) -> bool:
+        """Montagem terminada sem reserva utilizável (cancelada, erro ou None)."""
+        if not task.done():
+            return False
+        if task.cancelled():
+            print("[STANDBY] montagem da reserva cancelada; refazendo")
+            return True
+        err = task.exception()
+        if err is not None:
+            print(f"[STANDBY] montagem da reserva falhou: {err}; refazendo")
+            return True
+        return task.result() is None
+
+    async def _take_standby(self, task):
+        """Promove a reserva (esperando terminar se ainda estiver subindo)."""
+        if task is None or (task.done() and self._standby_failed(task)):
+            return None
+        try:
+            built = await task
+        except Exception:
+            return None
+        if built is None:
+            return None
+        ctx, request_stats, user_data_dir = built
+        self._activate(ctx, request_stats)
+        try:
+            page = await self._get_page(ctx)
+            await self._try_close_modal(page)
+            if not await self._is_logged_ui(page):
+                # sessão da reserva caiu enquanto esperava: login no próprio contexto
+                await self.ensure_login(page)
+        except Exception:
+            await self._close_quietly(ctx)
+            raise
+        return ctx, page, user_data_dir
+
+    @staticmethod
+    async def _close_quietly(ctx) -> None:
+        if ctx is None:
+            return
+        try:
+            await ctx.close()
+        except Exception:
+            pass
+
     async def run_forever(self, decide_reply_fn, idle_seconds: float = 3.0):
         """
         Loop infinito, com auto-recuperação.
-        Use este método a partir do app_ui (start/stop via task).
+        Mantém um único contexto/página vivo entre ciclos (só refaz o login
+        se a sessão cair) e registra a latência de cada ciclo.
+        Use este método a partir do app_ui (start/stop via task) ou do
+        modo worker de src.run_loop.
+
+        Com WARM_STANDBY=sim mantém um segundo contexto (outro perfil, mesmos
+        cookies) já logado na tela de chat. Se o contexto ativo falhar, a
+        reserva é promovida na hora e o perfil que falhou vira a nova reserva,
+        montada em segundo plano. O tempo de recuperação vai para
+        self.recovery_stats.
         """
+        standby_on = settings.warm_standby
         async with async_playwright() as p:
-            while True:
-                ctx = None
-                try:
-                    ctx = await self._new_context(p)
-                    page = await self._get_page(ctx)
-                    await self.ensure_login(page)
-
-                    while True:
-                        await self._cycle(page, decide_reply_fn)
-                        await asyncio.sleep(idle_seconds)
-
-                except asyncio.CancelledError:
-                    try:
-                        if ctx:
-                            await ctx.close()
-                    finally:
-                        self.current_page = None
-                    break
-                except PwError as e:
-                    print(f"[ERROR] Playwright: {e}. Reiniciando em 2s...")
-                    await asyncio.sleep(2)
-                    continue
-                except Exception as e:
-                    print(f"[ERROR] run_forever: {e}. Tentando novamente em 2s...")
-                    await asyncio.sleep(2)
-                    continue
-                finally:
+            active_dir = self.profile_dir
+            standby_task = None
+            failed_at = None
+            ctx = None
+            try:
+                while True:
                     try:
-                        if ctx:
-                            await ctx.close()
-                    except Exception:
-                        pass
+                        promoted = await self._take_standby(standby_task)
+                        standby_task = None
+                        if promoted:
+                            ctx, page, active_dir = promoted
+                            print(f"[STANDBY] reserva promovida ({active_dir.name})")
+                        else:
+                            ctx = await self._new_context(p, active_dir)
+                            page = await self._get_page(ctx)
+                            await self.ensure_login(page)
+                        spare_dir = self.standby_profile_dir if active_dir == self.profile_dir else self.profile_dir
+
+                        only_keys = None
+                        last_full = 0.0
+                        while True:
+                            if only_keys is None:
+                                last_full = time.monotonic()
+                            stats = await self._timed_cycle(page, decide_reply_fn, only_keys=only_keys)
+                            if failed_at is not None:
+                                self.recovery_stats.add(time.monotonic() - failed_at)
+                                failed_at = None
+                                print(
+                                    f"[LOOP] recuperado ({'reserva' if promoted else 'contexto novo'}) | "
+                                    f"recuperação {self.recovery_stats.summary()}"
+                                )
+                            # Lista vazia pode indicar sessão expirada: revalida só nesse caso
+                            if not stats.get("visible") and not self.awaiting_2fa:
+                                if not await self._is_logged_ui(page):
+                                    print("[LOOP] sessão parece ter caído; refazendo login...")
+                                    await self.ensure_login(page)
+                            if standby_on:
+                                standby_task = await self._keep_standby(p, standby_task, spare_dir, ctx)
+                            if self.inbox and not self.awaiting_2fa:
+                                only_keys = await self._wait_events(last_full)
+                            else:
+                                await asyncio.sleep(idle_seconds)
+
+                    except asyncio.CancelledError:
+                        break
+                    except PwError as e:
+                        print(f"[ERROR] Playwright: {e}. Recuperando...")
+                    except Exception as e:
+                        print(f"[ERROR] run_forever: {e}. Recuperando...")
+                    if failed_at is None:
+                        failed_at = time.monotonic()
+                    await self._close_quietly(ctx)
+                    ctx = None
                     self.current_page = None
+                    if standby_task is None:
+                        await asyncio.sleep(2)
+            finally:
+                await self._close_quietly(ctx)
+                self.current_page = None
+                if standby_task is not None:
+                    standby_task.cancel()
+                    try:
+                        built = await standby_task
+                    except BaseException:
+                        built = None
+                    if built:
+                        await self._close_quietly(built[0])
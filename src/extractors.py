@@ -0,0 +1,417 @@
+# src/extractors.py
+"""
+Extratores que rodam dentro da página (JS) e seus resultados tipados.
+
+SNAPSHOT_JS junta, numa única chamada page.evaluate, tudo o que o ciclo
+precisa de uma conversa aberta: mensagens com papel, dados do pedido,
+código de rastreio e o estado do campo de texto. Os extratores individuais
+(ORDER_INFO_JS, MESSAGES_JS, ...) continuam disponíveis para os métodos
+avulsos do DuokeBot.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+# Resumo de uma linha da lista de conversas: chave estável (id em atributos ou
+# nome do comprador) + prévia/horário da última mensagem (base da marca d'água)
+ROW_INFO_JS = """
+(li) => {
+  const norm = (s) => (s || '').replace(/\\s+/g, ' ').trim();
+  let key = '';
+  const attrs = ['data-id', 'data-key', 'data-conversation-id', 'data-session-id', 'data-buyer-id', 'id'];
+  for (const el of [li, ...li.querySelectorAll('[data-id],[data-key],[data-conversation-id],[data-session-id],[data-buyer-id]')]) {
+    for (const a of attrs) {
+      const v = el.getAttribute && el.getAttribute(a);
+      if (v) { key = a + ':' + v; break; }
+    }
+    if (key) break;
+  }
+  const lines = (li.innerText || '').split('\\n').map(norm).filter(Boolean);
+  const nameEl = li.querySelector('.name, .nickname, .user_name, [class*="name"]');
+  const name = norm(nameEl && nameEl.innerText) || lines[0] || '';
+  if (!key && name) key = 'name:' + name;
+  const pick = (sel) => { const el = li.querySelector(sel); return el ? norm(el.innerText) : ''; };
+  const time = pick('.time, .date, [class*="time"]');
+  const unreadTxt = pick('.el-badge__content, .badge, [class*="unread"], [class*="badge"]');
+  let preview = pick('.msg, .last_msg, .content, [class*="msg"], [class*="content"]');
+  if (!preview) preview = lines.filter(l => l !== name && l !== time && l !== unreadTxt).join(' ');
+  return { key, name, preview, time, unread: parseInt(unreadTxt, 10) || 0 };
+}
+"""
+
+# Peças comuns dos scripts da lista virtual: contêiner rolável e espera curta
+_LIST_HELPERS_JS = """
+  const rowInfo = %(row_info)s;
+  const scroller = () => {
+    const first = document.querySelector(rowSel);
+    let el = first && first.parentElement;
+    while (el && el !== document.body) {
+      const oy = getComputedStyle(el).overflowY;
+      if (el.scrollHeight > el.clientHeight + 4 && (oy === 'auto' || oy === 'scroll')) return el;
+      el = el.parentElement;
+    }
+    return first ? (first.closest('.virtual_list') || null) : null;
+  };
+  const settle = () => new Promise(res => setTimeout(res, settleMs || 60));
+  const rows = () => Array.from(document.querySelectorAll(rowSel));
+  // Marca a rolagem como do bot: o observador de mensagens novas (PUSH_MODE)
+  // ignora a lista enquanto isso e retoma a partir do estado final
+  const scanning = async (fn) => {
+    window.__duokeScanning = (window.__duokeScanning || 0) + 1;
+    try { return await fn(); } finally {
+      window.__duokeScanning -= 1;
+      window.dispatchEvent(new Event('duoke-scan-done'));
+    }
+  };
+"""
+
+# Percorre a lista virtual em janelas (rolando o contêiner) e devolve as linhas
+# únicas por chave, na ordem da lista, até `limit`.
+LIST_SCAN_JS = """
+async ({ rowSel, limit, settleMs }) => {
+%(helpers)s
+  return scanning(async () => {
+  const out = [];
+  const seen = new Set();
+  const collect = () => rows().forEach(li => {
+    let info;
+    try { info = rowInfo(li); } catch (e) { return; }
+    if (info && info.key && !seen.has(info.key)) { seen.add(info.key); out.push(info); }
+  });
+  const sc = scroller();
+  if (!sc) { collect(); return limit ? out.slice(0, limit) : out; }
+  sc.scrollTop = 0;
+  await settle();
+  collect();
+  for (let guard = 0; guard < 500 && (!limit || out.length < limit); guard++) {
+    const before = sc.scrollTop;
+    sc.scrollTop = before + Math.max(40, Math.floor(sc.clientHeight * 0.8));
+    await settle();
+    collect();
+    if (sc.scrollTop <= before + 1) break;  // chegou ao fim
+  }
+  sc.scrollTop = 0;
+  return limit ? out.slice(0, limit) : out;
+  });
+}
+"""
+
+# Localiza a linha com a chave (rolando a lista se não estiver renderizada),
+# traz para a viewport e marca com data-dk-target para o clique do Playwright.
+FIND_ROW_JS = """
+async ({ rowSel, key, settleMs }) => {
+%(helpers)s
+  return scanning(async () => {
+  document.querySelectorAll('[data-dk-target]').forEach(el => el.removeAttribute('data-dk-target'));
+  const find = () => rows().find(li => { try { return rowInfo(li).key === key; } catch (e) { return false; } });
+  let li = find();
+  const sc = scroller();
+  if (!li && sc) {
+    sc.scrollTop = 0;
+    await settle();
+    li = find();
+    for (let guard = 0; !li && guard < 500; guard++) {
+      const before = sc.scrollTop;
+      sc.scrollTop = before + Math.max(40, Math.floor(sc.clientHeight * 0.8));
+      await settle();
+      li = find();
+      if (!li && sc.scrollTop <= before + 1) break;
+    }
+  }
+  if (!li) return false;
+  li.scrollIntoView({ block: 'nearest' });
+  li.setAttribute('data-dk-target', '1');
+  return true;
+  });
+}
+"""
+
+
+def _with_list_helpers(template: str) -> str:
+    helpers = _LIST_HELPERS_JS % {"row_info": ROW_INFO_JS.strip()}
+    return template % {"helpers": helpers}
+
+
+def list_scan_js() -> str:
+    return _with_list_helpers(LIST_SCAN_JS)
+
+
+def find_row_js() -> str:
+    return _with_list_helpers(FIND_ROW_JS)
+
+
+# Painel lateral do pedido: status, orderId, título, variação, SKU e campos rotulados.
+# Localiza o painel uma vez (âncora devolvida em `anchor` para cache por sessão)
+# e percorre apenas nós de texto folha, com teto de nós visitados, em vez de
+# serializar textContent de cada elemento/ancestral.
+ORDER_INFO_JS = """
+(opts) => {
+  const t0 = performance.now();
+  const o = opts || {};
+  const maxNodes = o.maxNodes || 4000;
+  const norm = (s) => (s || '').replace(/\\s+/g, ' ').trim();
+  const LABEL_RE = /Buyer payment amount|Payment Time|Variation\\s*:|Varia[cç][aã]o\\s*:|SKU\\s*:/i;
+  const PANEL_CLS_RE = /order|right|side|aside|panel/i;
+  const STATUS_RE = /shipped|enviado|to ship|a caminho|entregue|ready to ship|to return|returned|cancelado|canceled/i;
+  let visited = 0;
+  let truncated = false;
+
+  // nós de texto não vazios sob root (até `limit`); para no 1º que satisfizer `stop`
+  const textNodes = (root, limit, stop) => {
+    const out = [];
+    const w = document.createTreeWalker(root, NodeFilter.SHOW_TEXT);
+    let n, seen = 0;
+    while ((n = w.nextNode())) {
+      visited++;
+      if (++seen > limit) { truncated = true; break; }
+      const t = norm(n.nodeValue);
+      if (!t) continue;
+      out.push([n, t]);
+      if (stop && stop(t)) break;
+    }
+    return out;
+  };
+
+  const anchorFor = (el) => {
+    if (el.id) return '#' + CSS.escape(el.id);
+    const parts = [];
+    for (let cur = el; cur && cur !== document.body && parts.length < 3; cur = cur.parentElement) {
+      const cls = Array.from(cur.classList).filter(c => /^[A-Za-z_][\\w-]*$/.test(c)).slice(0, 2);
+      parts.unshift(cur.tagName.toLowerCase() + cls.map(c => '.' + c).join(''));
+      if (cls.length && document.querySelectorAll(parts.join(' > ')).length === 1) break;
+    }
+    return parts.join(' > ');
+  };
+
+  // 1) painel: âncora em cache, se ainda válida; senão sobe a partir do 1º rótulo
+  let right = null;
+  let anchor = o.anchor || '';
+  if (anchor) {
+    try { right = document.querySelector(anchor); } catch (e) { right = null; }
+    if (right && !LABEL_RE.test(right.textContent || '')) right = null;
+  }
+  if (!right) {
+    anchor = '';
+    const hit = textNodes(document.body, maxNodes * 4, t => LABEL_RE.test(t)).find(([n, t]) => LABEL_RE.test(t));
+    if (hit) {
+      let el = hit[0].parentElement;
+      for (let i = 0; el && el.parentElement && i < 12; i++) {
+        if (el !== hit[0].parentElement && PANEL_CLS_RE.test(el.className || '')) break;
+        el = el.parentElement;
+      }
+      right = el;
+      if (right) anchor = anchorFor(right);
+    }
+  }
+  if (!right) {
+    return { status: '', orderId: '', title: '', variation: '', sku: '', fields: {},
+             anchor: '', visited, truncated, ms: performance.now() - t0 };
+  }
+
+  // 2) só nós de texto folha do painel, com teto
+  const texts = textNodes(right, maxNodes);
+  const flat = texts.map(([, t]) => t);
+
+  const statusNode =
+    right.querySelector('[class*="order_item_status_tags"] .el-tag, .el-tag.el-tag--warning, .el-tag--success, .el-tag--info, .el-tag');
+  let status = norm(statusNode && statusNode.textContent);
+  if (!status) status = flat.find(t => t.length <= 32 && STATUS_RE.test(t)) || '';
+
+  const allText = flat.join(' ');
+  let orderId = '';
+  const hashId = allText.match(/#([A-Z0-9]{8,})\\b/);
+  const plainId = allText.match(/\\b[0-9A-Z]{10,}\\b/);
+  if (hashId && hashId[1]) orderId = hashId[1];
+  else if (plainId) orderId = plainId[0];
+
+  const titleNode = right.querySelector('.product_name, [class*="product_name"], .line_clamp_2, a[title]') ||
+                    right.querySelector('a, [class*="title"], [class*="products_item"]');
+  const title = titleNode ? norm(titleNode.textContent) : (flat[0] || '');
+
+  // "Rótulo: valor" no mesmo nó ou "Rótulo:" seguido do valor no próximo nó
+  const fields = {};
+  for (let i = 0; i < flat.length; i++) {
+    const t = flat[i];
+    let m = t.match(/^([^:]{2,64}):\\s*(.+)$/);
+    if (m) { fields[norm(m[1])] = norm(m[2]); continue; }
+    m = t.match(/^([^:]{2,64}):$/);
+    if (m && i + 1 < flat.length && !/:$/.test(flat[i + 1])) fields[norm(m[1])] = flat[i + 1];
+  }
+  const pick = (re) => {
+    for (const [k, v] of Object.entries(fields)) if (re.test(k)) return v;
+    return '';
+  };
+  const variation = pick(/^(Variation|Varia[cç][aã]o)$/i);
+  const skuRaw = pick(/^SKU$/i);
+  const skuM = skuRaw.match(/^[A-Za-z0-9\\-\\._]+/);
+  const sku = skuM ? skuM[0] : '';
+
+  return { status, orderId, title, variation, sku, fields,
+           anchor, visited, truncated, ms: performance.now() - t0 };
+}
+"""
+
+# Mensagens do painel aberto: [[role, texto], ...] com role em {'buyer','seller'}
+MESSAGES_JS = """
+() => Array.from(document.querySelectorAll('ul.message_main > li')).map(li => {
+    const cls = (li.className || '').toLowerCase();
+    const role = cls.includes('lt') ? 'buyer' : (cls.includes('rt') ? 'seller' : 'system');
+    const txtNode = li.querySelector('div.text_cont, .bubble .text, .record_item .content');
+    const txt = (txtNode?.innerText || '').trim();
+    return txt && role !== 'system' ? [role, txt] : null;
+}).filter(Boolean)
+"""
+
+# Códigos de rastreio candidatos (mesma regex de antes), procurados só no painel
+# do pedido/logística e na lista de mensagens, sem serializar a página inteira.
+TRACKING_JS = """
+(opts) => {
+  const o = opts || {};
+  const max = o.maxNodes || 4000;
+  const RE = /\\b([A-Z]{2}\\d{8,}[A-Z0-9]{1,})\\b/g;
+  const roots = [];
+  if (o.anchor) {
+    try { const el = document.querySelector(o.anchor); if (el) roots.push(el); } catch (e) {}
+  }
+  document.querySelectorAll('[class*="logistic"], [class*="tracking"]').forEach((el, i) => { if (i < 5) roots.push(el); });
+  const ul = document.querySelector(o.container || 'ul.message_main');
+  if (ul) roots.push(ul);
+  const found = [];
+  let seen = 0;
+  for (const root of roots) {
+    const w = document.createTreeWalker(root, NodeFilter.SHOW_TEXT);
+    let n;
+    while ((n = w.nextNode()) && seen++ < max) {
+      const t = n.nodeValue;
+      if (!t || t.length < 11) continue;
+      for (const m of t.matchAll(RE)) if (!found.includes(m[1])) found.push(m[1]);
+    }
+  }
+  return found;
+}
+"""
+
+# Primeiro candidato de input_textarea visível e habilitado
+INPUT_STATE_JS = """
+(selectors) => {
+  for (const sel of selectors) {
+    let el = null;
+    try { el = document.querySelector(sel); } catch (e) { continue; }
+    if (!el) continue;
+    const visible = !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length);
+    const enabled = !el.disabled && el.getAttribute('aria-disabled') !== 'true';
+    if (visible && enabled) return { ready: true, selector: sel };
+  }
+  return { ready: false, selector: '' };
+}
+"""
+
+SNAPSHOT_JS = """
+async ({ depth, container, inputs, rounds, waitMs, orderAnchor, maxNodes, knownTracking }) => {
+  const t0 = performance.now();
+  // carrega mais histórico rolando ao topo enquanto o lazy-load trouxer itens
+  const ul = document.querySelector(container || 'ul.message_main');
+  if (ul) {
+    for (let r = 0; r < rounds; r++) {
+      const n = ul.children.length;
+      ul.scrollTop = 0;
+      const start = performance.now();
+      while (ul.children.length <= n && performance.now() - start < waitMs) {
+        await new Promise(res => setTimeout(res, 20));
+      }
+      if (ul.children.length <= n) break;
+    }
+  }
+  const t1 = performance.now();
+  const messages = (%(messages)s)().slice(-depth);
+  const t2 = performance.now();
+  const order = (%(order)s)({ anchor: orderAnchor, maxNodes });
+  const t3 = performance.now();
+  // rastreio já em cache para este pedido (Python) não é procurado de novo
+  const trackingCandidates = order.orderId && (knownTracking || []).includes(order.orderId)
+    ? [] : (%(tracking)s)({ anchor: order.anchor, container, maxNodes });
+  const t4 = performance.now();
+  const input = (%(input)s)(inputs);
+  return {
+    messages, order, trackingCandidates, input,
+    ms: { history: t1 - t0, messages: t2 - t1, order: t3 - t2, tracking: t4 - t3, total: performance.now() - t0 },
+  };
+}
+"""
+
+
+def snapshot_js() -> str:
+    """SNAPSHOT_JS com os extratores atuais embutidos."""
+    return SNAPSHOT_JS % {
+        "messages": MESSAGES_JS.strip(),
+        "order": ORDER_INFO_JS.strip(),
+        "tracking": TRACKING_JS.strip(),
+        "input": INPUT_STATE_JS.strip(),
+    }
+
+
+@dataclass
+class OrderInfo:
+    status: str = ""
+    orderId: str = ""
+    title: str = ""
+    variation: str = ""
+    sku: str = ""
+    fields: Dict[str, str] = field(default_factory=dict)
+    # seletor do painel encontrado (cache por sessão) e custo da extração
+    anchor: str = ""
+    visited: int = 0
+    truncated: bool = False
+    ms: float = 0.0
+
+    @classmethod
+    def from_dict(cls, d: Optional[dict]) -> "OrderInfo":
+        d = d or {}
+        return cls(
+            status=d.get("status") or "",
+            orderId=d.get("orderId") or "",
+            title=d.get("title") or "",
+            variation=d.get("variation") or "",
+            sku=d.get("sku") or "",
+            fields=dict(d.get("fields") or {}),
+            anchor=d.get("anchor") or "",
+            visited=int(d.get("visited") or 0),
+            truncated=bool(d.get("truncated")),
+            ms=float(d.get("ms") or 0.0),
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "status": self.status,
+            "orderId": self.orderId,
+            "title": self.title,
+            "variation": self.variation,
+            "sku": self.sku,
+            "fields": dict(self.fields),
+        }
+
+
+@dataclass
+class InputState:
+    ready: bool = False
+    selector: str = ""
+
+
+@dataclass
+class ConversationSnapshot:
+    messages: List[Tuple[str, str]] = field(default_factory=list)
+    order: OrderInfo = field(default_factory=OrderInfo)
+    tracking_candidates: List[str] = field(default_factory=list)
+    input: InputState = field(default_factory=InputState)
+    timings_ms: Dict[str, float] = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, d: Optional[dict]) -> "ConversationSnapshot":
+        d = d or {}
+        inp = d.get("input") or {}
+        return cls(
+            messages=[(r, t) for r, t in (d.get("messages") or [])],
+            order=OrderInfo.from_dict(d.get("order")),
+            tracking_candidates=list(d.get("trackingCandidates") or []),
+            input=InputState(ready=bool(inp.get("ready")), selector=inp.get("selector") or ""),
+            timings_ms={k: round(float(v), 1) for k, v in (d.get("ms") or {}).items()},
+        )
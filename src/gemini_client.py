@@ -1,14 +1,32 @@
+import asyncio
+import hashlib
+import json
+import time
+import weakref
+from collections import Counter
+
 import google.generativeai as genai
+from .classify_cache import CACHE
 from .config import settings
+from .metrics import LatencyStats
+
+MODEL_NAME = "gemini-1.5-flash"
+# Modelo configurado uma vez e reaproveitado (refeito só se a chave mudar)
+_model = None
+_model_key = ""
 
 def get_gemini():
+    global _model, _model_key
     if not settings.gemini_api_key:
         raise RuntimeError("GEMINI_API_KEY ausente. Configure no .env")
-    genai.configure(api_key=settings.gemini_api_key)
-    # modelo leve e rápido para classificação
-    return genai.GenerativeModel("gemini-1.5-flash")
+    if _model is None or _model_key != settings.gemini_api_key:
+        genai.configure(api_key=settings.gemini_api_key)
+        # modelo leve e rápido para classificação
+        _model = genai.GenerativeModel(MODEL_NAME)
+        _model_key = settings.gemini_api_key
+    return _model
 
-PROMPT = """
+_RULES = """
 Você é um classificador e gerador de resposta para atendimento Shopee.
 REGRAS IMPORTANTES:
 - Leia as últimas mensagens (histórico) do comprador e do vendedor.
@@ -18,7 +36,9 @@ REGRAS IMPORTANTES:
 - Se for elogio/recebimento: intent = "elogio"
 - Se for dúvida geral (prazo, rastreio, etc.): intent = "envio"
 - Caso não tenha certeza, tente "envio" (neutro) — mas nunca responda se for sobre PIX/peça prometida não enviada.
+"""
 
+PROMPT = _RULES + """
 Saída EXCLUSIVAMENTE em JSON:
 {
   "intent": "<quebra|faltando|elogio|envio|pular>",
@@ -27,27 +47,465 @@ Saída EXCLUSIVAMENTE em JSON:
 }
 """
 
+# Várias conversas numa chamada só (GEMINI_BATCH_WINDOW_MS)
+BATCH_PROMPT = _RULES + """
+Você receberá VÁRIAS conversas independentes, cada uma com um id (c1, c2, ...).
+Classifique cada uma separadamente, com as regras acima.
+
+Saída EXCLUSIVAMENTE em JSON, um objeto com uma chave por id:
+{
+  "c1": {"intent": "<quebra|faltando|elogio|envio|pular>", "reason": "<1 frase>", "needs_reply": true/false},
+  "c2": {...}
+}
+"""
+
+# Muda junto com o prompt/modelo: respostas em cache de outra versão não valem
+_CACHE_NS = hashlib.sha256(f"{MODEL_NAME}\n{PROMPT}".encode("utf-8")).hexdigest()[:16]
+
+def _history(messages: list[str]) -> str:
+    return "\n".join(messages[-8:])
+
+def _prompt(messages: list[str]) -> str:
+    return f"{PROMPT}\n\nHISTORICO:\n{_history(messages)}"
+
+def _cache_key(messages: list[str]) -> str:
+    return CACHE.key(_CACHE_NS, messages[-8:])
+
+def _load(txt: str):
+    """JSON da resposta, ou None se não for um objeto."""
+    try:
+        data = json.loads(txt)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+class GeminiStats:
+    """Contadores por desfecho (quantidade e latência) e latência das respostas da API."""
+
+    def __init__(self):
+        self.outcomes = Counter()
+        self.latency = {}
+        # só chamadas individuais que voltaram da API (base do percentil de hedge)
+        self.api_latency = LatencyStats()
+        self.hedges = 0
+        self.in_flight = 0
+        # lotes enviados e conversas que foram neles
+        self.batches = 0
+        self.batched = 0
+
+    def record(self, outcome: str, seconds: float) -> None:
+        self.outcomes[outcome] += 1
+        self.latency.setdefault(outcome, LatencyStats()).add(seconds)
+
+    def snapshot(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "hedges": self.hedges,
+            "outcomes": dict(self.outcomes),
+            "latency": {k: v.snapshot() for k, v in self.latency.items()},
+            "api_latency": self.api_latency.snapshot(),
+            "batches": self.batches,
+            "batch_avg": round(self.batched / self.batches, 2) if self.batches else 0.0,
+            "breaker": BREAKER.state,
+        }
+
+    def summary(self) -> str:
+        parts = [
+            f"{k}={n} (p50 {self.latency[k].p(50):.2f}s p95 {self.latency[k].p(95):.2f}s)"
+            for k, n in sorted(self.outcomes.items())
+        ]
+        batches = f" | lotes={self.batches} (média {self.batched / self.batches:.1f})" if self.batches else ""
+        return (
+            f"{' '.join(parts) or 'nenhuma chamada'} | hedges={self.hedges} em voo={self.in_flight}"
+            f"{batches} | circuito {BREAKER.state}"
+        )
+
+
+class CircuitBreaker:
+    """
+    Fechado: chamadas normais. GEMINI_BREAKER_FAILURES falhas seguidas (erro,
+    timeout ou resposta acima de GEMINI_SLOW_SECONDS) abrem o circuito: por
+    GEMINI_BREAKER_OPEN_SECONDS tudo vai direto para _fallback_classify.
+    Depois fica meio-aberto: uma única chamada de teste passa; se der certo
+    o circuito fecha, se falhar reabre.
+    """
+
+    def __init__(self):
+        self.failures = 0
+        self.opened_at = 0.0
+        self.state = "fechado"
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == "fechado":
+            return True
+        if self.state == "aberto":
+            if time.monotonic() - self.opened_at < settings.gemini_breaker_open_seconds:
+                return False
+            self.state = "meio-aberto"
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def release(self) -> None:
+        """A chamada liberada não chegou à API (ex. sem vaga): não conta."""
+        self._probing = False
+
+    def finish(self, ok, seconds: float) -> None:
+        """
+        Fecha uma chamada que chegou à API; `seconds` é só o tempo da API
+        (sem fila nem janela de lote). ok=None: cancelada sem resposta, que
+        só conta como falha se já tinha passado de GEMINI_SLOW_SECONDS.
+        """
+        if ok is None and seconds < settings.gemini_slow_seconds:
+            self.release()
+        else:
+            self.record(bool(ok), seconds)
+
+    def record(self, ok: bool, seconds: float) -> None:
+        self._probing = False
+        if ok and seconds <= settings.gemini_slow_seconds:
+            if self.state != "fechado":
+                print("[GEMINI] circuito fechado (teste ok)")
+            self.state = "fechado"
+            self.failures = 0
+            return
+        self.failures += 1
+        if self.state == "meio-aberto" or self.failures >= max(1, settings.gemini_breaker_failures):
+            if self.state != "aberto":
+                print(
+                    f"[GEMINI] circuito aberto após {self.failures} falha(s)/lentidão; "
+                    f"classificador local por {settings.gemini_breaker_open_seconds:.0f}s"
+                )
+            self.state = "aberto"
+            self.opened_at = time.monotonic()
+
+
+STATS = GeminiStats()
+BREAKER = CircuitBreaker()
+
 def classify(messages: list[str]) -> dict:
     model = get_gemini()
-    history = "\n".join(messages[-8:])
-    inp = f"{PROMPT}\n\nHISTORICO:\n{history}"
+    key = _cache_key(messages)
+    cached = CACHE.get(key)
+    if cached is not None:
+        return cached
+    if not BREAKER.allow():
+        STATS.record("short_circuit", 0.0)
+        return _fallback_classify(messages)
+    inp = _prompt(messages)
+    t0 = time.perf_counter()
     try:
         resp = model.generate_content(inp)
         txt = resp.text.strip()
     except Exception as e:
         # fallback se Gemini falhar
+        elapsed = time.perf_counter() - t0
+        BREAKER.record(False, elapsed)
+        STATS.record("error", elapsed)
         return _fallback_classify(messages)
-    import json
+    elapsed = time.perf_counter() - t0
+    BREAKER.record(True, elapsed)
+    STATS.api_latency.add(elapsed)
+    data = _load(txt)
+    STATS.record("ok" if data is not None else "bad_json", elapsed)
+    if data is None:
+        return _fallback_classify(messages)
+    CACHE.put(key, data)
+    return data
+
+
+# ===== Caminho assíncrono =====
+# generate_content bloqueia o event loop pelo tempo todo da chamada (espelho,
+# WebSocket e o resto do bot congelam). classify_async usa a API assíncrona,
+# limita as chamadas simultâneas (GEMINI_CONCURRENCY) e tem um orçamento por
+# classificação (GEMINI_TIMEOUT_SECONDS, incluindo a espera por vaga): ao
+# estourar, responde na hora com _fallback_classify.
+#
+# Hedge (GEMINI_HEDGE_PERCENTILE, ex. 95): se a chamada passar do percentil
+# das respostas recentes da API, uma segunda chamada idêntica sai na mesma
+# vaga e vale a que voltar primeiro. No máximo 2x as chamadas em voo.
+
+# Um semáforo por event loop (app_ui, run_loop e benchmarks podem ter loops distintos)
+_limits: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+# Amostras mínimas antes de confiar no percentil do hedge
+HEDGE_MIN_SAMPLES = 20
+
+def _limit() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    sem = _limits.get(loop)
+    if sem is None:
+        sem = _limits[loop] = asyncio.Semaphore(max(1, settings.gemini_concurrency))
+    return sem
+
+def _hedge_delay():
+    pct = settings.gemini_hedge_percentile
+    if pct <= 0 or STATS.api_latency.count < HEDGE_MIN_SAMPLES:
+        return None
+    return STATS.api_latency.p(pct)
+
+async def _call(model, prompt: str, sample: bool = True) -> str:
+    """Uma chamada à API; `sample` alimenta o percentil do hedge (lotes não)."""
+    STATS.in_flight += 1
+    t0 = time.perf_counter()
     try:
-        data = json.loads(txt)
-        assert isinstance(data, dict)
-        return data
-    except Exception:
+        resp = await model.generate_content_async(prompt)
+        txt = resp.text.strip()
+    finally:
+        STATS.in_flight -= 1
+    if sample:
+        STATS.api_latency.add(time.perf_counter() - t0)
+    return txt
+
+async def _first_ok(tasks: set) -> str:
+    """Resultado da primeira tarefa que der certo; erro só se todas falharem."""
+    pending = set(tasks)
+    error = None
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for t in done:
+            if t.exception() is None:
+                return t.result()
+            error = t.exception()
+    raise error
+
+async def _request(model, messages: list[str], state: dict) -> str:
+    async with _limit():
+        state["sent"] = True
+        prompt = _prompt(messages)
+        tasks = {asyncio.ensure_future(_call(model, prompt))}
+        t0 = time.perf_counter()
+        ok = None
+        try:
+            delay = _hedge_delay()
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    STATS.hedges += 1
+                    state["hedged"] = True
+                    tasks.add(asyncio.ensure_future(_call(model, prompt)))
+            txt = await _first_ok(tasks)
+            ok = True
+            return txt
+        except Exception:
+            ok = False
+            raise
+        finally:
+            for t in tasks:
+                t.cancel()
+            BREAKER.finish(ok, time.perf_counter() - t0)
+
+# ===== Lotes =====
+# Com GEMINI_BATCH_WINDOW_MS > 0, as classificações que chegam dentro da
+# janela (abas do mesmo ciclo, outras contas, eventos do push) saem juntas
+# numa única chamada com BATCH_PROMPT, que devolve um JSON por id. O lote
+# fecha antes ao chegar a GEMINI_BATCH_MAX_ITEMS conversas ou se a próxima
+# passaria de GEMINI_BATCH_MAX_TOKENS. Conversa que faltar ou vier inválida
+# na resposta segue sozinha pelo caminho normal (no que sobrar do orçamento);
+# o lote conta como uma única chamada para o disjuntor.
+
+# Estimativa local de tokens (~4 caracteres cada), sem chamar count_tokens
+CHARS_PER_TOKEN = 4
+_batchers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _Batcher]" = weakref.WeakKeyDictionary()
+
+def _tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def _batch_prompt(histories: list[str]) -> str:
+    convs = "\n\n".join(f"### c{i}\n{h}" for i, h in enumerate(histories, 1))
+    return f"{BATCH_PROMPT}\n\nCONVERSAS:\n{convs}"
+
+
+class _Slot:
+    """Uma conversa no lote: histórico, future da resposta e prazo do chamador."""
+
+    def __init__(self, key: str, history: str, deadline: float):
+        self.key = key
+        self.history = history
+        self.deadline = deadline
+        self.waiters = 0
+        self.fut = asyncio.get_running_loop().create_future()
+        # quem esperava pode ter desistido (orçamento): não avisar erro "não lido"
+        self.fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self.batch: list = []
+        self.task = None
+        # tempo da chamada do lote à API (sem janela nem fila)
+        self.api_seconds = 0.0
+
+
+class _Batcher:
+    """Lote em formação de um event loop (chave do cache -> _Slot)."""
+
+    def __init__(self):
+        self.pending = {}
+        self.tokens = _tokens(BATCH_PROMPT)
+        self._timer = None
+        self._tasks = set()
+
+    def submit(self, key: str, messages: list[str], deadline: float) -> _Slot:
+        slot = self.pending.get(key)
+        if slot is None:
+            history = _history(messages)
+            cost = _tokens(history)
+            if self.pending and self.tokens + cost > settings.gemini_batch_max_tokens:
+                self.flush()
+            slot = self.pending[key] = _Slot(key, history, deadline)
+            self.tokens += cost
+        else:
+            # mesma conversa já está no lote (ex. duas abas): divide a resposta
+            slot.deadline = min(slot.deadline, deadline)
+        slot.waiters += 1
+        if len(self.pending) >= max(1, settings.gemini_batch_max_items):
+            self.flush()
+        elif self._timer is None and self.pending:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(settings.gemini_batch_window_ms / 1000.0, self.flush)
+        return slot
+
+    def leave(self, slot: _Slot) -> bool:
+        """
+        O chamador desistiu: sem ninguém esperando, a conversa (ou o lote
+        todo) é cancelada. True se ela saiu do lote antes do envio.
+        """
+        slot.waiters -= 1
+        if slot.waiters > 0 or slot.fut.done():
+            return False
+        slot.fut.cancel()
+        if self.pending.get(slot.key) is slot:
+            del self.pending[slot.key]
+            self.tokens -= _tokens(slot.history)
+            if not self.pending and self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            return True
+        if slot.task is not None and all(s.fut.done() for s in slot.batch):
+            slot.task.cancel()
+        return False
+
+    def flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        items = list(self.pending.values())
+        self.pending = {}
+        self.tokens = _tokens(BATCH_PROMPT)
+        if items:
+            task = asyncio.ensure_future(self._send(items))
+            for slot in items:
+                slot.batch = items
+                slot.task = task
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, items: list) -> None:
+        state = {"sent": False, "t0": 0.0}
+
+        async def request() -> str:
+            async with _limit():
+                state["sent"] = True
+                state["t0"] = time.perf_counter()
+                return await _call(get_gemini(), _batch_prompt([s.history for s in items]), sample=False)
+
+        STATS.batches += 1
+        STATS.batched += len(items)
+        # um prazo só para o lote: o do chamador que desiste primeiro
+        budget = max(0.0, min(s.deadline for s in items) - time.perf_counter())
+        ok = None
+        try:
+            data = _load(await asyncio.wait_for(request(), budget))
+            ok = True
+            api_seconds = time.perf_counter() - state["t0"]
+            for i, s in enumerate(items, 1):
+                entry = (data or {}).get(f"c{i}")
+                s.api_seconds = api_seconds
+                if not s.fut.done():
+                    # None = faltou no lote; a conversa tenta sozinha
+                    s.fut.set_result(entry if isinstance(entry, dict) else None)
+        except Exception as e:
+            ok = False
+            for s in items:
+                if not s.fut.done():
+                    s.fut.set_exception(e)
+        finally:
+            # o lote responde pelo disjuntor de todas as conversas dele
+            if state["sent"]:
+                BREAKER.finish(ok, time.perf_counter() - state["t0"])
+            else:
+                BREAKER.release()
+            # cancelado (todos desistiram): ninguém fica pendurado
+            for s in items:
+                if not s.fut.done():
+                    s.fut.cancel()
+
+def _batcher() -> _Batcher:
+    loop = asyncio.get_running_loop()
+    b = _batchers.get(loop)
+    if b is None:
+        b = _batchers[loop] = _Batcher()
+    return b
+
+async def classify_async(messages: list[str]) -> dict:
+    """Como classify, sem bloquear o event loop e com teto de tempo e de concorrência."""
+    model = get_gemini()
+    key = _cache_key(messages)
+    cached = await CACHE.get_async(key)
+    if cached is not None:
+        return cached
+    if not BREAKER.allow():
+        STATS.record("short_circuit", 0.0)
+        return _fallback_classify(messages)
+    t0 = time.perf_counter()
+    data = None
+    outcome = None
+    elapsed = None
+    if settings.gemini_batch_window_ms > 0:
+        batcher = _batcher()
+        slot = batcher.submit(key, messages, t0 + settings.gemini_timeout_seconds)
+        try:
+            # shield: a mesma future pode servir a mais de uma chamada
+            data = await asyncio.wait_for(asyncio.shield(slot.fut), settings.gemini_timeout_seconds)
+            if data is not None:
+                outcome = "batched"
+                # latência do modelo, sem a janela do lote
+                elapsed = slot.api_seconds
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+        except Exception:
+            outcome = "error"
+        finally:
+            # saiu antes do envio (prazo ou cancelamento): o lote não vai
+            # acertar o disjuntor por esta chamada
+            if batcher.leave(slot):
+                BREAKER.release()
+    if outcome is None:
+        # _request registra no disjuntor o tempo da API; sem envio, só libera
+        state = {"sent": False, "hedged": False}
+        budget = settings.gemini_timeout_seconds - (time.perf_counter() - t0)
+        try:
+            txt = await asyncio.wait_for(_request(model, messages, state), max(0.0, budget))
+            data = _load(txt)
+            outcome = "bad_json" if data is None else ("hedged" if state["hedged"] else "ok")
+        except asyncio.TimeoutError:
+            # sem vaga dentro do orçamento = muitas chamadas em voo
+            outcome = "timeout" if state["sent"] else "saturated"
+        except Exception:
+            outcome = "error"
+        finally:
+            if not state["sent"]:
+                BREAKER.release()
+    if elapsed is None:
+        elapsed = time.perf_counter() - t0
+    STATS.record(outcome, elapsed)
+    if data is None:
         return _fallback_classify(messages)
+    await CACHE.put_async(key, data)
+    return data
 
 def _fallback_classify(messages: list[str]) -> dict:
     t = " ".join(messages[-8:]).lower()
-    def has(*keys): 
+    def has(*keys):
         return any(k in t for k in keys)
     if has("pix","não recebi o pix","cadê o pix","pix não caiu","reembolso não caiu"):
         return {"intent":"pular","reason":"pix/reembolso pendente","needs_reply":False}
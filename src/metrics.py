@@ -0,0 +1,84 @@
+# src/metrics.py
+import asyncio
+from collections import deque
+from typing import Deque, Optional
+
+
+def percentile(values, pct: float) -> float:
+    """Percentil por vizinho mais próximo (pct em 0..100). Lista vazia -> 0.0."""
+    data = sorted(values)
+    if not data:
+        return 0.0
+    k = int(round((pct / 100.0) * (len(data) - 1)))
+    return float(data[max(0, min(k, len(data) - 1))])
+
+
+class LatencyStats:
+    """Janela deslizante de latências (em segundos) com p50/p95 baratos."""
+
+    def __init__(self, window: int = 200):
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.last: Optional[float] = None
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+
+    def p(self, pct: float) -> float:
+        return percentile(self.samples, pct)
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "last": round(self.last or 0.0, 3),
+            "avg": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50": round(self.p(50), 3),
+            "p95": round(self.p(95), 3),
+        }
+
+    def summary(self) -> str:
+        s = self.snapshot()
+        return f"n={s['count']} último={s['last']:.2f}s p50={s['p50']:.2f}s p95={s['p95']:.2f}s"
+
+
+class LoopLagMonitor:
+    """
+    Atraso do event loop: dorme `interval` em laço e mede quanto acordou
+    depois do previsto. Atraso alto = algo síncrono segurando o loop
+    (chamada bloqueante, JSON grande, regex pesada).
+    """
+
+    def __init__(self, interval: float = 0.1, window: int = 600):
+        self.interval = interval
+        self.stats = LatencyStats(window=window)
+        self.max = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - t0 - self.interval)
+            self.stats.add(lag)
+            self.max = max(self.max, lag)
+
+    def snapshot(self) -> dict:
+        return {**self.stats.snapshot(), "p99": round(self.stats.p(99), 3), "max": round(self.max, 3)}
+
+    def summary(self) -> str:
+        s = self.snapshot()
+        return f"p50={s['p50'] * 1000:.0f}ms p95={s['p95'] * 1000:.0f}ms p99={s['p99'] * 1000:.0f}ms máx={s['max'] * 1000:.0f}ms"
@@ -0,0 +1,372 @@
+# src/mock_duoke.py
+"""
+Duoke de mentira para teste de carga local do DuokeBot.
+
+Imita a estrutura de tela que config/selectors.json espera: lista virtual
+de chats (.list_container_content .virtual_list .list > li, só as linhas
+visíveis no DOM), ul.message_main com li.lt / li.rt (.msg_text .text_cont),
+painel lateral do pedido, textarea + botão Send e modais do Element UI
+(.el-message-box__wrapper). Os dados chegam por XHR/JSON, como na SPA real
+(o NetworkFeed do bot também consegue ler).
+
+Configuração (variáveis de ambiente ou MockConfig):
+  MOCK_CONVERSATIONS   quantidade de conversas (padrão 200)
+  MOCK_RATE_PER_MIN    mensagens novas de compradores por minuto (padrão 30)
+  MOCK_RENDER_MS       atraso de renderização ao abrir uma conversa (padrão 150)
+  MOCK_MODAL_EVERY     segundos entre modais "Confirm" (0 = nunca)
+
+O servidor mede a latência de resposta (1ª mensagem não respondida do
+comprador -> resposta do vendedor) e expõe em /api/stats.
+
+Uso: uvicorn src.mock_duoke:app --port 8765   (ou via src.bench_e2e)
+"""
+import asyncio
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse
+
+from .metrics import LatencyStats
+
+BUYER_TEXTS = [
+    "Olá, quando chega meu pedido?",
+    "Qual o prazo de entrega?",
+    "Meu pedido já foi enviado?",
+    "Tem na cor azul?",
+    "Bom dia, o produto ainda não chegou",
+    "Obrigado!",
+    "Pode enviar o código de rastreio?",
+]
+STATUSES = ["To ship", "Shipped", "Ready to ship", "Completed", "Cancelado"]
+
+
+@dataclass
+class MockConfig:
+    conversations: int = int(os.getenv("MOCK_CONVERSATIONS", "200"))
+    rate_per_min: float = float(os.getenv("MOCK_RATE_PER_MIN", "30"))
+    render_ms: int = int(os.getenv("MOCK_RENDER_MS", "150"))
+    modal_every: float = float(os.getenv("MOCK_MODAL_EVERY", "0"))
+    seed: int = int(os.getenv("MOCK_SEED", "7"))
+
+
+@dataclass
+class MockMessage:
+    msg_id: int
+    role: str  # 'buyer' | 'seller'
+    text: str
+    ts: float
+
+
+@dataclass
+class MockConversation:
+    conv_id: str
+    name: str
+    status: str
+    order_id: str
+    tracking: str
+    messages: List[MockMessage] = field(default_factory=list)
+    unread: int = 0
+    # 1ª mensagem do comprador ainda sem resposta (início da espera)
+    waiting_since: Optional[float] = None
+
+    @property
+    def last(self) -> Optional[MockMessage]:
+        return self.messages[-1] if self.messages else None
+
+
+class MockState:
+    def __init__(self, cfg: MockConfig):
+        self.cfg = cfg
+        self.rng = random.Random(cfg.seed)
+        self.conversations: Dict[str, MockConversation] = {}
+        self.next_msg = 1
+        self.reply_latency = LatencyStats(window=5000)
+        self.replies = 0
+        self.buyer_messages = 0
+        self.started = time.time()
+        now = time.time()
+        for i in range(cfg.conversations):
+            status = self.rng.choice(STATUSES)
+            conv = MockConversation(
+                conv_id=f"c{i:05d}",
+                name=f"comprador_{i:05d}",
+                status=status,
+                order_id=f"2501{i:06d}ABCD",
+                tracking=f"BR{100000000 + i}XY" if status == "Shipped" else "",
+            )
+            # histórico antigo já respondido
+            for k in range(self.rng.randint(2, 12)):
+                role = "buyer" if k % 2 == 0 else "seller"
+                self._append(conv, role, self.rng.choice(BUYER_TEXTS) if role == "buyer" else "Olá! Já verificamos.",
+                             now - 86400 + k * 60, count=False)
+            self.conversations[conv.conv_id] = conv
+
+    def _append(self, conv: MockConversation, role: str, text: str, ts: float, count: bool = True) -> MockMessage:
+        msg = MockMessage(self.next_msg, role, text, ts)
+        self.next_msg += 1
+        conv.messages.append(msg)
+        if role == "buyer":
+            if count:
+                conv.unread += 1
+                self.buyer_messages += 1
+                if conv.waiting_since is None:
+                    conv.waiting_since = ts
+        else:
+            conv.unread = 0
+            if conv.waiting_since is not None and count:
+                self.reply_latency.add(ts - conv.waiting_since)
+                self.replies += 1
+            conv.waiting_since = None
+        return msg
+
+    def buyer_arrival(self) -> None:
+        conv = self.rng.choice(list(self.conversations.values()))
+        self._append(conv, "buyer", self.rng.choice(BUYER_TEXTS), time.time())
+
+    def seller_reply(self, conv_id: str, text: str) -> bool:
+        conv = self.conversations.get(conv_id)
+        if not conv or not text.strip():
+            return False
+        self._append(conv, "seller", text.strip(), time.time())
+        return True
+
+    def ordered(self) -> List[MockConversation]:
+        return sorted(self.conversations.values(), key=lambda c: c.last.ts if c.last else 0, reverse=True)
+
+    def stats(self) -> dict:
+        minutes = max(1e-9, (time.time() - self.started) / 60.0)
+        pending = [c for c in self.conversations.values() if c.waiting_since is not None]
+        return {
+            "uptime_s": round(time.time() - self.started, 1),
+            "buyer_messages": self.buyer_messages,
+            "replies": self.replies,
+            "replies_per_min": round(self.replies / minutes, 2),
+            "pending": len(pending),
+            "oldest_pending_s": round(time.time() - min((c.waiting_since for c in pending), default=time.time()), 1),
+            "reply_latency": {
+                **self.reply_latency.snapshot(),
+                "p99": round(self.reply_latency.p(99), 3),
+            },
+        }
+
+
+PAGE_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Duoke (mock)</title>
+<style>
+body{margin:0;font-family:Arial;display:flex;height:100vh}
+.list_container_content{width:300px;border-right:1px solid #ddd}
+.virtual_list{height:100vh;overflow-y:auto;position:relative}
+.virtual_list .list{position:relative;margin:0;padding:0;list-style:none}
+.virtual_list .list>li{position:absolute;left:0;right:0;height:63px;border-bottom:1px solid #eee;padding:4px 8px;cursor:pointer;box-sizing:border-box}
+.virtual_list .list>li.active{background:#eef}
+.name{font-weight:bold}.time{float:right;font-size:11px}.msg{display:block;color:#666;font-size:12px;white-space:nowrap;overflow:hidden}
+.el-badge__content{background:red;color:#fff;border-radius:8px;padding:0 5px;font-size:11px}
+.chat{flex:1;display:flex;flex-direction:column}
+ul.message_main{flex:1;overflow-y:auto;margin:0;padding:8px;list-style:none}
+ul.message_main li.lt{text-align:left}ul.message_main li.rt{text-align:right}
+.text_cont{display:inline-block;background:#f2f2f2;border-radius:6px;padding:4px 8px;margin:2px}
+.input_box{display:flex;border-top:1px solid #ddd}.input_box textarea{flex:1;height:60px}
+.order_panel{width:280px;border-left:1px solid #ddd;padding:8px;font-size:13px}
+.el-message-box__wrapper{position:fixed;inset:0;background:rgba(0,0,0,.3);display:flex;align-items:center;justify-content:center}
+.el-message-box{background:#fff;padding:16px;border-radius:4px}
+</style></head><body>
+<div class="list_container_content"><div class="virtual_list"><ul class="list"></ul></div></div>
+<div class="chat">
+  <ul class="message_main"></ul>
+  <div class="input_box"><textarea placeholder="Type a message here, press Enter to send"></textarea><button class="send">Send</button></div>
+</div>
+<div class="order_panel"></div>
+<script>
+const CFG = __CFG__;
+const ROW_H = 64;
+let convs = [], active = null, shown = 30, loadingMore = false;
+const $ = (s) => document.querySelector(s);
+const esc = (s) => String(s).replace(/[&<>"]/g, c => ({'&':'&amp;','<':'&lt;','>':'&gt;','"':'&quot;'}[c]));
+const fmt = (ts) => { const d = new Date(ts * 1000); return String(d.getHours()).padStart(2,'0') + ':' + String(d.getMinutes()).padStart(2,'0'); };
+
+function renderList() {
+  const vl = $('.virtual_list'), ul = $('.virtual_list .list');
+  ul.style.height = (convs.length * ROW_H) + 'px';
+  const first = Math.max(0, Math.floor(vl.scrollTop / ROW_H) - 2);
+  const last = Math.min(convs.length, first + Math.ceil(vl.clientHeight / ROW_H) + 4);
+  const html = [];
+  for (let i = first; i < last; i++) {
+    const c = convs[i];
+    html.push('<li data-id="' + c.conversation_id + '" class="' + (c.conversation_id === active ? 'active' : '') +
+      '" style="top:' + (i * ROW_H) + 'px"><span class="name">' + esc(c.buyer_name) + '</span>' +
+      '<span class="time">' + fmt(c.last_message.created_at) + '</span>' +
+      (c.unread_count ? '<sup class="el-badge__content">' + c.unread_count + '</sup>' : '') +
+      '<span class="msg">' + esc(c.last_message.content) + '</span></li>');
+  }
+  ul.innerHTML = html.join('');
+}
+
+async function refreshList() {
+  try {
+    const r = await fetch('/api/conversations');
+    convs = (await r.json()).data;
+    renderList();
+  } catch (e) {}
+}
+
+async function openConv(id) {
+  active = id; shown = 30;
+  renderList();
+  const ul = $('ul.message_main');
+  ul.innerHTML = '';
+  $('.order_panel').innerHTML = '';
+  await new Promise(res => setTimeout(res, CFG.render_ms));
+  if (active !== id) return;
+  await loadMessages(id, true);
+}
+
+async function loadMessages(id, scrollBottom) {
+  const r = await fetch('/api/conversations/' + id + '/messages?limit=' + shown);
+  const js = await r.json();
+  if (active !== id) return;
+  const ul = $('ul.message_main');
+  ul.innerHTML = js.data.map(m =>
+    '<li class="' + (m.from_type === 'buyer' ? 'lt' : 'rt') + '"><div class="msg_text"><div class="text_cont">' +
+    esc(m.content) + '</div></div></li>').join('');
+  ul.dataset.total = js.total;
+  if (scrollBottom) ul.scrollTop = ul.scrollHeight;
+  const o = js.order;
+  $('.order_panel').innerHTML =
+    '<div class="order_item_status_tags"><span class="el-tag">' + esc(o.status) + '</span></div>' +
+    '<div>Pedido #' + esc(o.order_sn) + '</div>' +
+    '<a class="product_name" title="Produto">Camiseta básica algodão</a>' +
+    '<div>Buyer payment amount: R$ 59,90</div><div>Variation: Azul, M</div><div>SKU: CAM-AZ-M</div>' +
+    (o.tracking ? '<div class="logistic_info">Rastreio: ' + esc(o.tracking) + '</div>' : '');
+}
+
+async function send() {
+  const ta = $('.input_box textarea');
+  const text = ta.value.trim();
+  if (!text || !active) return;
+  ta.value = '';
+  await fetch('/api/conversations/' + active + '/messages', {
+    method: 'POST', headers: {'Content-Type': 'application/json'}, body: JSON.stringify({content: text}),
+  });
+  await loadMessages(active, true);
+  refreshList();
+}
+
+function showModal() {
+  if ($('.el-message-box__wrapper')) return;
+  const w = document.createElement('div');
+  w.className = 'el-message-box__wrapper';
+  w.innerHTML = '<div class="el-message-box"><p>Aviso do sistema</p><div class="el-message-box__btns">' +
+    '<button class="el-button el-button--primary">Confirm</button></div></div>';
+  w.querySelector('button').onclick = () => w.remove();
+  document.body.appendChild(w);
+}
+
+$('.virtual_list').addEventListener('scroll', renderList);
+$('.virtual_list .list').addEventListener('click', (ev) => {
+  const li = ev.target.closest('li[data-id]');
+  if (li) openConv(li.dataset.id);
+});
+$('ul.message_main').addEventListener('scroll', async (ev) => {
+  const ul = ev.target;
+  if (ul.scrollTop > 0 || loadingMore || !active || shown >= +(ul.dataset.total || 0)) return;
+  loadingMore = true;
+  shown += 30;
+  await new Promise(res => setTimeout(res, CFG.render_ms / 2));
+  await loadMessages(active, false);
+  loadingMore = false;
+});
+$('.input_box textarea').addEventListener('keydown', (ev) => {
+  if (ev.key === 'Enter' && !ev.shiftKey) { ev.preventDefault(); send(); }
+});
+$('.input_box .send').addEventListener('click', send);
+refreshList();
+setInterval(refreshList, 1000);
+if (CFG.modal_every > 0) setInterval(showModal, CFG.modal_every * 1000);
+</script>
+</body></html>
+"""
+
+
+def create_app(cfg: Optional[MockConfig] = None) -> FastAPI:
+    cfg = cfg or MockConfig()
+    state = MockState(cfg)
+    api = FastAPI(title="Duoke mock")
+    api.state.mock = state
+
+    async def arrivals():
+        while True:
+            if cfg.rate_per_min <= 0:
+                await asyncio.sleep(1.0)
+                continue
+            # chegadas de Poisson
+            await asyncio.sleep(state.rng.expovariate(cfg.rate_per_min / 60.0))
+            state.buyer_arrival()
+
+    @api.on_event("startup")
+    async def _start():
+        api.state.arrivals = asyncio.create_task(arrivals())
+
+    @api.on_event("shutdown")
+    async def _stop():
+        api.state.arrivals.cancel()
+
+    @api.get("/", response_class=HTMLResponse)
+    async def index():
+        html = PAGE_HTML.replace("__CFG__", f'{{"render_ms": {cfg.render_ms}, "modal_every": {cfg.modal_every}}}')
+        resp = HTMLResponse(html)
+        resp.set_cookie("dk_session", "mock", httponly=True)
+        return resp
+
+    @api.get("/api/conversations")
+    async def conversations():
+        data = []
+        for c in state.ordered():
+            last = c.last
+            data.append({
+                "conversation_id": c.conv_id,
+                "buyer_name": c.name,
+                "unread_count": c.unread,
+                "last_message": {
+                    "content": last.text if last else "",
+                    "from_type": last.role if last else "",
+                    "created_at": last.ts if last else 0,
+                },
+            })
+        return JSONResponse({"code": 0, "data": data})
+
+    @api.get("/api/conversations/{conv_id}/messages")
+    async def messages(conv_id: str, limit: int = 30):
+        c = state.conversations.get(conv_id)
+        if not c:
+            return JSONResponse({"code": 404, "msg": "not found"}, status_code=404)
+        c.unread = 0
+        msgs = c.messages[-limit:]
+        return JSONResponse({
+            "code": 0,
+            "total": len(c.messages),
+            "data": [
+                {"conversation_id": c.conv_id, "msg_id": m.msg_id, "content": m.text,
+                 "from_type": m.role, "created_at": m.ts}
+                for m in msgs
+            ],
+            "order": {"order_sn": c.order_id, "status": c.status, "tracking": c.tracking},
+        })
+
+    @api.post("/api/conversations/{conv_id}/messages")
+    async def reply(conv_id: str, req: Request):
+        body = await req.json()
+        ok = state.seller_reply(conv_id, str(body.get("content", "")))
+        return JSONResponse({"code": 0 if ok else 400})
+
+    @api.get("/api/stats")
+    async def stats():
+        return JSONResponse(state.stats())
+
+    return api
+
+
+app = create_app()
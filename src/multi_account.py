@@ -0,0 +1,252 @@
+# src/multi_account.py
+"""
+Executor multi-conta: várias lojas num único processo Chromium.
+
+Cada conta salva em sessions/<user_id>.bin (login em duas etapas do
+main.py) vira um BrowserContext próprio — cookies, localStorage, cache e
+rotas isolados — criado com browser.new_context(storage_state=...) sobre o
+mesmo navegador, e tem o seu DuokeBot (marca d'água, seletores e métricas
+separados). As contas ficam num heap ordenado pelo próximo horário
+(next_at): só contas vencidas ocupam uma vaga, então uma conta em espera
+de nova tentativa não segura as demais. ACCOUNT_CONCURRENCY limita quantas
+contas fazem ciclo ao mesmo tempo (nunca mais que o total de contas, que
+pode crescer com add_account).
+
+Uso: python -m src.multi_account   (ou LOOP_MODE=accounts no src.run_loop)
+Variáveis: ACCOUNTS=uid1,uid2 (padrão: todas em sessions/),
+ACCOUNT_CONCURRENCY, LOOP_INTERVAL_SECONDS.
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from typing import List, Optional
+
+from playwright.async_api import async_playwright
+
+from .classifier import decide_reply_async
+from .duoke import DuokeBot
+from .sessions import list_accounts, load_storage_state, save_storage_state
+
+DEFAULT_INTERVAL = float(os.getenv("LOOP_INTERVAL_SECONDS", "5"))
+CONCURRENCY = int(os.getenv("ACCOUNT_CONCURRENCY", "2"))
+# Teto de um ciclo de uma conta antes de ela ser reiniciada (s)
+CYCLE_TIMEOUT = float(os.getenv("ACCOUNT_CYCLE_TIMEOUT", "300"))
+# Relatório por conta a cada N ciclos (somando todas as contas)
+REPORT_EVERY = int(os.getenv("ACCOUNT_REPORT_EVERY", "20"))
+# Espera antes de reabrir uma conta que falhou (dobra até 5 min)
+RETRY_BASE = 10.0
+RETRY_MAX = 300.0
+
+
+class Account:
+    """Estado de uma conta no executor (contexto, página, vazão)."""
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.bot = DuokeBot(account_id=user_id, form_login=False)
+        self.ctx = None
+        self.page = None
+        self.next_at = 0.0
+        self.retry = RETRY_BASE
+        self.started = time.monotonic()
+        self.cycles = 0
+        self.opened = 0
+        self.replied = 0
+        self.errors = 0
+        self.last_error = ""
+
+    def throughput(self) -> dict:
+        minutes = max(1e-9, (time.monotonic() - self.started) / 60.0)
+        return {
+            "cycles": self.cycles,
+            "opened": self.opened,
+            "replied": self.replied,
+            "errors": self.errors,
+            "replies_per_min": round(self.replied / minutes, 2),
+            "conversations_per_min": round(self.opened / minutes, 2),
+            "cycle": self.bot.cycle_stats.snapshot(),
+            "last_error": self.last_error,
+        }
+
+    def summary(self) -> str:
+        t = self.throughput()
+        return (
+            f"{self.user_id}: ciclos={t['cycles']} abertas={t['opened']} respondidas={t['replied']} "
+            f"({t['replies_per_min']}/min) erros={t['errors']} | {self.bot.cycle_stats.summary()}"
+        )
+
+
+class MultiAccountRunner:
+    def __init__(self, user_ids: List[str], interval: float = DEFAULT_INTERVAL, concurrency: int = CONCURRENCY):
+        self.accounts = [Account(uid) for uid in user_ids]
+        self.interval = interval
+        self.max_concurrency = max(1, concurrency)
+        self.browser = None
+        self.total_cycles = 0
+        # (next_at, ordem de chegada, conta) das contas fora de ciclo
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._wake: Optional[asyncio.Event] = None
+
+    @property
+    def concurrency(self) -> int:
+        """Vagas de ciclo: ACCOUNT_CONCURRENCY limitado ao número atual de contas."""
+        return max(1, min(self.max_concurrency, len(self.accounts)))
+
+    def add_account(self, user_id: str) -> None:
+        """Inclui uma conta com o executor rodando (ex. redistribuída pelo supervisor)."""
+        if any(acc.user_id == user_id for acc in self.accounts):
+            return
+        acc = Account(user_id)
+        self.accounts.append(acc)
+        if self._wake is not None:
+            self._schedule(acc)
+        print(f"[ACCOUNTS] {user_id}: conta adicionada")
+
+    async def _open(self, acc: Account) -> None:
+        # PBKDF2 + AES-GCM numa thread: não trava o despacho das outras contas
+        state = await asyncio.to_thread(load_storage_state, acc.user_id)
+        acc.ctx = await self.browser.new_context(
+            storage_state=state,
+            ignore_https_errors=True,
+            viewport={"width": 1366, "height": 768},
+        )
+        acc.page = await acc.bot.attach_context(acc.ctx)
+        print(f"[ACCOUNTS] {acc.user_id}: contexto pronto")
+
+    async def _close(self, acc: Account, persist: bool = False) -> None:
+        if acc.ctx is None:
+            return
+        try:
+            if persist:
+                # guarda cookies renovados para o próximo início
+                state = await acc.ctx.storage_state()
+                await asyncio.to_thread(save_storage_state, acc.user_id, state)
+        except Exception as e:
+            print(f"[ACCOUNTS] {acc.user_id}: não salvou a sessão: {e}")
+        try:
+            await acc.ctx.close()
+        except Exception:
+            pass
+        acc.ctx = acc.page = None
+
+    async def _turn(self, acc: Account) -> None:
+        """Um ciclo da conta; em erro fecha o contexto e agenda nova tentativa."""
+        try:
+            if acc.page is None or acc.page.is_closed():
+                await self._close(acc)
+                await self._open(acc)
+            stats = await asyncio.wait_for(acc.bot.run_cycle(acc.page, decide_reply_async), CYCLE_TIMEOUT)
+            acc.cycles += 1
+            acc.opened += stats.get("opened", 0)
+            acc.replied += stats.get("replied", 0)
+            acc.retry = RETRY_BASE
+            acc.next_at = time.monotonic() + self.interval
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            acc.errors += 1
+            acc.last_error = f"{type(e).__name__}: {e}"
+            print(f"[ACCOUNTS] {acc.user_id}: erro ({acc.last_error}); nova tentativa em {acc.retry:.0f}s")
+            await self._close(acc)
+            acc.next_at = time.monotonic() + acc.retry
+            acc.retry = min(acc.retry * 2, RETRY_MAX)
+
+    def _schedule(self, acc: Account) -> None:
+        heapq.heappush(self._heap, (acc.next_at, next(self._seq), acc))
+        self._wake.set()
+
+    async def _run_turn(self, acc: Account) -> None:
+        try:
+            await self._turn(acc)
+        finally:
+            self._schedule(acc)
+        self.total_cycles += 1
+        if self.total_cycles % REPORT_EVERY == 0:
+            self.report()
+
+    async def _dispatch(self) -> None:
+        """Entrega as contas vencidas às vagas livres; dorme até a próxima vencer."""
+        running: set = set()
+
+        def done(task) -> None:
+            running.discard(task)
+            self._wake.set()
+
+        try:
+            while True:
+                now = time.monotonic()
+                while self._heap and len(running) < self.concurrency and self._heap[0][0] <= now:
+                    acc = heapq.heappop(self._heap)[2]
+                    task = asyncio.create_task(self._run_turn(acc))
+                    running.add(task)
+                    task.add_done_callback(done)
+                timeout = None
+                if self._heap and len(running) < self.concurrency:
+                    timeout = max(0.0, self._heap[0][0] - now)
+                # acorda com conta nova, ciclo encerrado ou a próxima conta vencendo
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in list(running):
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+    def report(self) -> None:
+        print(f"[ACCOUNTS] {len(self.accounts)} contas num único Chromium:")
+        for acc in self.accounts:
+            print(f"[ACCOUNTS]   {acc.summary()}")
+
+    def snapshot(self) -> dict:
+        return {acc.user_id: acc.throughput() for acc in self.accounts}
+
+    async def run(self) -> None:
+        if not self.accounts:
+            print("[ACCOUNTS] nenhuma sessão em sessions/; faça o login das contas pelo main.py.")
+            return
+        headless = os.getenv("HEADLESS", "1").lower() not in {"0", "false", "no"}
+        async with async_playwright() as p:
+            self.browser = await p.chromium.launch(
+                headless=headless,
+                args=["--no-sandbox", "--disable-dev-shm-usage", "--disable-gpu"],
+            )
+            self._wake = asyncio.Event()
+            for acc in self.accounts:
+                self._schedule(acc)
+            print(
+                f"[ACCOUNTS] {len(self.accounts)} contas, até {self.max_concurrency} em paralelo, "
+                f"intervalo {self.interval:.1f}s"
+            )
+            try:
+                await self._dispatch()
+            finally:
+                self.report()
+                for acc in self.accounts:
+                    await self._close(acc, persist=True)
+                await self.browser.close()
+
+
+def selected_accounts(raw: Optional[str] = None) -> List[str]:
+    raw = os.getenv("ACCOUNTS", "") if raw is None else raw
+    wanted = [u.strip() for u in raw.split(",") if u.strip()]
+    return wanted or list_accounts()
+
+
+async def run_accounts(interval: float = DEFAULT_INTERVAL) -> None:
+    runner = MultiAccountRunner(selected_accounts(), interval=interval)
+    try:
+        await runner.run()
+    except asyncio.CancelledError:
+        pass
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(run_accounts())
+    except KeyboardInterrupt:
+        print("\n[ACCOUNTS] Encerrado pelo usuário.")
@@ -0,0 +1,319 @@
+# src/netfeed.py
+"""
+Ingestão de conversas a partir do tráfego de rede do Duoke.
+
+Escuta respostas XHR/fetch (page.on("response")) e frames de WebSocket
+(page.on("websocket")) da própria SPA, interpreta os JSON de lista de chats,
+mensagens e pedidos e mantém um modelo em memória que o _cycle consome sem
+precisar esperar a renderização do DOM.
+
+Os formatos exatos da API do Duoke não são documentados: o parser procura
+heuristicamente por objetos com cara de mensagem/conversa/pedido (campos
+como content/text, conversation_id/session_id, from_type/is_self, order_sn).
+"""
+import asyncio
+import json
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# URLs de interesse (lista de chats, mensagens, pedidos)
+URL_RE = re.compile(os.getenv("NET_FEED_URL_RE", r"(chat|session|conversation|message|msg|order)"), re.I)
+# Limite de tamanho de corpo para não parsear downloads grandes
+MAX_BODY = int(os.getenv("NET_FEED_MAX_BODY", str(2 * 1024 * 1024)))
+
+ID_KEYS = ("conversation_id", "conversationId", "session_id", "sessionId", "chat_id", "chatId", "conv_id")
+# Só ids que identificam o comprador da conversa (user_id/to_id genéricos
+# aparecem em qualquer payload e criavam conversas falsas)
+BUYER_ID_KEYS = ("buyer_id", "buyerId")
+# Só nomes do comprador/interlocutor (nickname/username genéricos podem ser
+# o próprio vendedor e renomeavam a conversa)
+NAME_KEYS = ("buyer_name", "buyerName", "buyer_nickname", "buyerNickname", "customer_name", "customerName",
+             "to_name", "toName", "peer_name", "peerName")
+TEXT_KEYS = ("content", "text", "msg", "message", "msg_content")
+TIME_KEYS = ("created_at", "createdAt", "create_time", "createTime", "timestamp", "time", "send_time")
+ORDER_KEYS = ("order_sn", "orderSn", "order_id", "orderId")
+STATUS_KEYS = ("order_status", "orderStatus", "status", "status_text")
+
+# Quem enviou: campos booleanos e campos enum, comparados pelo valor inteiro
+SELF_KEYS = ("is_self", "isSelf", "from_self", "fromSelf", "is_seller", "isSeller")
+ROLE_KEYS = ("from_type", "fromType", "sender_type", "senderType", "sender_role", "senderRole", "direction")
+SELLER_ROLES = {"seller", "shop", "self", "agent", "staff", "merchant", "out", "outgoing", "send"}
+BUYER_ROLES = {"buyer", "customer", "user", "in", "incoming", "receive"}
+
+
+@dataclass
+class Message:
+    role: str  # 'buyer' | 'seller' | 'unknown'
+    text: str
+    ts: float = 0.0
+    msg_id: str = ""
+
+
+@dataclass
+class Conversation:
+    conv_id: str = ""
+    buyer_id: str = ""
+    name: str = ""
+    messages: List[Message] = field(default_factory=list)
+    last_role: str = ""
+    last_text: str = ""
+    unread: int = 0
+    order: dict = field(default_factory=dict)
+    updated_at: float = 0.0
+
+    def pairs(self, depth: int) -> List[tuple]:
+        return [(m.role, m.text) for m in self.messages if m.text][-depth:]
+
+    def roles_known(self, depth: int) -> bool:
+        return all(role != "unknown" for role, _ in self.pairs(depth))
+
+    def add_message(self, msg: Message) -> None:
+        if msg.msg_id and any(m.msg_id == msg.msg_id for m in self.messages):
+            return
+        self.messages.append(msg)
+        self.messages.sort(key=lambda m: m.ts)
+        del self.messages[:-200]
+        last = self.messages[-1]
+        self.last_role, self.last_text = last.role, last.text
+        self.updated_at = time.time()
+
+
+def _first(d: dict, keys) -> str:
+    for k in keys:
+        v = d.get(k)
+        if v not in (None, "", [], {}):
+            return str(v)
+    return ""
+
+
+def _ts(d: dict) -> float:
+    """Epoch em segundos: número (s ou ms) ou texto ISO-8601 ("2024-03-18T09:10:00Z")."""
+    raw = _first(d, TIME_KEYS)
+    try:
+        v = float(raw)
+        return v / 1000.0 if v > 1e12 else v
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(raw.strip().replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return 0.0
+
+
+def _role(d: dict) -> str:
+    """
+    Quem enviou: 'seller', 'buyer', 'unknown' (tem campo de remetente com
+    valor desconhecido) ou '' (o objeto não diz). Sem palpite por substring.
+    """
+    for k in SELF_KEYS:
+        if k in d:
+            v = d[k]
+            if v in (True, 1, "1", "true"):
+                return "seller"
+            if v in (False, 0, "0", "false"):
+                return "buyer"
+            return "unknown"
+    for k in ROLE_KEYS:
+        v = str(d.get(k, "")).strip().lower()
+        if v:
+            if v in SELLER_ROLES:
+                return "seller"
+            if v in BUYER_ROLES:
+                return "buyer"
+            return "unknown"
+    return ""
+
+
+def _text(d: dict) -> str:
+    v = None
+    for k in TEXT_KEYS:
+        if k in d:
+            v = d[k]
+            break
+    if isinstance(v, dict):
+        v = _first(v, ("text", "content", "msg"))
+    if isinstance(v, str):
+        s = v.strip()
+        # algumas APIs mandam o conteúdo como JSON serializado
+        if s.startswith("{"):
+            try:
+                inner = json.loads(s)
+                if isinstance(inner, dict):
+                    return _first(inner, ("text", "content", "msg")).strip()
+            except ValueError:
+                pass
+        return s
+    return ""
+
+
+def _walk(obj):
+    """Itera todos os dicts aninhados do payload."""
+    stack = [obj]
+    while stack:
+        cur = stack.pop()
+        if isinstance(cur, dict):
+            yield cur
+            stack.extend(v for v in cur.values() if isinstance(v, (dict, list)))
+        elif isinstance(cur, list):
+            stack.extend(v for v in cur if isinstance(v, (dict, list)))
+
+
+class NetworkFeed:
+    """Modelo em memória das conversas, alimentado pelo tráfego da página."""
+
+    def __init__(self):
+        self.conversations: Dict[str, Conversation] = {}
+        self.by_name: Dict[str, str] = {}
+        # Último pedido visto sem conversa associada (painel da conversa aberta)
+        self.last_order: dict = {}
+        self.stats = {"responses": 0, "ws_frames": 0, "parsed": 0, "errors": 0}
+        self._changed = asyncio.Event()
+        self._pages = set()
+        # Leituras de corpo em andamento (referência forte até terminarem)
+        self._tasks = set()
+
+    # ---------- ligação com a página ----------
+
+    def attach(self, page) -> None:
+        if id(page) in self._pages:
+            return
+        self._pages.add(id(page))
+        page.on("response", self._on_response)
+        page.on("websocket", self._on_websocket)
+
+    def _on_response(self, response) -> None:
+        try:
+            req = response.request
+            if req.resource_type not in ("xhr", "fetch") or not URL_RE.search(response.url):
+                return
+            ctype = (response.headers or {}).get("content-type", "")
+            if "json" not in ctype:
+                return
+        except Exception:
+            return
+        task = asyncio.ensure_future(self._read_response(response))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _read_response(self, response) -> None:
+        try:
+            body = await response.body()
+            if len(body) > MAX_BODY:
+                return
+            self.stats["responses"] += 1
+            self.ingest(json.loads(body))
+        except Exception:
+            self.stats["errors"] += 1
+
+    def _on_websocket(self, ws) -> None:
+        ws.on("framereceived", self._on_frame)
+
+    def _on_frame(self, payload) -> None:
+        if isinstance(payload, bytes):
+            try:
+                payload = payload.decode("utf-8")
+            except UnicodeDecodeError:
+                return
+        # socket.io e afins prefixam o JSON com um código numérico ("42[...]")
+        s = (payload or "").lstrip("0123456789")
+        if not s or s[0] not in "[{":
+            return
+        self.stats["ws_frames"] += 1
+        try:
+            self.ingest(json.loads(s))
+        except Exception:
+            self.stats["errors"] += 1
+
+    # ---------- parsing ----------
+
+    def _conv(self, d: dict) -> Optional[Conversation]:
+        conv_id = _first(d, ID_KEYS)
+        buyer_id = _first(d, BUYER_ID_KEYS)
+        key = conv_id or buyer_id
+        if not key:
+            return None
+        conv = self.conversations.get(conv_id) or self.conversations.get(buyer_id)
+        if conv is None:
+            conv = self.conversations[key] = Conversation(conv_id=conv_id, buyer_id=buyer_id)
+        # indexa pelos dois ids (mensagens às vezes só trazem um deles)
+        for alias in (conv_id, buyer_id):
+            if alias:
+                self.conversations.setdefault(alias, conv)
+        conv.conv_id = conv.conv_id or conv_id
+        conv.buyer_id = conv.buyer_id or buyer_id
+        name = _first(d, NAME_KEYS)
+        if name:
+            conv.name = name
+            self.by_name[name] = key
+        return conv
+
+    def ingest(self, payload) -> int:
+        """Interpreta um payload JSON; retorna quantos objetos foram aproveitados."""
+        n = 0
+        for d in _walk(payload):
+            order_sn = _first(d, ORDER_KEYS)
+            text = _text(d)
+            role = _role(d)
+            conv = self._conv(d)
+            if conv is None:
+                if order_sn:
+                    self.last_order = {"orderId": order_sn, "status": _first(d, STATUS_KEYS), "_ts": time.time()}
+                    n += 1
+                continue
+            if text and role:
+                conv.add_message(Message(role=role, text=text, ts=_ts(d), msg_id=_first(d, ("msg_id", "msgId", "message_id", "id"))))
+                n += 1
+            elif isinstance(d.get("last_message") or d.get("lastMessage"), dict):
+                lm = d.get("last_message") or d.get("lastMessage")
+                conv.last_role = _role(lm) or "unknown"
+                conv.last_text = _text(lm) or conv.last_text
+                conv.updated_at = time.time()
+                n += 1
+            if "unread_count" in d or "unreadCount" in d:
+                try:
+                    conv.unread = int(d.get("unread_count", d.get("unreadCount")) or 0)
+                except (TypeError, ValueError):
+                    pass
+            if order_sn:
+                conv.order = {
+                    **conv.order,
+                    "orderId": order_sn,
+                    "status": _first(d, STATUS_KEYS) or conv.order.get("status", ""),
+                }
+                n += 1
+        if n:
+            self.stats["parsed"] += n
+            self._changed.set()
+        return n
+
+    # ---------- consulta ----------
+
+    def lookup(self, row_key: str) -> Optional[Conversation]:
+        """Resolve a chave da linha (ROW_INFO_JS) para a conversa do feed."""
+        if not row_key:
+            return None
+        kind, _, value = row_key.partition(":")
+        if kind == "name":
+            key = self.by_name.get(value)
+            return self.conversations.get(key) if key else None
+        return self.conversations.get(value)
+
+    async def wait_for_messages(self, row_key: str, timeout: float = 1.5) -> Optional[Conversation]:
+        """Espera (curto) o histórico da conversa chegar pela rede após o clique."""
+        deadline = time.monotonic() + timeout
+        while True:
+            conv = self.lookup(row_key)
+            if conv and conv.messages:
+                return conv
+            left = deadline - time.monotonic()
+            if left <= 0:
+                return conv
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=left)
+            except asyncio.TimeoutError:
+                return self.lookup(row_key)
@@ -0,0 +1,286 @@
+# src/page_watchers.py
+"""
+Observadores dentro da página (init scripts) que avisam o Python via
+page/ctx.expose_binding, em vez de o bot varrer o DOM por polling.
+"""
+import asyncio
+import json
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from .metrics import LatencyStats
+
+NEW_MESSAGE_BINDING = "__duokeNewMessage"
+MODAL_BINDING = "__duokeModalDismissed"
+
+
+def new_message_watcher_js(row_selector: str, row_info_js: str) -> str:
+    """
+    MutationObserver na lista de chats e no painel de mensagens. Quando a
+    prévia/horário/não-lidas de uma linha muda (ou chega um li.lt novo na
+    conversa aberta), chama window.__duokeNewMessage({key, preview, unread, at}).
+
+    Não avisa o que o próprio bot causou: a lista é ignorada enquanto uma
+    varredura/rolagem do bot roda (window.__duokeScanning, marcado pelos
+    scripts de lista) e a linha da conversa onde aparece um li.rt (resposta
+    do vendedor) fica em silêncio por alguns segundos. Não lidas caindo
+    (conversa aberta pelo bot) também não gera aviso.
+    """
+    return """
+(() => {
+  if (window.top !== window) return;
+  const ROW_SEL = %(row_sel)s;
+  const rowInfo = %(row_info)s;
+  const seen = new Map();
+  let pending = new Map();
+  let timer = null;
+  // fim de varredura do bot e respostas do vendedor: mudanças sem aviso
+  const SELF_QUIET_MS = 5000;
+  const selfSent = new Map();
+  let quietUntil = 0;
+  const scanning = () => (window.__duokeScanning || 0) > 0 || Date.now() < quietUntil;
+
+  const flush = () => {
+    timer = null;
+    const items = Array.from(pending.values());
+    pending = new Map();
+    const notify = window.%(binding)s;
+    if (typeof notify !== 'function') return;
+    for (const it of items) { try { notify(it); } catch (e) {} }
+  };
+  const push = (info) => {
+    if (!info || !info.key) return;
+    pending.set(info.key, { ...info, at: Date.now() });
+    if (!timer) timer = setTimeout(flush, 150);
+  };
+  // Só conta como novidade prévia/horário diferentes ou não lidas subindo:
+  // abrir a conversa (o bot) zera as não lidas e não é mensagem nova
+  const isNews = (prev, i) => prev
+    ? prev.preview !== i.preview || prev.time !== i.time || i.unread > prev.unread
+    : i.unread > 0;
+
+  const scanRows = (initial) => {
+    document.querySelectorAll(ROW_SEL).forEach(li => {
+      let info;
+      try { info = rowInfo(li); } catch (e) { return; }
+      if (!info || !info.key) return;
+      const prev = seen.get(info.key);
+      seen.set(info.key, { preview: info.preview, time: info.time, unread: info.unread });
+      if ((selfSent.get(info.key) || 0) > Date.now()) return;
+      if (!initial && isNews(prev, info)) push(info);
+    });
+  };
+
+  const activeRow = () => document.querySelector(
+    ROW_SEL.split(',').map(s => s.trim() + '.active, ' + s.trim() + '.is-active, ' + s.trim() + '.selected').join(', ')
+  );
+
+  let listObs = null, panelObs = null, listEl = null, panelEl = null;
+  const attach = () => {
+    const row = document.querySelector(ROW_SEL);
+    const list = row && row.parentElement;
+    if (list && list !== listEl) {
+      if (listObs) listObs.disconnect();
+      listEl = list;
+      scanRows(true);
+      listObs = new MutationObserver(() => { if (!scanning()) scanRows(false); });
+      listObs.observe(list, { childList: true, subtree: true, characterData: true });
+    }
+    const panel = document.querySelector('ul.message_main');
+    if (panel && panel !== panelEl) {
+      if (panelObs) panelObs.disconnect();
+      panelEl = panel;
+      panelObs = new MutationObserver((muts) => {
+        const added = (cls) => muts.some(m => Array.from(m.addedNodes).some(
+          n => n.nodeType === 1 && n.tagName === 'LI' && cls.test(n.className || '')
+        ));
+        const li = activeRow();
+        let info = null;
+        if (li) { try { info = rowInfo(li); } catch (e) {} }
+        if (added(/(^|\\s)rt(\\s|$)/) && info && info.key) {
+          // resposta do vendedor (o próprio bot): a linha vai mudar, não é mensagem nova
+          selfSent.set(info.key, Date.now() + SELF_QUIET_MS);
+          pending.delete(info.key);
+        }
+        if (added(/(^|\\s)lt(\\s|$)/) && info) {
+          selfSent.delete(info.key);
+          push({ ...info, source: 'panel' });
+        }
+      });
+      panelObs.observe(panel, { childList: true });
+    }
+  };
+  // Depois da varredura a lista virtual ainda re-renderiza: espera assentar
+  // e toma o estado final como base, sem avisar
+  window.addEventListener('duoke-scan-done', () => {
+    quietUntil = Date.now() + 300;
+    setTimeout(() => { if (!scanning()) scanRows(true); }, 320);
+  });
+  // A SPA troca os contêineres ao navegar: reanexa de forma barata
+  setInterval(attach, 2000);
+  document.addEventListener('DOMContentLoaded', attach);
+})();
+""" % {
+        "row_sel": json.dumps(row_selector),
+        "row_info": row_info_js.strip(),
+        "binding": NEW_MESSAGE_BINDING,
+    }
+
+
+class EventInbox:
+    """Fila de avisos "conversa X recebeu mensagem nova" vindos da página."""
+
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.latency = LatencyStats()
+        self.received = 0
+
+    def on_binding(self, source, payload) -> None:
+        """Callback do expose_binding (chamado pelo Playwright no event loop)."""
+        if not isinstance(payload, dict) or not payload.get("key"):
+            return
+        self.received += 1
+        at = payload.get("at")
+        if at:
+            self.latency.add(max(0.0, time.time() - at / 1000.0))
+        self.queue.put_nowait(payload)
+
+    async def wait(self, timeout: float, debounce: float = 0.2) -> Dict[str, dict]:
+        """
+        Espera até `timeout` segundos pelo primeiro aviso; depois junta o que
+        chegar em `debounce` segundos. Retorna {chave: payload} (vazio = timeout).
+        """
+        batch: Dict[str, dict] = {}
+        try:
+            first = await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return batch
+        batch[first["key"]] = first
+        await asyncio.sleep(debounce)
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            batch[item["key"]] = item
+        return batch
+
+
+def modal_watcher_js(
+    wrappers: List[str], confirm_selectors: List[str], confirm_words: List[str], known: Dict[str, str]
+) -> str:
+    """
+    Fecha modais conhecidos assim que aparecem, dentro da própria página.
+    Observa o body (wrappers do Element UI/Ant Design são anexados lá e
+    mostrados por style/class) e só age quando o título/texto do wrapper
+    casa com um dos padrões de `known` ({nome: regex}): clica no botão de
+    confirmação (ou no X) e avisa window.__duokeModalDismissed({wrapper,
+    kind, method, text}). Diálogos desconhecidos e modais com campo de
+    senha/código (login, 2FA) nunca são tocados.
+    """
+    return """
+(() => {
+  const WRAPPERS = %(wrappers)s;
+  const CONFIRM = %(confirm)s;
+  const WORDS = %(words)s;
+  const KNOWN = Object.entries(%(known)s).map(([k, src]) => [k, new RegExp(src, 'i')]);
+  const CLOSE = ['.el-message-box__headerbtn', '.el-dialog__headerbtn', '.ant-modal-close', "button[aria-label='close']", "button[aria-label='Close']"];
+  const tries = new WeakMap();
+  const norm = (s) => (s || '').replace(/\\s+/g, ' ').trim();
+  const visible = (el) => !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length)
+    && getComputedStyle(el).visibility !== 'hidden';
+
+  const report = (info) => {
+    const notify = window.%(binding)s;
+    if (typeof notify === 'function') { try { notify({ ...info, at: Date.now() }); } catch (e) {} }
+  };
+
+  const pick = (box) => {
+    for (const sel of CONFIRM) {
+      const b = sel && box.querySelector(sel);
+      if (b && visible(b)) return [b, 'css:' + sel];
+    }
+    const byText = Array.from(box.querySelectorAll('button')).find(
+      b => visible(b) && WORDS.includes(norm(b.textContent).toLowerCase())
+    );
+    if (byText) return [byText, 'text'];
+    for (const sel of CLOSE) {
+      const b = box.querySelector(sel);
+      if (b && visible(b)) return [b, 'close:' + sel];
+    }
+    return [null, ''];
+  };
+
+  const sweep = () => {
+    timer = null;
+    for (const sel of WRAPPERS) {
+      document.querySelectorAll(sel).forEach((box) => {
+        if (!visible(box)) return;
+        // login / 2FA: quem trata é o ensure_login
+        if (box.querySelector("input[type='password'], input[name*='code' i], input[placeholder*='code' i]")) return;
+        const text = norm(box.innerText).slice(0, 300);
+        const hit = KNOWN.find(([, rx]) => rx.test(text));
+        if (!hit) return;
+        const n = tries.get(box) || 0;
+        if (n >= 3) return;
+        tries.set(box, n + 1);
+        const [btn, method] = pick(box);
+        if (!btn) return;
+        btn.click();
+        report({ wrapper: sel, kind: hit[0], method, text: text.slice(0, 120) });
+      });
+    }
+  };
+
+  let timer = null;
+  const schedule = () => { if (!timer) timer = setTimeout(sweep, 50); };
+  const start = () => {
+    if (!document.body) return;
+    new MutationObserver(schedule).observe(document.body, {
+      childList: true, subtree: true, attributes: true, attributeFilter: ['style', 'class'],
+    });
+    schedule();
+  };
+  if (document.body) start(); else document.addEventListener('DOMContentLoaded', start);
+})();
+""" % {
+        "wrappers": json.dumps(wrappers),
+        "confirm": json.dumps([s for s in confirm_selectors if s]),
+        "words": json.dumps([w.lower() for w in confirm_words]),
+        "known": json.dumps(known),
+        "binding": MODAL_BINDING,
+    }
+
+
+class ModalStats:
+    """Contadores dos modais fechados pelo observador da página."""
+
+    def __init__(self):
+        self.dismissed = 0
+        self.by_wrapper: Dict[str, int] = defaultdict(int)
+        self.by_method: Dict[str, int] = defaultdict(int)
+        self.last: dict = {}
+        self.last_at = 0.0
+
+    def on_binding(self, source, payload) -> None:
+        if not isinstance(payload, dict):
+            return
+        self.dismissed += 1
+        self.by_wrapper[payload.get("wrapper", "?")] += 1
+        self.by_method[payload.get("method", "?")] += 1
+        self.last = payload
+        self.last_at = time.monotonic()
+        print(
+            f"[MODAL] fechado na página ({payload.get('kind', '?')}): {payload.get('wrapper')} "
+            f"via {payload.get('method')} | {payload.get('text', '')[:60]}"
+        )
+
+    def snapshot(self) -> dict:
+        return {
+            "dismissed": self.dismissed,
+            "by_wrapper": dict(self.by_wrapper),
+            "by_method": dict(self.by_method),
+            "last": self.last,
+        }
+
+    def summary(self) -> str:
+        w = ", ".join(f"{k}={v}" for k, v in sorted(self.by_wrapper.items())) or "nenhum"
+        return f"{self.dismissed} modais fechados na página [{w}]"
@@ -3,9 +3,16 @@ import os
 import asyncio
 from pathlib import Path
 from .duoke import DuokeBot
-from .classifier import decide_reply
+from .classifier import decide_reply_async
+from .classify_cache import CACHE as CLASSIFY_CACHE
+from .gemini_client import STATS as GEMINI_STATS
+from .metrics import LoopLagMonitor
 
 DEFAULT_INTERVAL = float(os.getenv("LOOP_INTERVAL_SECONDS", "5"))
+# "worker": um único navegador/página vivo entre ciclos (recomendado em produção)
+# "relaunch": modo antigo, abre e fecha o Chromium a cada ciclo via run_once
+# "accounts": todas as contas de sessions/ num único Chromium (src.multi_account)
+LOOP_MODE = os.getenv("LOOP_MODE", "relaunch").strip().lower()
 STATE_FILE = Path(__file__).resolve().parents[1] / "storage_state.json"
 
 async def run_forever(interval: float = DEFAULT_INTERVAL) -> None:
@@ -19,7 +26,7 @@ async def run_forever(interval: float = DEFAULT_INTERVAL) -> None:
 
     while True:
         try:
-            await bot.run_once(decide_reply)
+            await bot.run_once(decide_reply_async, linger_seconds=0)
             # ciclo OK: reseta backoff e espera intervalo normal
             backoff = interval
             await asyncio.sleep(interval)
@@ -38,11 +45,41 @@ async def run_forever(interval: float = DEFAULT_INTERVAL) -> None:
             await asyncio.sleep(wait)
             backoff = min(wait * 2, 60.0)
 
+async def run_worker(interval: float = DEFAULT_INTERVAL) -> None:
+    """
+    Modo worker: mantém um contexto/página do Chromium vivo entre ciclos,
+    faz login uma única vez e reexecuta apenas o ciclo de conversas.
+    A latência de cada ciclo é reportada no log ([LOOP] ciclo #N ...).
+    """
+    bot = DuokeBot()
+    lag = LoopLagMonitor()
+    lag.start()
+    try:
+        await bot.run_forever(decide_reply_async, idle_seconds=interval)
+    except asyncio.CancelledError:
+        pass
+    finally:
+        lag.stop()
+        print(f"[LOOP] worker encerrado | ciclos: {bot.cycle_stats.summary()}")
+        print(f"[LOOP] atraso do event loop: {lag.summary()} | Gemini: {GEMINI_STATS.summary()}")
+        print(f"[LOOP] cache de classificação: {CLASSIFY_CACHE.summary()}")
+        if bot.recovery_stats.count:
+            print(f"[LOOP] recuperações: {bot.recovery_stats.summary()}")
+
 async def main() -> None:
+    if LOOP_MODE == "accounts":
+        # várias contas (sessions/*.bin) num único Chromium
+        from .multi_account import run_accounts
+        await run_accounts(DEFAULT_INTERVAL)
+        return
     if not STATE_FILE.exists():
         print("[LOOP] Sessão não encontrada. Execute `python -m src.login` para fazer login antes de iniciar o bot.")
         return
-    await run_forever()
+    if LOOP_MODE == "worker":
+        print(f"[LOOP] modo worker (intervalo {DEFAULT_INTERVAL:.1f}s)")
+        await run_worker()
+    else:
+        await run_forever()
 
 if __name__ == "__main__":
     try:
@@ -51,4 +88,3 @@ if __name__ == "__main__":
         # segurança extra caso o KeyboardInterrupt não seja pego dentro do loop
         print("\n[MAIN] Encerrado pelo usuário.")
 
-
@@ -0,0 +1,177 @@
+# src/scheduler.py
+"""
+Fila de prioridade das conversas por SLA.
+
+Em vez de seguir a ordem da tela, cada conversa da lista recebe uma nota:
+há quanto tempo o comprador espera (horário da última mensagem na linha),
+quantas mensagens não lidas há e o status do pedido (lido do painel nas
+visitas anteriores ou do tráfego de rede). O ciclo processa da maior nota
+para a menor e para quando o orçamento de tempo do ciclo acaba; o que ficou
+de fora volta no ciclo seguinte, com espera maior e, portanto, nota maior.
+"""
+import os
+import re
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from .metrics import LatencyStats
+
+# Peso do status do pedido (substring, minúsculas) -> multiplicador da nota
+STATUS_WEIGHTS: List[Tuple[str, float]] = [
+    ("cancel", 0.5),
+    ("complet", 0.6),
+    ("conclu", 0.6),
+    ("delivered", 0.8),
+    ("entregue", 0.8),
+    ("return", 1.3),
+    ("refund", 1.3),
+    ("devolu", 1.3),
+    ("reembolso", 1.3),
+    ("to ship", 1.2),
+    ("a enviar", 1.2),
+    ("ready to ship", 1.2),
+    ("shipped", 1.1),
+    ("enviado", 1.1),
+    ("unpaid", 0.9),
+]
+# Cada não lida soma 25% à nota (até 4)
+UNREAD_WEIGHT = 0.25
+UNREAD_CAP = 4
+
+_HHMM_RE = re.compile(r"^(\d{1,2}):(\d{2})(?::\d{2})?$")
+_REL_RE = re.compile(r"(\d+)\s*(s|sec|seg|m|min|h|hr|hour|hora|d|day|dia)s?\b", re.I)
+_DATE_RE = re.compile(r"(\d{1,4})[/\-.](\d{1,2})(?:[/\-.](\d{2,4}))?(?:\s+(\d{1,2}):(\d{2}))?")
+_YESTERDAY = ("yesterday", "ontem", "昨天", "ayer")
+# Ordem dia/mês das datas da lista. O Duoke em inglês (?lang=en do DOUKE_URL)
+# mostra mês primeiro ("03/18", "03/18/2024"); "dm" para interfaces que
+# mostram dia primeiro. Vale para datas com e sem ano.
+DATE_ORDER = os.getenv("ROW_DATE_ORDER", "md").strip().lower()
+_WEEKDAYS = {
+    "mon": 0, "seg": 0, "tue": 1, "ter": 1, "wed": 2, "qua": 2, "thu": 3, "qui": 3,
+    "fri": 4, "sex": 4, "sat": 5, "sáb": 5, "sab": 5, "sun": 6, "dom": 6,
+}
+_REL_UNITS = {"s": 1, "sec": 1, "seg": 1, "m": 60, "min": 60, "h": 3600, "hr": 3600,
+              "hour": 3600, "hora": 3600, "d": 86400, "day": 86400, "dia": 86400}
+
+
+def parse_row_time(text: str, now: Optional[datetime] = None, order: str = DATE_ORDER) -> Optional[float]:
+    """
+    Converte o horário exibido na linha ("14:05", "Yesterday", "Mon",
+    "03/18", "03/18/2024", "2024-03-18 09:10", "5 min") em epoch. Datas
+    sem ano ISO seguem `order` ("md" ou "dm"). None se não reconhecer.
+    """
+    s = (text or "").strip().lower()
+    if not s:
+        return None
+    now = now or datetime.now()
+
+    m = _HHMM_RE.match(s)
+    if m:
+        t = now.replace(hour=int(m.group(1)) % 24, minute=int(m.group(2)), second=0, microsecond=0)
+        if t > now + timedelta(minutes=5):
+            t -= timedelta(days=1)
+        return t.timestamp()
+
+    m = _REL_RE.search(s)
+    if m and not _DATE_RE.search(s):
+        return now.timestamp() - int(m.group(1)) * _REL_UNITS[m.group(2).lower()]
+
+    hhmm = re.search(r"(\d{1,2}):(\d{2})", s)
+    hour, minute = (int(hhmm.group(1)) % 24, int(hhmm.group(2))) if hhmm else (0, 0)
+    if any(w in s for w in _YESTERDAY):
+        t = now - timedelta(days=1)
+        return t.replace(hour=hour, minute=minute, second=0, microsecond=0).timestamp()
+    for name, wd in _WEEKDAYS.items():
+        if s.startswith(name):
+            days = (now.weekday() - wd) % 7 or 7
+            t = now - timedelta(days=days)
+            return t.replace(hour=hour, minute=minute, second=0, microsecond=0).timestamp()
+
+    m = _DATE_RE.search(s)
+    if m:
+        a, b, c = m.group(1), int(m.group(2)), m.group(3)
+        try:
+            if len(a) == 4:  # AAAA-MM-DD
+                t = datetime(int(a), b, int(c or 1))
+            else:
+                month, day = (int(a), b) if order != "dm" else (b, int(a))
+                if c:  # MM/DD/AAAA (ou DD/MM/AAAA)
+                    t = datetime(int(c) + (2000 if len(c) == 2 else 0), month, day)
+                else:  # MM/DD do ano corrente (ou do anterior, se ainda não chegou)
+                    t = datetime(now.year, month, day)
+                    if t > now:
+                        t = t.replace(year=now.year - 1)
+        except ValueError:
+            return None
+        return t.replace(hour=hour, minute=minute).timestamp()
+    return None
+
+
+def status_weight(status: str) -> float:
+    s = (status or "").lower()
+    for needle, weight in STATUS_WEIGHTS:
+        if needle in s:
+            return weight
+    return 1.0
+
+
+class PriorityScheduler:
+    """Ordena a fila do ciclo por nota de SLA e mede a espera dos compradores."""
+
+    def __init__(self, max_status: int = 2000):
+        self.max_status = max_status
+        self.status: Dict[str, str] = {}
+        # 1ª vez que vimos cada (chave, assinatura): espera quando o horário não é legível
+        self._first_seen: Dict[Tuple[str, str], float] = {}
+        # Espera do comprador até a resposta sair
+        self.wait_stats = LatencyStats()
+        self.deferred = 0
+
+    def note_status(self, key: str, status: str) -> None:
+        if not key or not status:
+            return
+        self.status.pop(key, None)
+        self.status[key] = status
+        while len(self.status) > self.max_status:
+            self.status.pop(next(iter(self.status)))
+
+    def buyer_since(self, info: dict, sig: str = "") -> float:
+        """Epoch estimado da última mensagem da linha."""
+        ts = parse_row_time(info.get("time", ""))
+        if ts is not None:
+            return ts
+        return self._first_seen.setdefault((info.get("key", ""), sig), time.time())
+
+    def score(self, info: dict, sig: str = "", status: str = "") -> float:
+        wait_min = max(0.0, time.time() - self.buyer_since(info, sig)) / 60.0
+        unread = min(int(info.get("unread") or 0), UNREAD_CAP)
+        status = status or self.status.get(info.get("key", ""), "")
+        # +1 min: conversas recém-chegadas ainda se diferenciam por não lidas/status
+        return (wait_min + 1.0) * (1.0 + UNREAD_WEIGHT * unread) * status_weight(status)
+
+    def order(self, rows: List[dict], sig_of=None, status_of=None) -> List[dict]:
+        """Devolve as linhas da maior para a menor nota (anota 'score' e 'since' em cada uma)."""
+        live = set()
+        for info in rows:
+            sig = sig_of(info) if sig_of else ""
+            live.add((info.get("key", ""), sig))
+            status = status_of(info.get("key", "")) if status_of else ""
+            info["since"] = self.buyer_since(info, sig)
+            info["score"] = round(self.score(info, sig, status or ""), 2)
+        if len(self._first_seen) > self.max_status:
+            # esquece assinaturas que já saíram da lista
+            self._first_seen = {k: v for k, v in self._first_seen.items() if k in live}
+        return sorted(rows, key=lambda r: r["score"], reverse=True)
+
+    def record_reply(self, info: dict) -> None:
+        since = info.get("since")
+        if since:
+            self.wait_stats.add(max(0.0, time.time() - since))
+
+    def summary(self) -> str:
+        s = self.wait_stats.snapshot()
+        return (
+            f"espera do comprador até a resposta: n={s['count']} "
+            f"p50={s['p50'] / 60:.1f}min p95={s['p95'] / 60:.1f}min | adiadas={self.deferred}"
+        )
@@ -0,0 +1,115 @@
+# src/selector_cache.py
+"""
+Resolução de seletores alternativos do config/selectors.json.
+
+Várias entradas são listas de alternativas separadas por vírgula (ex.:
+input_textarea, chat_list_item, buyer_message). O resolver testa as
+alternativas uma vez por sessão, numa única chamada ao navegador, guarda a
+alternativa concreta que casou nesta conta e a reutiliza. Só testa de novo
+quando o seletor guardado falha (invalidate).
+"""
+import time
+from typing import Dict, List, Optional
+
+# Chave sem nenhuma alternativa presente: não testa de novo antes disso (s)
+NEGATIVE_TTL = 60.0
+
+# Resultado por candidato: true (casou), false (não casou), null (não é CSS
+# puro, ex. :has-text / text= do Playwright — testado depois via locator)
+PROBE_JS = """
+([cands, visible]) => cands.map(sel => {
+  let els;
+  try { els = document.querySelectorAll(sel); } catch (e) { return null; }
+  if (!visible) return els.length > 0;
+  return Array.from(els).some(el => !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length));
+})
+"""
+
+
+def split_selector_list(raw: str) -> List[str]:
+    """Divide 'a, b:has-text(\\'x, y\\'), c' nas vírgulas de topo (fora de ()/[]/aspas)."""
+    out, buf, depth, quote = [], [], 0, ""
+    for ch in raw or "":
+        if quote:
+            buf.append(ch)
+            if ch == quote:
+                quote = ""
+            continue
+        if ch in "'\"":
+            quote = ch
+        elif ch in "([":
+            depth += 1
+        elif ch in ")]":
+            depth = max(0, depth - 1)
+        elif ch == "," and depth == 0:
+            part = "".join(buf).strip()
+            if part:
+                out.append(part)
+            buf = []
+            continue
+        buf.append(ch)
+    part = "".join(buf).strip()
+    if part:
+        out.append(part)
+    return out
+
+
+class SelectorResolver:
+    def __init__(self, selectors: Dict[str, str]):
+        self.selectors = selectors
+        self.resolved: Dict[str, str] = {}
+        self._negative: Dict[str, float] = {}
+        self.stats = {"hits": 0, "probes": 0, "misses": 0, "invalidations": 0}
+
+    def candidates(self, key: str) -> List[str]:
+        return split_selector_list(self.selectors.get(key, ""))
+
+    def learn(self, key: str, selector: str) -> None:
+        """Registra uma alternativa confirmada por outro caminho (ex. snapshot)."""
+        if selector and selector in self.candidates(key) and self.resolved.get(key) != selector:
+            self.resolved[key] = selector
+            print(f"[SEL] {key} -> {selector}")
+
+    def invalidate(self, key: str) -> None:
+        if self.resolved.pop(key, None) is not None:
+            self.stats["invalidations"] += 1
+
+    async def resolve(
+        self, page, key: str, visible: bool = True, negative_ttl: float = NEGATIVE_TTL
+    ) -> Optional[str]:
+        """Alternativa concreta de `key` que casa na página (cacheada por sessão)."""
+        if key in self.resolved:
+            self.stats["hits"] += 1
+            return self.resolved[key]
+        last_miss = self._negative.get(key)
+        if last_miss is not None and time.monotonic() - last_miss < negative_ttl:
+            return None
+        cands = self.candidates(key)
+        if not cands:
+            return None
+        self.stats["probes"] += 1
+        try:
+            flags = await page.evaluate(PROBE_JS, [cands, visible])
+        except Exception:
+            flags = [None] * len(cands)
+        for sel, ok in zip(cands, flags):
+            if ok is None:
+                # sintaxe específica do Playwright: testa pelo locator
+                try:
+                    loc = page.locator(sel)
+                    if visible:
+                        loc = loc.locator(":visible")
+                    ok = await loc.count() > 0
+                except Exception:
+                    ok = False
+            if ok:
+                self.resolved[key] = sel
+                self._negative.pop(key, None)
+                print(f"[SEL] {key} -> {sel}")
+                return sel
+        self.stats["misses"] += 1
+        self._negative[key] = time.monotonic()
+        return None
+
+    def resolved_map(self) -> dict:
+        return {"resolved": dict(self.resolved), "stats": dict(self.stats)}
@@ -0,0 +1,106 @@
+# src/session_probe.py
+"""
+Sonda rápida de validade da sessão, antes de carregar a SPA inteira.
+
+Com SESSION_PROBE_PATH (na origem de DOUKE_URL) ou SESSION_PROBE_URL
+configurado, faz UMA requisição autenticada via ctx.request (mesmo cookie
+jar da página, sem renderizar nada) a um endpoint de perfil do Duoke. Sem
+endpoint configurado, só os nomes/validade dos cookies decidem. A resposta
+só confirma a sessão com sinal positivo (código 0 ou id/nome do usuário);
+HTML e formatos desconhecidos não concluem. O resultado é tri-estado: True
+(sessão válida), False (certamente expirada) ou None (não dá para saber —
+o ensure_login segue o fluxo completo).
+"""
+import json
+import os
+import re
+import time
+from typing import Optional, Tuple
+from urllib.parse import urlsplit
+
+# Endpoint autenticado e barato do Duoke (perfil do usuário); vazio = só cookies
+SESSION_PROBE_URL = os.getenv("SESSION_PROBE_URL", "")
+SESSION_PROBE_PATH = os.getenv("SESSION_PROBE_PATH", "")
+# Nomes de cookie que carregam a autenticação
+AUTH_COOKIE_RE = re.compile(os.getenv("SESSION_COOKIE_RE", r"token|session|sid|auth|login"), re.I)
+PROBE_TIMEOUT_MS = 5000
+
+_EXPIRED_WORDS = ("login", "token", "expired", "expirad", "unauthor", "not logged", "登录", "过期")
+# Campos que só um perfil autenticado traz
+_USER_KEYS = ("user_id", "userId", "uid", "username", "userName", "nickname", "email", "account")
+_AUTH_CODES = (401, 403, "401", "403")
+
+
+def _has_user(data: dict) -> bool:
+    for d in (data, data.get("data"), data.get("user"), data.get("result")):
+        if isinstance(d, dict) and any(d.get(k) not in (None, "") for k in _USER_KEYS):
+            return True
+    return False
+
+
+def verdict_from_response(status: int, body: bytes) -> Optional[bool]:
+    """
+    Interpreta a resposta do endpoint de sonda. True só com sinal positivo
+    (código 0/success ou campo de usuário); False com 401/403, redirect ou
+    erro de autenticação no corpo; None para o resto (HTML, formato
+    desconhecido, outros erros).
+    """
+    if status in _AUTH_CODES or 300 <= status < 400:
+        return False
+    if status != 200:
+        return None
+    try:
+        data = json.loads(body or b"")
+    except ValueError:
+        # HTML em 200: página de login ou rota catch-all da SPA
+        return None
+    if not isinstance(data, dict):
+        return None
+    code = data.get("code", data.get("status"))
+    msg = str(data.get("msg") or data.get("message") or "").lower()
+    if code in (0, "0") or data.get("success") is True:
+        return True
+    if code is None or code in (200, "200", "ok", "success"):
+        return True if _has_user(data) else None
+    if code in _AUTH_CODES or any(w in msg for w in _EXPIRED_WORDS):
+        return False
+    return None
+
+
+def default_probe_url(site_url: str) -> str:
+    """SESSION_PROBE_PATH na mesma origem da SPA (mesmos cookies)."""
+    parts = urlsplit(site_url)
+    return f"{parts.scheme}://{parts.netloc}{SESSION_PROBE_PATH}"
+
+
+async def probe_session(ctx, site_url: str, probe_url: Optional[str] = None) -> Tuple[Optional[bool], str]:
+    """Retorna (veredito, motivo) sem abrir página."""
+    if probe_url is None:
+        probe_url = SESSION_PROBE_URL or (default_probe_url(site_url) if SESSION_PROBE_PATH else "")
+    try:
+        cookies = await ctx.cookies(site_url)
+    except Exception:
+        cookies = []
+    if not cookies:
+        return False, "sem cookies do Duoke"
+    now = time.time()
+    auth = [c for c in cookies if AUTH_COOKIE_RE.search(c.get("name", ""))]
+    live = [c for c in auth if c.get("expires", -1) in (-1, None) or c.get("expires", -1) > now + 60]
+    if auth and not live:
+        return False, "cookies de autenticação vencidos"
+
+    why = "sem endpoint de sonda"
+    if probe_url and probe_url.lower() != "off":
+        try:
+            resp = await ctx.request.get(probe_url, timeout=PROBE_TIMEOUT_MS, max_redirects=0)
+            verdict = verdict_from_response(resp.status, await resp.body())
+            why = f"HTTP {resp.status} em {probe_url}"
+            if verdict is not None:
+                return verdict, why
+        except Exception as e:
+            why = f"sonda falhou: {type(e).__name__}"
+
+    # Sem sonda ou resposta inconclusiva: recorre aos nomes de cookie
+    if live:
+        return True, f"{why}; {len(live)} cookie(s) de autenticação válidos"
+    return None, f"{why}; nenhum cookie de autenticação reconhecido"
@@ -0,0 +1,67 @@
+# src/sessions.py
+"""
+Sessões Duoke por usuário, salvas criptografadas em sessions/<user_id>.bin.
+
+O arquivo é o storage_state do Playwright (cookies + localStorage) cifrado
+com AES-GCM; a chave sai de SESSION_ENC_SECRET via PBKDF2. Usado pelo
+login em duas etapas (main.py) e pelo executor multi-conta
+(src/multi_account.py).
+"""
+import json
+import os
+from pathlib import Path
+from typing import List
+
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+SESS_DIR = Path("sessions")  # Diretório para armazenar os arquivos de sessão
+SECRET = os.getenv("SESSION_ENC_SECRET", "troque-isto-no-render")  # Chave secreta para criptografia
+
+
+def _derive_key(secret: str, salt: bytes) -> bytes:
+    """Deriva uma chave segura a partir de uma senha e um sal usando PBKDF2."""
+    kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=100_000)
+    return kdf.derive(secret.encode("utf-8"))
+
+
+def encrypt_bytes(data: bytes, secret: str) -> bytes:
+    """Criptografa dados usando AES-GCM. Retorna o sal, IV e o texto cifrado."""
+    salt = os.urandom(16)
+    key = _derive_key(secret, salt)
+    aes = AESGCM(key)
+    iv = os.urandom(12)
+    ct = aes.encrypt(iv, data, None)
+    return salt + iv + ct
+
+
+def decrypt_bytes(packed: bytes, secret: str) -> bytes:
+    """Descriptografa dados empacotados pelo `encrypt_bytes`."""
+    salt, iv, ct = packed[:16], packed[16:28], packed[28:]
+    key = _derive_key(secret, salt)
+    aes = AESGCM(key)
+    return aes.decrypt(iv, ct, None)
+
+
+def session_path(user_id: str) -> Path:
+    """Gera o caminho do arquivo de sessão para um dado user_id."""
+    return SESS_DIR / f"{user_id}.bin"
+
+
+def list_accounts() -> List[str]:
+    """user_ids com sessão salva (ordem alfabética)."""
+    if not SESS_DIR.exists():
+        return []
+    return sorted(p.stem for p in SESS_DIR.glob("*.bin"))
+
+
+def load_storage_state(user_id: str, secret: str = SECRET) -> dict:
+    """storage_state (dict) da conta, pronto para browser.new_context(storage_state=...)."""
+    return json.loads(decrypt_bytes(session_path(user_id).read_bytes(), secret))
+
+
+def save_storage_state(user_id: str, state: dict, secret: str = SECRET) -> None:
+    """Regrava a sessão da conta (ex. cookies renovados durante a execução)."""
+    SESS_DIR.mkdir(exist_ok=True)
+    session_path(user_id).write_bytes(encrypt_bytes(json.dumps(state).encode("utf-8"), secret))
@@ -0,0 +1,298 @@
+# src/snapshots.py
+"""
+Snapshots de DOM para medir os extratores fora do Duoke ao vivo.
+
+Gravar (usa o perfil persistente e a sessão do bot):
+    python -m src.snapshots record --conversations 5
+  Abre as primeiras N conversas da lista e salva o DOM de cada uma,
+  sanitizado dentro da página (sem scripts, recursos externos, handlers
+  on*, valores de campos; e-mails, telefones, CPFs, nomes de comprador e
+  endereços mascarados), em snapshots/<nome>.html.
+
+Reproduzir e medir (navegador headless local, rede bloqueada):
+    python -m src.snapshots bench [--repeat 20] [--synthetic] [--update]
+  Carrega cada snapshot com page.set_content e roda os extratores do
+  DuokeBot (read_messages_with_roles, read_sidebar_order_info,
+  _is_logged_ui, maybe_extract_tracking, read_conversation_snapshot),
+  medindo p50/p95 e a estabilidade da saída: entre repetições (mesmo
+  hash) e contra snapshots/<nome>.expected.json (gravado com --update).
+  --synthetic inclui páginas geradas com históricos longos e painéis de
+  pedido enormes.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from playwright.async_api import async_playwright
+
+from .duoke import DuokeBot, PROFILE_DIR
+from .extractors import MESSAGES_JS
+from .metrics import LatencyStats
+
+SNAPSHOTS_DIR = Path(os.getenv("SNAPSHOTS_DIR", str(Path(__file__).resolve().parents[1] / "snapshots")))
+# Tamanhos das páginas sintéticas: (mensagens no histórico, campos no painel do pedido)
+SYNTHETIC_SIZES: List[Tuple[int, int]] = [(50, 40), (2000, 2000), (10000, 20000)]
+
+# Clona o documento e limpa o clone (a página real não é alterada)
+SANITIZE_JS = """
+() => {
+  const doc = document.documentElement.cloneNode(true);
+  doc.querySelectorAll('script, noscript, iframe, object, embed, video, audio, link').forEach(el => el.remove());
+  doc.querySelectorAll('*').forEach(el => {
+    for (const a of Array.from(el.attributes)) {
+      const name = a.name.toLowerCase();
+      if (name.startsWith('on')) el.removeAttribute(a.name);
+      else if (['src', 'srcset', 'href', 'poster', 'action'].includes(name)) el.setAttribute(a.name, '');
+      else if (name === 'value' && el.tagName === 'INPUT') el.setAttribute('value', '');
+    }
+    if (el.tagName === 'TEXTAREA') el.textContent = '';
+  });
+  let n = 0;
+  doc.querySelectorAll('.name, .nickname, .user_name, [class*="buyer_name"], [class*="nick"]').forEach(el => {
+    if (el.children.length === 0) el.textContent = 'Comprador ' + (++n);
+  });
+  doc.querySelectorAll('[class*="address"], [class*="receiver"], [class*="phone"]').forEach(el => {
+    el.textContent = '[removido]';
+  });
+  const walker = document.createTreeWalker(doc, NodeFilter.SHOW_TEXT);
+  let t;
+  while ((t = walker.nextNode())) {
+    t.nodeValue = t.nodeValue
+      .replace(/[\\w.+-]+@[\\w-]+\\.[\\w.-]+/g, 'email@exemplo.com')
+      .replace(/\\d{3}\\.\\d{3}\\.\\d{3}-\\d{2}/g, '000.000.000-00')
+      .replace(/\\+?\\d{2}\\s?\\(?\\d{2}\\)?\\s?9?\\d{4}[\\s-]?\\d{4}\\b/g, '(00) 00000-0000');
+  }
+  return '<!DOCTYPE html>\\n' + doc.outerHTML;
+}
+"""
+
+
+def _digest(value) -> str:
+    return hashlib.sha1(json.dumps(value, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()[:12]
+
+
+# ---------- gravação ----------
+
+async def record(conversations: int = 5, name: str = "chat") -> List[Path]:
+    """Grava snapshots sanitizados das primeiras conversas da conta logada."""
+    SNAPSHOTS_DIR.mkdir(parents=True, exist_ok=True)
+    bot = DuokeBot()
+    saved: List[Path] = []
+    async with async_playwright() as p:
+        ctx = await bot._new_context(p, PROFILE_DIR)
+        try:
+            page = await bot._get_page(ctx)
+            await bot.ensure_login(page)
+            if bot.awaiting_2fa:
+                print("[SNAPSHOT] sessão pede 2FA; faça o login antes de gravar.")
+                return saved
+            rows = await bot.scan_conversation_list(page, limit=conversations)
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            for i, row in enumerate(rows):
+                if not await bot.open_conversation_by_key(page, row["key"]):
+                    continue
+                html = await page.evaluate(SANITIZE_JS)
+                path = SNAPSHOTS_DIR / f"{name}-{stamp}-{i:02d}.html"
+                path.write_text(html, encoding="utf-8")
+                saved.append(path)
+                print(f"[SNAPSHOT] gravado {path.name} ({len(html) / 1024:.0f} KB)")
+        finally:
+            await ctx.close()
+    return saved
+
+
+# ---------- páginas sintéticas ----------
+
+def synthetic_html(messages: int, order_fields: int) -> str:
+    """Página no formato do Duoke (seletores de config/selectors.json) com tamanho controlado."""
+    rows = "".join(
+        f'<li data-id="c{i}"><span class="name">Comprador {i}</span>'
+        f'<span class="time">10:{i % 60:02d}</span><span class="msg">Mensagem {i}</span></li>'
+        for i in range(20)
+    )
+    msgs = []
+    for i in range(messages):
+        side = "lt" if i % 2 == 0 else "rt"
+        text = f"Olá, sobre o pedido, mensagem {i}" + (" BR123456789XY" if i == messages - 2 else "")
+        msgs.append(f'<li class="{side}"><div class="msg_text"><div class="text_cont">{text}</div></div></li>')
+    fields = "".join(
+        f'<div class="order_row"><span>Campo {i}:</span><span>valor {i}</span></div>' for i in range(order_fields)
+    )
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><style>
+.message_main{{height:400px;overflow:auto}} .virtual_list{{height:300px;overflow:auto}}
+</style></head><body>
+<div class="list_container_content"><div class="virtual_list"><ul class="list">{rows}</ul></div></div>
+<ul class="message_main">{''.join(msgs)}</ul>
+<textarea></textarea><button>Send</button>
+<div class="order_panel">
+  <span class="el-tag">To ship</span>
+  <a class="product_name" title="Produto">Camiseta básica algodão</a>
+  <div>Pedido #250101ABCDEFG1</div>
+  <div>Buyer payment amount: R$ 59,90</div>
+  <div>Variation: Azul, M</div>
+  <div>SKU: CAM-AZ-M</div>
+  {fields}
+  <div class="logistic_info">Rastreio: BR987654321XY</div>
+</div>
+</body></html>"""
+
+
+# ---------- reprodução / benchmark ----------
+
+def _extractors(bot: DuokeBot, depth: int) -> Dict[str, Callable]:
+    async def messages(page):
+        return await page.evaluate(MESSAGES_JS)
+
+    async def messages_with_roles(page):
+        return await bot.read_messages_with_roles(page, depth)
+
+    async def order_info(page):
+        return await bot.read_sidebar_order_info(page)
+
+    async def logged_ui(page):
+        return await bot._is_logged_ui(page)
+
+    async def tracking(page):
+        bot._tracking_cache.clear()
+        return await bot.maybe_extract_tracking(page)
+
+    async def snapshot(page):
+        snap = await bot.read_conversation_snapshot(page, depth)
+        return {
+            "messages": snap.messages,
+            "order": snap.order.to_dict(),
+            "tracking": snap.tracking_candidates,
+            "input": snap.input.selector,
+        }
+
+    return {
+        "messages_js": messages,
+        "read_messages_with_roles": messages_with_roles,
+        "read_sidebar_order_info": order_info,
+        "_is_logged_ui": logged_ui,
+        "maybe_extract_tracking": tracking,
+        "read_conversation_snapshot": snapshot,
+    }
+
+
+async def bench_page(page, html: str, repeat: int, depth: int) -> Dict[str, dict]:
+    """Roda cada extrator `repeat` vezes sobre o HTML; 1ª execução conta como fria."""
+    await page.set_content(html, wait_until="domcontentloaded")
+    bot = DuokeBot()
+    results: Dict[str, dict] = {}
+    for name, fn in _extractors(bot, depth).items():
+        stats = LatencyStats(window=repeat)
+        hashes = set()
+        cold = 0.0
+        output = None
+        for i in range(repeat):
+            t0 = time.perf_counter()
+            try:
+                output = await fn(page)
+            except Exception as e:
+                output = f"erro: {type(e).__name__}: {e}"
+            elapsed = time.perf_counter() - t0
+            if i == 0:
+                cold = elapsed
+            stats.add(elapsed)
+            hashes.add(_digest(output))
+        results[name] = {
+            **stats.snapshot(),
+            "cold": round(cold, 4),
+            "stable": len(hashes) == 1,
+            "digest": next(iter(hashes)) if len(hashes) == 1 else "",
+            "output": output,
+        }
+    return results
+
+
+def _load_cases(synthetic: bool) -> List[Tuple[str, str]]:
+    cases = []
+    if SNAPSHOTS_DIR.exists():
+        for path in sorted(SNAPSHOTS_DIR.glob("*.html")):
+            cases.append((path.stem, path.read_text(encoding="utf-8")))
+    if synthetic:
+        for msgs, fields in SYNTHETIC_SIZES:
+            cases.append((f"sintetico-{msgs}msgs-{fields}campos", synthetic_html(msgs, fields)))
+    return cases
+
+
+def _compare_expected(name: str, results: Dict[str, dict], update: bool) -> List[str]:
+    """Compara a saída de cada extrator com a gravada; devolve os que mudaram."""
+    path = SNAPSHOTS_DIR / f"{name}.expected.json"
+    current = {k: v["digest"] for k, v in results.items()}
+    if update:
+        SNAPSHOTS_DIR.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(current, indent=2, sort_keys=True), encoding="utf-8")
+        return []
+    if not path.exists():
+        return []
+    expected = json.loads(path.read_text(encoding="utf-8"))
+    return [k for k, v in current.items() if k in expected and expected[k] != v]
+
+
+async def bench(repeat: int = 20, synthetic: bool = False, update: bool = False, depth: int = 8) -> dict:
+    cases = _load_cases(synthetic)
+    if not cases:
+        print(f"[SNAPSHOT] nenhum snapshot em {SNAPSHOTS_DIR}; grave com `record` ou use --synthetic.")
+        return {}
+    report = {}
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True, args=["--no-sandbox", "--disable-gpu"])
+        ctx = await browser.new_context(viewport={"width": 1366, "height": 768})
+        # reprodução 100% offline
+        await ctx.route(re.compile(r"^https?://"), lambda route: route.abort())
+        page = await ctx.new_page()
+        page.set_default_timeout(6000)
+        try:
+            for name, html in cases:
+                results = await bench_page(page, html, repeat, depth)
+                changed = _compare_expected(name, results, update)
+                report[name] = {k: {kk: vv for kk, vv in v.items() if kk != "output"} for k, v in results.items()}
+                print(f"\n[SNAPSHOT] {name} ({len(html) / 1024:.0f} KB)")
+                for ext, r in results.items():
+                    flags = []
+                    if not r["stable"]:
+                        flags.append("INSTÁVEL")
+                    if ext in changed:
+                        flags.append("MUDOU vs expected")
+                    print(
+                        f"  {ext:<28} p50={r['p50'] * 1000:7.1f}ms p95={r['p95'] * 1000:7.1f}ms "
+                        f"fria={r['cold'] * 1000:7.1f}ms {' '.join(flags)}"
+                    )
+        finally:
+            await browser.close()
+    return report
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Grava/reproduz snapshots de DOM do Duoke para medir os extratores.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    rec = sub.add_parser("record", help="grava snapshots sanitizados das conversas da conta logada")
+    rec.add_argument("--conversations", type=int, default=5)
+    rec.add_argument("--name", default="chat")
+    be = sub.add_parser("bench", help="mede os extratores sobre os snapshots gravados")
+    be.add_argument("--repeat", type=int, default=20)
+    be.add_argument("--depth", type=int, default=8)
+    be.add_argument("--synthetic", action="store_true", help="inclui páginas sintéticas grandes")
+    be.add_argument("--update", action="store_true", help="grava a saída atual como esperada")
+    be.add_argument("--json", dest="json_out", default="", help="salva o relatório em JSON")
+    args = ap.parse_args()
+
+    if args.cmd == "record":
+        asyncio.run(record(args.conversations, args.name))
+    else:
+        report = asyncio.run(bench(args.repeat, args.synthetic, args.update, args.depth))
+        if args.json_out:
+            Path(args.json_out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+# src/supervisor.py
+"""
+Supervisor multi-processo para implantações com muitas contas.
+
+Um único processo asyncio com todas as contas satura um núcleo só com o
+protocolo do Playwright e o JSON das páginas. O supervisor divide as contas
+de sessions/ em SUPERVISOR_WORKERS processos; cada processo tem seu próprio
+event loop e Chromium e roda o MultiAccountRunner sobre a sua fatia.
+
+- Processo que morre é recriado com a mesma fatia (com espera crescente).
+- Se um slot morre MAX_RESTARTS vezes dentro de RESTART_WINDOW segundos, ele
+  é aposentado e suas contas são redistribuídas entre os processos vivos
+  (comando "add" pela fila de comandos de cada processo).
+- Cada processo manda, a cada STATS_SECONDS, a vazão por conta numa fila
+  multiprocessing local; o supervisor agrega e imprime a cada REPORT_SECONDS.
+
+Uso: python -m src.supervisor
+"""
+import asyncio
+import multiprocessing as mp
+import os
+import queue as queue_mod
+import signal
+import time
+from typing import Dict, List, Optional
+
+from .metrics import percentile
+
+WORKERS = int(os.getenv("SUPERVISOR_WORKERS", str(os.cpu_count() or 1)))
+STATS_SECONDS = float(os.getenv("SUPERVISOR_STATS_SECONDS", "10"))
+REPORT_SECONDS = float(os.getenv("SUPERVISOR_REPORT_SECONDS", "60"))
+MAX_RESTARTS = int(os.getenv("SUPERVISOR_MAX_RESTARTS", "5"))
+RESTART_WINDOW = 600.0
+
+
+def shard(accounts: List[str], n: int) -> List[List[str]]:
+    """Divide as contas em n fatias de tamanho parecido (ordem estável)."""
+    n = max(1, n)
+    return [accounts[i::n] for i in range(n)]
+
+
+# ---------- lado do processo filho ----------
+
+async def _worker_async(slot: int, user_ids: List[str], cmd_q, stats_q) -> None:
+    from .multi_account import MultiAccountRunner
+
+    runner = MultiAccountRunner(user_ids)
+
+    async def pump():
+        while True:
+            await asyncio.sleep(STATS_SECONDS)
+            while True:
+                try:
+                    cmd = cmd_q.get_nowait()
+                except queue_mod.Empty:
+                    break
+                for uid in cmd.get("add", []):
+                    runner.add_account(uid)
+            try:
+                stats_q.put_nowait({
+                    "slot": slot,
+                    "pid": os.getpid(),
+                    "ts": time.time(),
+                    "accounts": runner.snapshot(),
+                })
+            except Exception:
+                pass
+
+    await asyncio.gather(runner.run(), pump())
+
+
+def _raise_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def _worker_main(slot: int, user_ids: List[str], cmd_q, stats_q) -> None:
+    # Ctrl+C vai para o grupo inteiro: quem encerra os filhos é o supervisor.
+    # SIGTERM (terminate) cancela o loop, e o executor salva as sessões ao sair
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    print(f"[SUPERVISOR] processo {slot} (pid {os.getpid()}) com {len(user_ids)} contas: {', '.join(user_ids)}")
+    try:
+        asyncio.run(_worker_async(slot, user_ids, cmd_q, stats_q))
+    except KeyboardInterrupt:
+        pass
+
+
+# ---------- lado do supervisor ----------
+
+class Slot:
+    def __init__(self, index: int, accounts: List[str]):
+        self.index = index
+        self.accounts = list(accounts)
+        self.proc: Optional[mp.Process] = None
+        self.cmd_q = None
+        self.deaths: List[float] = []
+        self.restart_at = 0.0
+        self.retired = False
+
+
+class Supervisor:
+    def __init__(self, accounts: List[str], workers: int = WORKERS):
+        self.mp = mp.get_context("spawn")
+        self.stats_q = self.mp.Queue()
+        n = max(1, min(workers, len(accounts)))
+        self.slots = [Slot(i, part) for i, part in enumerate(shard(accounts, n))]
+        self.latest: Dict[int, dict] = {}
+        self.restarts = 0
+
+    def _start(self, slot: Slot) -> None:
+        slot.cmd_q = self.mp.Queue()
+        slot.proc = self.mp.Process(
+            target=_worker_main,
+            args=(slot.index, slot.accounts, slot.cmd_q, self.stats_q),
+            name=f"duoke-worker-{slot.index}",
+            daemon=True,
+        )
+        slot.proc.start()
+
+    def _live(self) -> List[Slot]:
+        return [s for s in self.slots if not s.retired and s.proc is not None and s.proc.is_alive()]
+
+    def _on_death(self, slot: Slot) -> None:
+        now = time.monotonic()
+        code = slot.proc.exitcode
+        slot.proc = None
+        self.latest.pop(slot.index, None)
+        slot.deaths = [t for t in slot.deaths if now - t < RESTART_WINDOW] + [now]
+        live = self._live()
+        if len(slot.deaths) >= MAX_RESTARTS and live:
+            # slot instável: aposenta e redistribui as contas entre os vivos
+            slot.retired = True
+            for uid in slot.accounts:
+                target = min(live, key=lambda s: len(s.accounts))
+                target.accounts.append(uid)
+                target.cmd_q.put({"add": [uid]})
+            print(
+                f"[SUPERVISOR] processo {slot.index} caiu {len(slot.deaths)}x (código {code}); "
+                f"contas {slot.accounts} redistribuídas para {[s.index for s in live]}"
+            )
+            slot.accounts = []
+            return
+        delay = min(60.0, 2.0 ** len(slot.deaths))
+        slot.restart_at = now + delay
+        print(f"[SUPERVISOR] processo {slot.index} caiu (código {code}); recriando em {delay:.0f}s")
+
+    def _drain_stats(self, timeout: float) -> None:
+        try:
+            msg = self.stats_q.get(timeout=timeout)
+        except queue_mod.Empty:
+            return
+        while True:
+            self.latest[msg["slot"]] = msg
+            try:
+                msg = self.stats_q.get_nowait()
+            except queue_mod.Empty:
+                return
+
+    def aggregate(self) -> dict:
+        accounts = {}
+        for msg in self.latest.values():
+            accounts.update(msg.get("accounts", {}))
+        p95s = [a["cycle"]["p95"] for a in accounts.values() if a.get("cycle", {}).get("count")]
+        return {
+            "workers": len(self._live()),
+            "accounts": len(accounts),
+            "replied": sum(a["replied"] for a in accounts.values()),
+            "opened": sum(a["opened"] for a in accounts.values()),
+            "errors": sum(a["errors"] for a in accounts.values()),
+            "replies_per_min": round(sum(a["replies_per_min"] for a in accounts.values()), 2),
+            "cycle_p95_median": round(percentile(p95s, 50), 3),
+            "cycle_p95_worst": round(max(p95s), 3) if p95s else 0.0,
+            "restarts": self.restarts,
+        }
+
+    def report(self) -> None:
+        a = self.aggregate()
+        print(
+            f"[SUPERVISOR] {a['workers']} processos, {a['accounts']} contas | "
+            f"respondidas={a['replied']} ({a['replies_per_min']}/min) abertas={a['opened']} "
+            f"erros={a['errors']} | p95 do ciclo: mediana {a['cycle_p95_median']:.2f}s, "
+            f"pior {a['cycle_p95_worst']:.2f}s | reinícios={a['restarts']}"
+        )
+
+    def run(self) -> None:
+        if not self.slots or not any(s.accounts for s in self.slots):
+            print("[SUPERVISOR] nenhuma sessão em sessions/; faça o login das contas pelo main.py.")
+            return
+        for slot in self.slots:
+            self._start(slot)
+        next_report = time.monotonic() + REPORT_SECONDS
+        try:
+            while True:
+                self._drain_stats(timeout=1.0)
+                now = time.monotonic()
+                for slot in self.slots:
+                    if slot.retired:
+                        continue
+                    if slot.proc is not None and not slot.proc.is_alive():
+                        self._on_death(slot)
+                    elif slot.proc is None and now >= slot.restart_at:
+                        self.restarts += 1
+                        self._start(slot)
+                if now >= next_report:
+                    self.report()
+                    next_report = now + REPORT_SECONDS
+        except KeyboardInterrupt:
+            print("\n[SUPERVISOR] encerrando processos...")
+        finally:
+            for slot in self.slots:
+                if slot.proc is not None and slot.proc.is_alive():
+                    slot.proc.terminate()
+            for slot in self.slots:
+                if slot.proc is not None:
+                    slot.proc.join(timeout=15)
+            self.report()
+
+
+if __name__ == "__main__":
+    from .multi_account import selected_accounts
+
+    Supervisor(selected_accounts()).run()
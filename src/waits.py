@@ -0,0 +1,83 @@
+# src/waits.py
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict
+
+from .metrics import LatencyStats
+
+
+class AdaptiveWaiter:
+    """
+    Camada de espera por condição (DOM/rede) no lugar de sleeps fixos.
+
+    Cada etapa ("open.render", "modal.hidden", ...) aprende o tempo típico
+    até a condição ficar verdadeira. Depois de algumas amostras, a primeira
+    tentativa usa um orçamento de p95 × fator (mínimo floor_ms). Se estourar,
+    continua esperando até o teto `cap_ms` da etapa, então a confiabilidade
+    não cai. O tempo realmente consumido por etapa fica registrado.
+    """
+
+    def __init__(self, floor_ms: int = 150, factor: float = 3.0, min_samples: int = 5):
+        self.floor_ms = floor_ms
+        self.factor = factor
+        self.min_samples = min_samples
+        self.settle: Dict[str, LatencyStats] = defaultdict(LatencyStats)
+        self.timeouts: Dict[str, int] = defaultdict(int)
+        self.spent: Dict[str, float] = defaultdict(float)
+        self._cycle_spent = 0.0
+
+    def budget_ms(self, step: str, cap_ms: int) -> int:
+        st = self.settle.get(step)
+        if not st or st.count < self.min_samples:
+            return cap_ms
+        return int(min(cap_ms, max(self.floor_ms, st.p(95) * 1000 * self.factor)))
+
+    async def until(self, step: str, wait_fn: Callable[[int], Awaitable], cap_ms: int) -> bool:
+        """
+        Executa wait_fn(timeout_ms) (ex.: page.wait_for_function) com orçamento
+        aprendido; retorna True se a condição foi satisfeita antes do teto.
+        """
+        t0 = time.perf_counter()
+        budget = self.budget_ms(step, cap_ms)
+        ok = True
+        try:
+            await wait_fn(budget)
+        except Exception:
+            ok = False
+            left = cap_ms - budget
+            if left > 0:
+                try:
+                    await wait_fn(left)
+                    ok = True
+                except Exception:
+                    pass
+        elapsed = time.perf_counter() - t0
+        if ok:
+            self.settle[step].add(elapsed)
+        else:
+            self.timeouts[step] += 1
+        self.spent[step] += elapsed
+        self._cycle_spent += elapsed
+        return ok
+
+    async def function(self, page, step: str, js: str, arg=None, cap_ms: int = 5000) -> bool:
+        return await self.until(
+            step, lambda t: page.wait_for_function(js, arg=arg, timeout=t), cap_ms
+        )
+
+    async def selector(self, page, step: str, sel: str, cap_ms: int = 5000, state: str = "attached") -> bool:
+        return await self.until(step, lambda t: page.wait_for_selector(sel, state=state, timeout=t), cap_ms)
+
+    def take_cycle_spent(self) -> float:
+        """Tempo total gasto em esperas desde a última chamada."""
+        spent, self._cycle_spent = self._cycle_spent, 0.0
+        return spent
+
+    def summary(self, top: int = 5) -> str:
+        steps = sorted(self.spent.items(), key=lambda kv: kv[1], reverse=True)[:top]
+        parts = []
+        for step, total in steps:
+            st = self.settle.get(step)
+            p95 = st.p(95) if st else 0.0
+            parts.append(f"{step}={total:.1f}s (p95 {p95:.2f}s, {self.timeouts.get(step, 0)} timeouts)")
+        return "; ".join(parts) or "sem esperas"
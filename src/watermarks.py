@@ -0,0 +1,78 @@
+# src/watermarks.py
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+WATERMARKS_PATH = Path(
+    os.getenv("WATERMARKS_PATH", str(Path(__file__).resolve().parents[1] / "watermarks.json"))
+)
+MAX_ENTRIES = int(os.getenv("WATERMARKS_MAX", "5000"))
+
+
+def signature(*parts: str) -> str:
+    """Hash curto do estado visível de uma conversa (prévia + horário da última msg)."""
+    raw = "|".join((p or "").strip() for p in parts)
+    if not raw.strip("|"):
+        return ""
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class WatermarkStore:
+    """
+    Marca d'água por conversa: chave da conversa -> assinatura da última
+    mensagem já tratada. Persistida em JSON para sobreviver a reinícios.
+    """
+
+    def __init__(self, path: Path = WATERMARKS_PATH, max_entries: int = MAX_ENTRIES):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.data: Dict[str, dict] = {}
+        self._dirty = False
+        self.load()
+
+    def load(self) -> None:
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+            self.data = raw if isinstance(raw, dict) else {}
+        except FileNotFoundError:
+            self.data = {}
+        except Exception as e:
+            print(f"[WATERMARK] aviso: falha ao ler {self.path.name}: {e}")
+            self.data = {}
+
+    def get(self, key: str) -> Optional[dict]:
+        return self.data.get(key) if key else None
+
+    def unchanged(self, key: str, sig: str) -> bool:
+        """True se a conversa já foi tratada com esta mesma assinatura."""
+        if not key or not sig:
+            return False
+        entry = self.data.get(key)
+        return bool(entry) and entry.get("sig") == sig
+
+    def mark(self, key: str, sig: str, last_buyer: str = "") -> None:
+        if not key or not sig:
+            return
+        self.data[key] = {
+            "sig": sig,
+            "last_buyer": signature(last_buyer) if last_buyer else "",
+            "ts": int(time.time()),
+        }
+        self._dirty = True
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        if len(self.data) > self.max_entries:
+            newest = sorted(self.data.items(), key=lambda kv: kv[1].get("ts", 0), reverse=True)
+            self.data = dict(newest[: self.max_entries])
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        try:
+            tmp.write_text(json.dumps(self.data, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.path)
+            self._dirty = False
+        except Exception as e:
+            print(f"[WATERMARK] aviso: falha ao salvar {self.path.name}: {e}")
@@ -0,0 +1,126 @@
+import asyncio
+import json
+import re
+import time
+
+import pytest
+
+from src import gemini_client as g
+from src.classify_cache import CACHE
+
+
+class _Resp:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeModel:
+    """Responde ao BATCH_PROMPT com um JSON por id, depois de `delay` segundos."""
+
+    def __init__(self, delay: float, omit=()):
+        self.delay = delay
+        self.omit = set(omit)
+        self.calls = 0
+        self.cancelled = 0
+
+    async def generate_content_async(self, prompt: str):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if "CONVERSAS:" not in prompt:
+            return _Resp('{"intent": "envio", "reason": "sozinha", "needs_reply": true}')
+        ids = [i for i in re.findall(r"### (c\d+)", prompt) if i not in self.omit]
+        return _Resp(json.dumps({i: {"intent": "elogio", "reason": "lote", "needs_reply": True} for i in ids}))
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    def use(model: FakeModel, timeout: float = 1.0, window_ms: float = 30):
+        monkeypatch.setattr(g, "get_gemini", lambda: model)
+        monkeypatch.setattr(g, "STATS", g.GeminiStats())
+        monkeypatch.setattr(g, "BREAKER", g.CircuitBreaker())
+        monkeypatch.setattr(CACHE, "enabled", False)
+        monkeypatch.setattr(g.settings, "gemini_batch_window_ms", window_ms)
+        monkeypatch.setattr(g.settings, "gemini_timeout_seconds", timeout)
+        monkeypatch.setattr(g.settings, "gemini_hedge_percentile", 0)
+        return model
+    return use
+
+
+async def _classify_all(n: int, prefix: str = "conversa"):
+    return await asyncio.gather(*[g.classify_async([f"{prefix} {i}"]) for i in range(n)])
+
+
+def test_lote_junta_conversas_numa_chamada(gemini):
+    model = gemini(FakeModel(delay=0.05))
+    res = asyncio.run(_classify_all(4))
+    assert [r["reason"] for r in res] == ["lote"] * 4
+    assert model.calls == 1
+    assert g.STATS.outcomes["batched"] == 4
+
+
+def test_conversa_que_falta_no_lote_tenta_sozinha(gemini):
+    model = gemini(FakeModel(delay=0.05, omit={"c2"}))
+    res = asyncio.run(_classify_all(3))
+    assert [r["reason"] for r in res] == ["lote", "sozinha", "lote"]
+    assert model.calls == 2
+
+
+def test_lote_lento_respeita_o_prazo_e_cancela_a_chamada(gemini):
+    model = gemini(FakeModel(delay=5.0), timeout=0.3)
+
+    async def run():
+        t0 = time.perf_counter()
+        res = await _classify_all(3)
+        return res, time.perf_counter() - t0
+
+    res, elapsed = asyncio.run(run())
+    # todos caem no classificador local dentro do orçamento, e a chamada não fica órfã
+    assert elapsed < 0.6
+    assert all(r["reason"] == "fallback neutro" for r in res)
+    assert g.STATS.outcomes["timeout"] == 3
+    assert model.calls == 1 and model.cancelled == 1
+    assert not g.BREAKER._probing
+
+
+def test_lote_cancelado_quando_todos_desistem(gemini):
+    model = gemini(FakeModel(delay=5.0), timeout=2.0)
+
+    async def run():
+        tasks = [asyncio.create_task(g.classify_async([f"c {i}"])) for i in range(2)]
+        await asyncio.sleep(0.1)  # janela fechou, lote em voo
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+    assert model.calls == 1 and model.cancelled == 1
+    assert g.BREAKER.state == "fechado" and not g.BREAKER._probing
+
+
+def test_latencia_do_lote_e_so_a_do_modelo(gemini):
+    gemini(FakeModel(delay=0.05), window_ms=200)
+    asyncio.run(_classify_all(2))
+    # a janela de 200ms não entra na latência nem no percentil do hedge
+    assert g.STATS.latency["batched"].p(50) < 0.15
+    assert g.STATS.api_latency.count == 0
+
+
+def test_teste_do_meio_aberto_cancelado_antes_do_envio_libera(gemini):
+    model = gemini(FakeModel(delay=0.05), window_ms=500)
+    g.BREAKER.state = "meio-aberto"
+
+    async def run():
+        task = asyncio.create_task(g.classify_async(["teste"]))
+        await asyncio.sleep(0.05)  # ainda na janela do lote
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run())
+    assert model.calls == 0
+    assert not g.BREAKER._probing
+    assert g.BREAKER.allow()
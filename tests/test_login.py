@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("playwright.async_api")
+from playwright.async_api import async_playwright
+
+from src.duoke import DuokeBot
+
+# Formulário cujo campo de 2FA só aparece 1,5s depois do clique em Login,
+# com o campo de senha ainda na tela
+LOGIN_HTML = """
+<form onsubmit="return false">
+  <input type="email"><input type="password">
+  <button id="go">Login</button>
+</form>
+<script>
+document.getElementById('go').addEventListener('click', () => setTimeout(() => {
+  const i = document.createElement('input');
+  i.placeholder = 'Verification code';
+  document.body.appendChild(i);
+}, 1500));
+</script>
+"""
+
+
+def test_2fa_que_aparece_depois_do_envio(monkeypatch, tmp_path):
+    monkeypatch.setenv("DUOKE_EMAIL", "loja@example.com")
+    monkeypatch.setenv("DUOKE_PASSWORD", "segredo")
+
+    async def run():
+        async with async_playwright() as p:
+            browser = await p.chromium.launch()
+            try:
+                page = await browser.new_page()
+                await page.set_content(LOGIN_HTML)
+                bot = DuokeBot(account_id="teste")
+                bot.watermarks = None
+                await bot._full_login(page, navigated=True)
+                return bot
+            finally:
+                await browser.close()
+
+    bot = asyncio.run(run())
+    assert bot.awaiting_2fa
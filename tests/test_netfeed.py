@@ -0,0 +1,22 @@
+from src.netfeed import NetworkFeed
+
+
+def test_horario_iso_ordena_as_mensagens():
+    feed = NetworkFeed()
+    feed.ingest({"data": [
+        {"conversation_id": "c1", "content": "segunda", "is_self": 1, "created_at": "2024-03-18T09:12:00Z"},
+        {"conversation_id": "c1", "content": "primeira", "is_self": 0, "created_at": "2024-03-18T09:10:00Z"},
+    ]})
+    conv = feed.lookup("data-id:c1")
+    assert [m.text for m in conv.messages] == ["primeira", "segunda"]
+    assert conv.messages[0].ts > 0
+    assert conv.last_role == "seller"
+
+
+def test_nome_so_do_comprador():
+    feed = NetworkFeed()
+    feed.ingest({"conversation_id": "c1", "buyer_name": "Ana"})
+    # o apelido genérico (do vendedor) não renomeia a conversa
+    feed.ingest({"conversation_id": "c1", "nickname": "Minha Loja", "content": "oi", "is_self": 1})
+    assert feed.lookup("name:Ana").name == "Ana"
+    assert feed.lookup("name:Minha Loja") is None
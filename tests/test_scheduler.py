@@ -0,0 +1,36 @@
+from datetime import datetime
+
+from src.scheduler import parse_row_time
+
+NOW = datetime(2024, 6, 15, 12, 0)
+
+
+def _date(text, order="md"):
+    ts = parse_row_time(text, now=NOW, order=order)
+    return None if ts is None else datetime.fromtimestamp(ts)
+
+
+def test_data_ambigua_com_e_sem_ano_segue_a_mesma_ordem():
+    # "03/04" é 4 de março nos dois formatos (mês primeiro, como o Duoke em inglês)
+    assert _date("03/04") == datetime(2024, 3, 4)
+    assert _date("03/04/2024") == datetime(2024, 3, 4)
+    assert _date("03/04/24 09:10") == datetime(2024, 3, 4, 9, 10)
+
+
+def test_ordem_dia_mes():
+    assert _date("03/04", order="dm") == datetime(2024, 4, 3)
+    assert _date("03/04/2024", order="dm") == datetime(2024, 4, 3)
+
+
+def test_data_sem_ano_no_futuro_e_do_ano_anterior():
+    assert _date("12/01") == datetime(2023, 12, 1)
+
+
+def test_data_invalida_na_ordem_escolhida():
+    # mês 18 não existe: não chuta a outra ordem
+    assert _date("18/03") is None
+    assert _date("18/03", order="dm") == datetime(2024, 3, 18)
+
+
+def test_iso_nao_depende_da_ordem():
+    assert _date("2024-03-04 08:30", order="dm") == datetime(2024, 3, 4, 8, 30)
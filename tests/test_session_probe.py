@@ -0,0 +1,55 @@
+import asyncio
+import json
+
+from src import session_probe
+from src.session_probe import probe_session, verdict_from_response
+
+
+def _json(data):
+    return json.dumps(data).encode()
+
+
+def test_sessao_valida_so_com_sinal_positivo():
+    assert verdict_from_response(200, _json({"code": 0, "data": {}})) is True
+    assert verdict_from_response(200, _json({"data": {"user_id": 42}})) is True
+    assert verdict_from_response(200, _json({"code": 200, "data": {"nickname": "loja"}})) is True
+
+
+def test_resposta_sem_sinal_nao_conclui():
+    # catch-all da SPA e JSON genérico sem usuário não confirmam a sessão
+    assert verdict_from_response(200, b"<!doctype html><html><body>app</body></html>") is None
+    assert verdict_from_response(200, _json({"ok": 1})) is None
+    assert verdict_from_response(200, _json({"code": 500, "msg": "busy"})) is None
+
+
+def test_sessao_expirada():
+    assert verdict_from_response(401, b"") is False
+    assert verdict_from_response(302, b"") is False
+    assert verdict_from_response(200, _json({"code": 401, "msg": "qualquer texto"})) is False
+    assert verdict_from_response(200, _json({"code": 10001, "msg": "Token expired"})) is False
+
+
+class _Ctx:
+    def __init__(self, cookies):
+        self._cookies = cookies
+        self.requested = []
+        self.request = self
+
+    async def cookies(self, url):
+        return self._cookies
+
+    async def get(self, url, **kw):
+        self.requested.append(url)
+        raise AssertionError("sonda HTTP não configurada não deveria rodar")
+
+
+def test_sem_endpoint_configurado_usa_so_cookies(monkeypatch):
+    monkeypatch.setattr(session_probe, "SESSION_PROBE_URL", "")
+    monkeypatch.setattr(session_probe, "SESSION_PROBE_PATH", "")
+    ctx = _Ctx([{"name": "session_token", "expires": -1}])
+    verdict, _ = asyncio.run(probe_session(ctx, "https://www.duoke.com/chat"))
+    assert verdict is True
+    assert ctx.requested == []
+
+    verdict, _ = asyncio.run(probe_session(_Ctx([{"name": "lang", "expires": -1}]), "https://www.duoke.com/chat"))
+    assert verdict is None